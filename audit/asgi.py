@@ -2,6 +2,8 @@
 ASGI config for audit project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn audit.asgi:application``) for the dashboards' live
+updates: the ``/events/`` server-sent event stream is only available here.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
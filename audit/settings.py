@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,6 +63,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.roles',
+                'core.context_processors.render_timer',
             ],
         },
     },
@@ -73,12 +76,99 @@ WSGI_APPLICATION = 'audit.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# AUDIT_DB picks the profile: "sqlite" (default) or "postgres".
+#
+# The SQLite profile runs in WAL mode so readers never block the writer, and
+# begins transactions IMMEDIATE so concurrent review POSTs queue on
+# busy_timeout instead of failing with "database is locked" when a read turns
+# into a write. AUDIT_SQLITE_TUNING=false restores SQLite's defaults (useful
+# as a db_loadtest baseline).
+#
+# The PostgreSQL profile (needs psycopg) keeps connections open for
+# AUDIT_DB_CONN_MAX_AGE seconds with health checks, or with AUDIT_DB_POOL=true
+# uses psycopg's connection pool instead (persistent connections must then be
+# off, so CONN_MAX_AGE is 0).
+
+AUDIT_DB = os.environ.get('AUDIT_DB', 'sqlite')
+AUDIT_SQLITE_TUNING = os.environ.get('AUDIT_SQLITE_TUNING', 'true').lower() == 'true'
+
+if AUDIT_DB == 'postgres':
+    AUDIT_DB_POOL = os.environ.get('AUDIT_DB_POOL', 'false').lower() == 'true'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('AUDIT_DB_NAME', 'audit'),
+            'USER': os.environ.get('AUDIT_DB_USER', 'audit'),
+            'PASSWORD': os.environ.get('AUDIT_DB_PASSWORD', ''),
+            'HOST': os.environ.get('AUDIT_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('AUDIT_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if AUDIT_DB_POOL else int(os.environ.get('AUDIT_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('AUDIT_DB_POOL_MIN', '2')),
+                    'max_size': int(os.environ.get('AUDIT_DB_POOL_MAX', '10')),
+                    'timeout': 10,
+                },
+            } if AUDIT_DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('AUDIT_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if AUDIT_SQLITE_TUNING else {},
+        }
     }
+
+# Applied to every new SQLite connection by core.signals.tune_sqlite.
+AUDIT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',   # safe with WAL; fsync at checkpoints only
+    'busy_timeout': 20000,     # ms a writer waits for the lock
+    'cache_size': -20000,      # KiB, i.e. 20 MB of page cache per connection
+    'temp_store': 'MEMORY',
+} if AUDIT_SQLITE_TUNING else {}
+
+
+# Cache
+# AUDIT_CACHE picks the backend: "locmem" (default, per process; used by the
+# tests), "file" for a single node running several workers, or "redis" for
+# any Redis-protocol server (Redis, Valkey, KeyDB...) shared by all workers,
+# which needs the redis package. AUDIT_CACHE_LOCATION overrides the
+# directory or server URL. The cache holds each user's resolved roles: with
+# locmem a role change only reaches the worker that made it, so there they
+# are cached for AUDIT_LOCAL_ROLES_TIMEOUT seconds only. Use a shared backend
+# whenever more than one worker process serves requests.
+
+AUDIT_CACHE = os.environ.get('AUDIT_CACHE', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'audit',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('AUDIT_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('AUDIT_CACHE_LOCATION', 'redis://127.0.0.1:6379/0'),
+    },
 }
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[AUDIT_CACHE],
+        'KEY_PREFIX': 'audit',
+        'TIMEOUT': 300,
+    },
+}
+
+AUDIT_LOCAL_ROLES_TIMEOUT = 5
+
+# Seconds a dashboard fragment may live; invalidation does not depend on it.
+AUDIT_FRAGMENT_TIMEOUT = 300
 
 
 # Password validation
@@ -121,11 +211,114 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Attachments are stored once per distinct content and hard-linked under
+# their upload_to names (core/storage.py); `manage.py gc_attachments`
+# removes what is no longer referenced.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'attachments': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+        'OPTIONS': {'blob_dir': 'blobs'},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Background jobs
+# Run queued jobs inline instead of waiting for `manage.py run_jobs`.
+
+AUDIT_JOBS_EAGER = os.environ.get('AUDIT_JOBS_EAGER', 'false').lower() == 'true'
+
+
+# PDF export
+# Rendered PDFs are cached here under the SHA-256 of their source data.
+
+AUDIT_PDF_CACHE_DIR = os.path.join(MEDIA_ROOT, 'pdf_cache')
+
+
+# File downloads
+# Attachments and PDFs are served by permission-checked views. In production
+# set AUDIT_SENDFILE to hand the transfer to the front-end server:
+#   'nginx'  -> X-Accel-Redirect to AUDIT_SENDFILE_PREFIX + the path under
+#               MEDIA_ROOT, with e.g.
+#               location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+#   'apache' -> X-Sendfile with the absolute path (mod_xsendfile, lighttpd)
+# Left empty, files are streamed from Python with range support.
+
+AUDIT_SENDFILE = os.environ.get('AUDIT_SENDFILE', '')
+AUDIT_SENDFILE_PREFIX = os.environ.get('AUDIT_SENDFILE_PREFIX', '/protected-media/')
+
+
+# Chunked uploads
+# Attachments are uploaded in resumable chunks (core/uploads.py). Partial
+# files are kept in AUDIT_UPLOAD_TEMP_DIR, which must be on the same
+# filesystem as MEDIA_ROOT so finished files can be moved into place.
+
+AUDIT_UPLOAD_MAX_SIZE = int(os.environ.get('AUDIT_UPLOAD_MAX_SIZE', 2 * 1024 ** 3))
+AUDIT_UPLOAD_CHUNK_SIZE = int(os.environ.get('AUDIT_UPLOAD_CHUNK_SIZE', 8 * 1024 ** 2))
+AUDIT_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'uploads', 'partial')
+
+
+# Admin
+# Unfiltered changelists of tables with more rows than this show an estimated
+# total (core.pagination.EstimatedCountPaginator) instead of running COUNT(*).
+
+AUDIT_ESTIMATE_THRESHOLD = int(os.environ.get('AUDIT_ESTIMATE_THRESHOLD', 10000))
+
+
+# Live updates
+# Dashboards subscribe to /events/ (server-sent events, core/events.py) and
+# re-fetch a fragment when a status change makes it stale. Streams are only
+# served by the ASGI application, e.g. `uvicorn audit.asgi:application`.
+# The default backend delivers within one process; with several workers set
+# AUDIT_EVENTS_BACKEND to a backend over a shared pub/sub channel.
+
+AUDIT_EVENTS_BACKEND = os.environ.get('AUDIT_EVENTS_BACKEND', 'core.events.LocalBackend')
+AUDIT_EVENTS_KEEPALIVE = int(os.environ.get('AUDIT_EVENTS_KEEPALIVE', 15))
+
+
+# Query instrumentation
+# Per-view SQL query budgets, keyed by URL name. Views without an entry fall
+# back to QUERY_BUDGET_DEFAULT. With QUERY_BUDGET_STRICT a view that goes over
+# raises QueryBudgetExceeded instead of logging a warning (the tests enable it).
+
+QUERY_INSTRUMENTATION = True
+QUERY_BUDGET_STRICT = False
+QUERY_BUDGET_DEFAULT = 25
+QUERY_BUDGETS = {
+    'core:manager_dashboard': 12,
+    'core:manager_dashboard_stats': 8,
+    'core:auditor_dashboard': 8,
+    'core:department_dashboard': 8,
+    'core:project_detail': 8,
+    'core:projects_list': 5,
+    'core:plans_list': 5,
+    'core:issues_list': 5,
+    'core:reports_list': 5,
+    # Includes the final report build when AUDIT_JOBS_EAGER runs it inline.
+    'core:final_manager_review': 30,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('AUDIT_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 LOGIN_REDIRECT_URL = 'core:dashboard'
 LOGIN_URL = '/accounts/login/'   
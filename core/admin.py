@@ -3,65 +3,97 @@ from .models import (
     Department, AuditProject, AuditAssignment,
     AuditPlan, AuditIssue, AuditReport, FinalReport
 )
+from .pagination import EstimatedCountPaginator
+
+
+class AuditModelAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables that grow large: related columns are
+    joined in (also on the change and delete pages, which print ``__str__``),
+    big unfiltered lists get an estimated total, and filtered lists are
+    counted once rather than twice.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.list_select_related:
+            queryset = queryset.select_related(*self.list_select_related)
+        return queryset
 
 
 @admin.register(Department)
-class DepartmentAdmin(admin.ModelAdmin):
+class DepartmentAdmin(AuditModelAdmin):
     list_display = ['name', 'manager', 'created_at']
+    list_select_related = ['manager']
     list_filter = ['created_at']
     search_fields = ['name', 'manager__username', 'manager__first_name', 'manager__last_name']
+    autocomplete_fields = ['manager']
     ordering = ['name']
 
 
 @admin.register(AuditProject)
-class AuditProjectAdmin(admin.ModelAdmin):
+class AuditProjectAdmin(AuditModelAdmin):
     list_display = ['title', 'department', 'status', 'created_by', 'created_at']
+    list_select_related = ['department', 'created_by']
     list_filter = ['status', 'department', 'created_at']
     search_fields = ['title', 'description', 'department__name', 'created_by__username']
+    autocomplete_fields = ['department', 'created_by']
     ordering = ['-created_at']
     readonly_fields = ['created_at']
 
 
 @admin.register(AuditAssignment)
-class AuditAssignmentAdmin(admin.ModelAdmin):
+class AuditAssignmentAdmin(AuditModelAdmin):
     list_display = ['project', 'auditor', 'assigned_by', 'assigned_at']
+    list_select_related = ['project', 'auditor', 'assigned_by']
     list_filter = ['assigned_at', 'project__department']
     search_fields = ['project__title', 'auditor__username', 'assigned_by__username']
+    autocomplete_fields = ['project', 'auditor', 'assigned_by']
     ordering = ['-assigned_at']
     readonly_fields = ['assigned_at']
 
 
 @admin.register(AuditPlan)
-class AuditPlanAdmin(admin.ModelAdmin):
+class AuditPlanAdmin(AuditModelAdmin):
     list_display = ['project', 'created_by', 'status', 'created_at', 'manager_reviewed_at']
-    list_filter = ['status', 'created_at', 'manager_reviewed_at', 'project__department']
+    list_select_related = ['project', 'created_by']
+    list_filter = ['status', 'created_at', 'project__department']
     search_fields = ['project__title', 'description', 'created_by__username']
+    autocomplete_fields = ['project', 'created_by']
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'manager_reviewed_at']
 
 
 @admin.register(AuditIssue)
-class AuditIssueAdmin(admin.ModelAdmin):
+class AuditIssueAdmin(AuditModelAdmin):
     list_display = ['project', 'created_by', 'status', 'created_at', 'manager_reviewed_at']
-    list_filter = ['status', 'created_at', 'manager_reviewed_at', 'project__department']
+    list_select_related = ['project', 'created_by']
+    list_filter = ['status', 'created_at', 'project__department']
     search_fields = ['project__title', 'description', 'created_by__username']
+    autocomplete_fields = ['project', 'created_by']
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'manager_reviewed_at']
 
 
 @admin.register(AuditReport)
-class AuditReportAdmin(admin.ModelAdmin):
+class AuditReportAdmin(AuditModelAdmin):
     list_display = ['project', 'created_by', 'status', 'created_at']
+    list_select_related = ['project', 'created_by']
     list_filter = ['status', 'created_at', 'project__department']
     search_fields = ['project__title', 'description', 'created_by__username']
+    autocomplete_fields = ['project', 'created_by']
     ordering = ['-created_at']
     readonly_fields = ['created_at']
 
 
 @admin.register(FinalReport)
-class FinalReportAdmin(admin.ModelAdmin):
-    list_display = ['project', 'created_at']
+class FinalReportAdmin(AuditModelAdmin):
+    list_display = ['project', 'status', 'created_at']
+    list_select_related = ['project']
     list_filter = ['created_at', 'project__department']
     search_fields = ['project__title', 'content']
+    autocomplete_fields = ['project']
     ordering = ['-created_at']
     readonly_fields = ['created_at']
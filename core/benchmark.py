@@ -0,0 +1,263 @@
+"""
+End-to-end benchmark of the audit workflow.
+
+Workers drive whole project lifecycles, from ``project_create`` through
+``final_manager_review``, plus the dashboard and list pages each role
+looks at along the way, through the full URL and middleware stack with
+Django's test client. Every request is timed, and its SQL query count is
+read from the ``Server-Timing`` header that ``QueryBudgetMiddleware``
+adds. Results are summarised per view as latency percentiles and query
+counts, saved as JSON, and :func:`compare` flags the views that got slower
+or started running more queries between two saved runs.
+
+The benchmark writes to the configured database: it generates a dataset
+with core/seeding.py first and removes it afterwards, so point it at a
+staging copy rather than at production.
+"""
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.test import Client
+from django.urls import reverse
+
+from .models import AuditIssue, AuditPlan, AuditProject, AuditReport, FinalReport, Job
+from .seeding import remove, text
+
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+PERCENTILES = (50, 90, 95, 99)
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Sample(NamedTuple):
+    view: str
+    seconds: float
+    queries: int
+
+
+def benchmark_host():
+    """A host name the configured ``ALLOWED_HOSTS`` accepts."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+def database_profile():
+    database = settings.DATABASES['default']
+    profile = {
+        'vendor': connection.vendor,
+        'conn_max_age': database.get('CONN_MAX_AGE', 0),
+        'pool': bool(database.get('OPTIONS', {}).get('pool')),
+    }
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            profile['journal_mode'] = cursor.fetchone()[0]
+        profile['transaction_mode'] = database.get('OPTIONS', {}).get('transaction_mode', 'DEFERRED')
+    return profile
+
+
+# ---- Driving the workflow ----
+class Session:
+    """One worker's logged-in clients, one per role, and the samples they recorded."""
+
+    def __init__(self, dataset, worker, seed=0):
+        self.rng = random.Random(seed + worker)
+        self.department_id = dataset.department_ids[worker % len(dataset.department_ids)]
+        self.auditor_id = dataset.auditor_ids[worker % len(dataset.auditor_ids)]
+        users = {
+            'manager': dataset.manager_ids[worker % len(dataset.manager_ids)],
+            'auditor': self.auditor_id,
+            'head': dataset.head_ids[worker % len(dataset.head_ids)],
+        }
+        self.clients = {}
+        for role, user_id in users.items():
+            client = Client(HTTP_HOST=benchmark_host())
+            client.force_login(User.objects.get(pk=user_id))
+            self.clients[role] = client
+        self.samples = []
+
+    def request(self, role, method, name, *args, data=None, htmx=False):
+        url = reverse(name, args=args)
+        headers = {'HX-Request': 'true'} if htmx else {}
+        started = time.perf_counter()
+        response = getattr(self.clients[role], method)(url, data or {}, headers=headers)
+        elapsed = time.perf_counter() - started
+        if response.status_code not in (200, 202, 302):
+            raise BenchmarkError(f'{method.upper()} {url} answered {response.status_code}')
+        match = QUERIES_RE.search(response.get('Server-Timing', ''))
+        self.samples.append(Sample(f'{method.upper()} {name}', elapsed, int(match.group(1)) if match else None))
+        return response
+
+    def lifecycle(self, title):
+        """Take a new project called ``title`` from creation to a finalised report; returns its id."""
+        self.request('manager', 'post', 'core:project_create', htmx=True, data={
+            'title': title, 'description': text(self.rng, 40),
+            'department': self.department_id, 'auditors': [self.auditor_id],
+        })
+        project_id = AuditProject.objects.values_list('pk', flat=True).get(title=title)
+        self.request('manager', 'get', 'core:project_detail', project_id)
+
+        self.request('auditor', 'get', 'core:auditor_dashboard')
+        self.request('auditor', 'post', 'core:plan_create', project_id, htmx=True,
+                     data={'description': text(self.rng, 30)})
+        plan_id = AuditPlan.objects.values_list('pk', flat=True).get(project_id=project_id)
+        self.request('manager', 'get', 'core:manager_dashboard')
+        self.request('manager', 'post', 'core:plan_review', plan_id, htmx=True,
+                     data={'action': 'approve', 'manager_notes': text(self.rng, 8)})
+
+        self.request('auditor', 'post', 'core:issue_create', project_id, htmx=True,
+                     data={'description': text(self.rng, 25)})
+        issue_id = AuditIssue.objects.values_list('pk', flat=True).get(project_id=project_id)
+        self.request('manager', 'get', 'core:issues_list')
+        self.request('manager', 'post', 'core:issue_review', issue_id, htmx=True,
+                     data={'action': 'approve', 'manager_notes': text(self.rng, 8)})
+
+        self.request('auditor', 'post', 'core:report_create', project_id, htmx=True,
+                     data={'description': text(self.rng, 60)})
+        report_id = AuditReport.objects.values_list('pk', flat=True).get(project_id=project_id)
+        self.request('manager', 'get', 'core:reports_list')
+        self.request('manager', 'post', 'core:report_review', report_id, htmx=True,
+                     data={'action': 'approve', 'manager_notes': text(self.rng, 10)})
+        self.request('manager', 'post', 'core:report_send_to_department', report_id)
+
+        self.request('head', 'get', 'core:department_dashboard')
+        self.request('head', 'post', 'core:department_report_review', report_id, htmx=True,
+                     data={'department_notes': text(self.rng, 12)})
+        self.request('auditor', 'post', 'core:auditor_final_review', report_id, htmx=True,
+                     data={'action': 'approve', 'auditor_notes': text(self.rng, 12)})
+        self.request('manager', 'post', 'core:final_manager_review', report_id, htmx=True,
+                     data={'action': 'approve', 'final_notes': text(self.rng, 12)})
+
+        self.request('manager', 'get', 'core:projects_list')
+        self.request('manager', 'get', 'core:search', data={'q': self.rng.choice(('payroll', 'vendor', 'risk'))})
+        if not AuditProject.objects.filter(pk=project_id, status='finalized').exists():
+            raise BenchmarkError(f'Project {project_id} did not reach "finalized".')
+        return project_id
+
+
+def worker(dataset, index, lifecycles, tag, seed):
+    """Run ``lifecycles`` lifecycles; returns ``(samples, completed, errors)``."""
+    errors = Counter()
+    completed = 0
+    try:
+        session = Session(dataset, index, seed)
+        for n in range(lifecycles):
+            try:
+                session.lifecycle(f'{tag} worker {index} lifecycle {n}')
+                completed += 1
+            except (BenchmarkError, DatabaseError, AuditProject.DoesNotExist,
+                    AuditPlan.DoesNotExist, AuditIssue.DoesNotExist, AuditReport.DoesNotExist) as e:
+                errors[f'{type(e).__name__}: {str(e).splitlines()[0][:120]}'] += 1
+        return session.samples, completed, errors
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+def run(dataset, *, workers=4, lifecycles=5, warmup=1, tag='benchmark', seed=0):
+    """Drive the lifecycles on ``dataset`` and return the summarised results."""
+    if warmup:
+        # Compile templates and fill per-process caches before measuring.
+        worker(dataset, 0, warmup, f'{tag} warmup', seed)
+
+    started = time.perf_counter()
+    if workers == 1:
+        outcomes = [worker(dataset, 0, lifecycles, tag, seed)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(lambda i: worker(dataset, i, lifecycles, tag, seed), range(workers)))
+    elapsed = time.perf_counter() - started
+
+    samples, errors, completed = [], Counter(), 0
+    for worker_samples, worker_completed, worker_errors in outcomes:
+        samples += worker_samples
+        completed += worker_completed
+        errors.update(worker_errors)
+    return {
+        'profile': database_profile(),
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'lifecycles': {'completed': completed, 'failed': sum(errors.values())},
+        'requests_per_sec': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'errors': dict(errors),
+        'views': summarise(samples),
+    }
+
+
+def cleanup(dataset):
+    """Remove ``dataset``, the projects the lifecycles added to it and the final report jobs they queued."""
+    final_reports = FinalReport.objects.filter(project__department_id__in=dataset.department_ids)
+    Job.objects.filter(
+        kind='build_final_report', payload__final_report_id__in=list(final_reports.values_list('pk', flat=True)),
+    ).delete()
+    remove(dataset.prefix)
+
+
+# ---- Results ----
+def percentile(values, p):
+    """The ``p``-th percentile of sorted ``values``, by linear interpolation."""
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarise(samples):
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample.view].append(sample)
+    views = {}
+    for view, rows in sorted(by_view.items()):
+        seconds = sorted(row.seconds for row in rows)
+        queries = [row.queries for row in rows if row.queries is not None]
+        summary = {'requests': len(rows), 'mean_ms': round(statistics.fmean(seconds) * 1000, 2)}
+        for p in PERCENTILES:
+            summary[f'p{p}_ms'] = round(percentile(seconds, p) * 1000, 2)
+        summary['max_ms'] = round(seconds[-1] * 1000, 2)
+        if queries:
+            summary['queries_median'] = statistics.median(queries)
+            summary['queries_max'] = max(queries)
+        views[view] = summary
+    return views
+
+
+class Regression(NamedTuple):
+    view: str
+    metric: str
+    baseline: float
+    current: float
+
+
+def compare(baseline, current, *, threshold=0.2, min_ms=2.0, metric='p95_ms'):
+    """
+    The regressions between two saved runs: views whose ``metric`` latency
+    grew by more than ``threshold`` (a fraction) and by more than ``min_ms``
+    (so noise on very fast views is ignored), and views whose highest query
+    count went up at all.
+    """
+    regressions = []
+    for view, now in current['views'].items():
+        before = baseline['views'].get(view)
+        if before is None:
+            continue
+        if now[metric] > before[metric] * (1 + threshold) and now[metric] - before[metric] > min_ms:
+            regressions.append(Regression(view, metric, before[metric], now[metric]))
+        if now.get('queries_max', 0) > before.get('queries_max', now.get('queries_max', 0)):
+            regressions.append(Regression(view, 'queries_max', before['queries_max'], now['queries_max']))
+    return regressions
@@ -0,0 +1,25 @@
+import time
+
+from .roles import get_user_roles, primary_role
+
+
+def roles(request):
+    """Expose the current user's resolved roles to every template."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'user_role': None, 'user_roles': frozenset()}
+
+    return {
+        'user_role': primary_role(user),
+        'user_roles': get_user_roles(user),
+    }
+
+
+def render_timer(request):
+    """
+    Stamp the moment template rendering begins, so QueryBudgetMiddleware can
+    split view time from render time.
+    """
+    if not hasattr(request, '_render_started'):
+        request._render_started = time.perf_counter()
+    return {}
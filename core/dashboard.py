@@ -0,0 +1,126 @@
+from django.db.models import Count, Prefetch, Q
+from django.utils.functional import SimpleLazyObject
+
+from .fragments import cached
+from .models import (
+    AuditAssignment, AuditProject, AuditPlan, AuditIssue, AuditReport, Department, WorkflowHistory,
+)
+from .roles import managed_department_ids
+
+
+RECENT_PROJECTS = 5
+PENDING_PREVIEW = 3
+RECENT_ACTIVITY = 8
+# Fragment-cache scopes the manager dashboard is built from.
+MANAGER_SCOPES = ['projects', 'plans', 'issues', 'reports']
+
+
+def manager_stats():
+    """
+    Counters for the audit manager dashboard.
+
+    Each table is counted once (projects with conditional aggregation), so
+    the whole strip costs four round trips regardless of how many rows there
+    are.
+    """
+    stats = AuditProject.objects.aggregate(
+        total_projects=Count('pk'),
+        active_projects=Count('pk', filter=Q(status='audit_in_progress')),
+        finalized_projects=Count('pk', filter=Q(status='finalized')),
+    )
+    # The pending queues are counted with a WHERE rather than a FILTER clause
+    # so the partial "pending" indexes can answer them without a table scan.
+    stats['pending_plans'] = AuditPlan.objects.filter(status='submitted').count()
+    stats['pending_issues'] = AuditIssue.objects.filter(status='submitted').count()
+    stats['pending_reports'] = AuditReport.objects.filter(status='submitted').count()
+    stats['has_pending'] = bool(
+        stats['pending_plans'] or stats['pending_issues'] or stats['pending_reports']
+    )
+    return stats
+
+
+def cached_manager_stats(request):
+    return cached(request, 'manager_stats', MANAGER_SCOPES, manager_stats)
+
+
+def recent_projects(limit=RECENT_PROJECTS):
+    return (
+        AuditProject.objects
+        .select_related('department', 'stats')
+        .order_by('-created_at', '-id')[:limit]
+    )
+
+
+def pending_preview(model, limit=PENDING_PREVIEW):
+    """The top-N submitted rows of a workflow model, with their project joined."""
+    return (
+        model.objects
+        .filter(status='submitted')
+        .select_related('project')
+        .order_by('-created_at', '-id')[:limit]
+    )
+
+
+def recent_activity(limit=RECENT_ACTIVITY):
+    """The latest workflow transitions, read from the history table's created index."""
+    return (
+        WorkflowHistory.objects
+        .select_related('project', 'actor')
+        .order_by('-created_at', '-id')[:limit]
+    )
+
+
+def manager_dashboard_context(request):
+    # The querysets stay lazy: when their fragments are cached they never run.
+    return {
+        'stats': cached_manager_stats(request),
+        'projects': recent_projects(),
+        'pending_plans': pending_preview(AuditPlan),
+        'pending_issues': pending_preview(AuditIssue),
+        'pending_reports': pending_preview(AuditReport),
+        'activity': recent_activity(),
+    }
+
+
+def department_querysets(department_ids):
+    """
+    The lists of the department manager dashboard for ``department_ids``,
+    each one query on the project's department index: the departments with
+    their project counts, pending reports with their project, department and
+    author joined, and the recent projects plus one prefetch of their
+    auditors. ``explain_queries`` checks these same querysets.
+    """
+    departments = (
+        Department.objects
+        .filter(pk__in=department_ids)
+        .annotate(project_count=Count('audit_projects'))
+        .order_by('name')
+    )
+    pending_reports = (
+        AuditReport.objects
+        .filter(project__department_id__in=department_ids, status='sent_to_department')
+        .select_related('project__department', 'created_by')
+        .order_by('-created_at', '-id')
+    )
+    projects = (
+        AuditProject.objects
+        .filter(department_id__in=department_ids)
+        .prefetch_related(Prefetch(
+            'assignments', queryset=AuditAssignment.objects.select_related('auditor').order_by('assigned_at', 'id'),
+        ))
+        .order_by('-created_at', '-id')[:RECENT_PROJECTS]
+    )
+    return departments, pending_reports, projects
+
+
+def department_dashboard_context(user):
+    """The department manager dashboard, across every department ``user`` manages."""
+    department_ids = managed_department_ids(user)
+    departments, pending_reports, projects = department_querysets(department_ids)
+    return {
+        'departments': departments,
+        'department_scopes': [f'department:{pk}' for pk in department_ids],
+        'pending_reports': pending_reports,
+        'projects': projects,
+        'project_count': SimpleLazyObject(lambda: sum(department.project_count for department in departments)),
+    }
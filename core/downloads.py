@@ -0,0 +1,155 @@
+"""
+Serving files from disk: attachments, cached PDFs and final reports.
+
+:func:`serve_file` answers conditional requests (ETag / Last-Modified)
+itself and then either hands the transfer to the front-end server with
+``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd), per
+``settings.AUDIT_SENDFILE``, or streams the file from Python with
+:func:`ranged_file_response`. Either way no worker holds a large file in
+memory, and under a server with ``wsgi.file_wrapper`` the Python path is
+sent with ``sendfile`` too.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    A read-only window onto ``[start, start + length)`` of an open file.
+
+    It keeps ``fileno()`` so a server with ``wsgi.file_wrapper`` can still
+    hand the window to ``sendfile``, while a plain ``read()`` loop (runserver,
+    FileResponse's own iterator) stops at the end of the range.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        self.file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single-range ``Range`` header,
+    ``None`` if the header should be ignored, or ``False`` if it cannot be
+    satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes.
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def ranged_file_response(request, path, content_type, filename=None, as_attachment=False, etag=None):
+    """Serve ``path`` with ``FileResponse``, honouring a single HTTP range."""
+    size = os.path.getsize(path)
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if byte_range and if_range and if_range != etag:
+        # The client's partial copy is of another version: send it all.
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(
+            file, content_type=content_type, filename=filename, as_attachment=as_attachment,
+        )
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            FileRange(file, start, length), status=206, content_type=content_type,
+            filename=filename, as_attachment=as_attachment,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def sendfile_response(path, content_type, filename=None, as_attachment=False):
+    """
+    Hand ``path`` to the front-end server, or return ``None`` when
+    ``settings.AUDIT_SENDFILE`` is off or cannot serve it.
+    """
+    backend = getattr(settings, 'AUDIT_SENDFILE', '')
+    if backend == 'nginx':
+        root = os.path.join(os.path.realpath(settings.MEDIA_ROOT), '')
+        path = os.path.realpath(path)
+        if not path.startswith(root):
+            return None
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.AUDIT_SENDFILE_PREFIX + quote(path[len(root):])
+    elif backend == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        return None
+    disposition = content_disposition_header(as_attachment, filename or os.path.basename(path))
+    if disposition:
+        response['Content-Disposition'] = disposition
+    return response
+
+
+def serve_file(request, path, content_type, filename=None, as_attachment=False, etag=None):
+    """
+    Serve ``path`` with validators, answering ``If-None-Match`` and
+    ``If-Modified-Since`` with a 304. ``etag`` defaults to one built from
+    the file's size and modification time.
+    """
+    stat = os.stat(path)
+    etag = quote_etag(etag or f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = (
+            sendfile_response(path, content_type, filename, as_attachment)
+            or ranged_file_response(request, path, content_type, filename, as_attachment, etag=etag)
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,167 @@
+"""
+Push notifications of workflow status changes, as server-sent events.
+
+A status change (a new or transitioned plan, issue, report or project) is
+published after its transaction commits to the *topics* it affects. Topics
+are the dashboard fragment scopes of core/fragments.py: ``plans``,
+``projects``, ``user:7``, ``department:3`` and so on, so an event tells a
+dashboard exactly which cached fragments went stale. Each open ``/events/``
+stream subscribes to the scopes its user's dashboard is built from, and the
+dashboard templates re-fetch just the fragment an event names.
+
+Delivery goes through a backend named by ``settings.AUDIT_EVENTS_BACKEND``.
+The default :class:`LocalBackend` fans out within one process, which serves
+runserver, a single ASGI worker and the tests; a deployment with several
+workers plugs in a backend over a shared pub/sub channel with the same
+``publish``/``subscribe``/``unsubscribe`` methods.
+
+Streams need the ASGI application (audit/asgi.py): under WSGI the view
+answers 204, which tells ``EventSource`` not to reconnect.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .dashboard import MANAGER_SCOPES
+from .models import AuditIssue, AuditPlan, AuditProject, AuditReport
+from .roles import AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS, get_user_roles, managed_department_ids
+
+
+EVENT_NAMES = {
+    AuditPlan: 'plan',
+    AuditIssue: 'issue',
+    AuditReport: 'report',
+    AuditProject: 'project',
+}
+KEEPALIVE = 15
+QUEUE_SIZE = 100
+# How long a browser waits before reconnecting a dropped stream, in ms.
+RETRY_MS = 5000
+
+
+class Event(NamedTuple):
+    name: str
+    object_id: int
+    project_id: int
+    status: str
+
+    def encode(self):
+        data = json.dumps({'id': self.object_id, 'project': self.project_id, 'status': self.status})
+        return f'event: {self.name}\ndata: {data}\n\n'.encode()
+
+
+def event_for(instance, status=None):
+    model = type(instance)
+    project_id = instance.pk if model is AuditProject else instance.project_id
+    return Event(EVENT_NAMES[model], instance.pk, project_id, status or instance.status)
+
+
+# ---- Backends ----
+class Subscription:
+    """One stream's queue, fed from any thread and read on its event loop."""
+
+    def __init__(self, topics, queue_size=QUEUE_SIZE):
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind re-fetches on the next event anyway.
+            pass
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalBackend:
+    """Fan events out to the subscriptions of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+    def publish(self, topics, event):
+        # A stream on several of the topics still gets the event once.
+        with self._lock:
+            targets = set().union(*(self._subscriptions.get(topic, ()) for topic in topics))
+        for subscription in targets:
+            subscription.put(event)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(getattr(settings, 'AUDIT_EVENTS_BACKEND', 'core.events.LocalBackend'))()
+        return _backend
+
+
+# ---- Publishing ----
+def publish(topics, event):
+    """Send ``event`` to the streams on any of ``topics`` once the current transaction commits."""
+    topics = {topic for topic in topics if topic}
+    if topics:
+        transaction.on_commit(lambda: backend().publish(topics, event))
+
+
+def user_topics(user):
+    """The fragment scopes ``user``'s dashboard is built from."""
+    roles = get_user_roles(user)
+    topics = set()
+    if AUDIT_MANAGERS in roles:
+        topics.update(MANAGER_SCOPES)
+    if AUDITORS in roles:
+        topics.add(f'user:{user.pk}')
+    if DEPARTMENT_MANAGERS in roles:
+        topics.update(f'department:{pk}' for pk in managed_department_ids(user))
+    return topics
+
+
+# ---- Streaming ----
+async def stream(topics):
+    """Server-sent event frames for ``topics``, with a comment line as keepalive."""
+    keepalive = getattr(settings, 'AUDIT_EVENTS_KEEPALIVE', KEEPALIVE)
+    subscription = backend().subscribe(topics)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        while True:
+            try:
+                event = await subscription.get(keepalive)
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+            else:
+                yield event.encode()
+    finally:
+        backend().unsubscribe(subscription)
@@ -0,0 +1,315 @@
+"""
+Streaming CSV and XLSX exports of projects, issues and reports.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)``, so no
+model instances are built and only one chunk of rows is in memory at a
+time, and they are written out as they arrive: the views wrap the
+generators below in a ``StreamingHttpResponse`` and ``manage.py
+export_data`` writes them to a file. Memory stays flat however many rows
+the export covers.
+
+XLSX files are written by hand rather than through a spreadsheet library:
+a workbook is a zip of a few fixed XML parts plus one sheet, and the sheet
+is streamed into the zip (as ZIP64, since its size is not known up front)
+one row at a time.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, time
+from typing import NamedTuple
+
+from django.core.exceptions import BadRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import AuditIssue, AuditProject, AuditReport
+from .search import visible_projects
+
+
+CHUNK_SIZE = 2000
+FLUSH_SIZE = 64 * 1024
+# CSV text starting with one of these is read as a formula by spreadsheet
+# programs, so it gets a leading apostrophe. XLSX inline strings are never
+# evaluated and are written as they are.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Export(NamedTuple):
+    model: type
+    # (header, values_list lookup) pairs, in column order.
+    columns: tuple
+    # Lookup from the exported model to its project.
+    project: str
+
+
+EXPORTS = {
+    'projects': Export(AuditProject, (
+        ('id', 'pk'),
+        ('title', 'title'),
+        ('department', 'department__name'),
+        ('status', 'status'),
+        ('created_by', 'created_by__username'),
+        ('created_at', 'created_at'),
+        ('description', 'description'),
+    ), 'pk'),
+    'issues': Export(AuditIssue, (
+        ('id', 'pk'),
+        ('project_id', 'project_id'),
+        ('project', 'project__title'),
+        ('department', 'project__department__name'),
+        ('status', 'status'),
+        ('created_by', 'created_by__username'),
+        ('created_at', 'created_at'),
+        ('manager_reviewed_at', 'manager_reviewed_at'),
+        ('description', 'description'),
+        ('manager_notes', 'manager_notes'),
+    ), 'project'),
+    'reports': Export(AuditReport, (
+        ('id', 'pk'),
+        ('project_id', 'project_id'),
+        ('project', 'project__title'),
+        ('department', 'project__department__name'),
+        ('status', 'status'),
+        ('created_by', 'created_by__username'),
+        ('created_at', 'created_at'),
+        ('description', 'description'),
+        ('manager_notes', 'manager_notes'),
+        ('department_notes', 'department_notes'),
+        ('auditor_final_notes', 'auditor_final_notes'),
+        ('final_manager_notes', 'final_manager_notes'),
+    ), 'project'),
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+# ---- Selecting rows ----
+def parse_filters(export, params):
+    """
+    The department, status and ``since``/``until`` date filters in
+    ``params`` (a QueryDict or plain dict) as queryset lookups.
+    """
+    filters = {}
+    department = params.get('department')
+    if department:
+        try:
+            department = int(department)
+        except (TypeError, ValueError):
+            raise BadRequest('Invalid department.')
+        path = 'department_id' if export.project == 'pk' else f'{export.project}__department_id'
+        filters[path] = department
+
+    status = params.get('status')
+    if status:
+        if status not in dict(export.model.STATUS_CHOICES):
+            raise BadRequest(f'Unknown status {status!r}.')
+        filters['status'] = status
+
+    for name, lookup, bound in (('since', 'created_at__gte', time.min), ('until', 'created_at__lte', time.max)):
+        value = params.get(name)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise BadRequest(f'Invalid {name} date {value!r}; use YYYY-MM-DD.')
+        filters[lookup] = timezone.make_aware(datetime.combine(day, bound))
+    return filters
+
+
+def export_rows(kind, filters=None, user=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the header and then every row of ``kind`` matching ``filters``,
+    oldest first, limited to the projects ``user`` may see (all of them
+    when ``user`` is ``None``).
+    """
+    export = EXPORTS[kind]
+    rows = export.model.objects.filter(**(filters or {}))
+    if user is not None:
+        projects = visible_projects(user)
+        if projects is not None:
+            rows = rows.filter(**{f'{export.project}__in': projects})
+    yield tuple(header for header, _ in export.columns)
+    yield from (
+        rows.order_by('pk')
+        .values_list(*(lookup for _, lookup in export.columns))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def cell_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+    return value
+
+
+def csv_value(value):
+    value = cell_value(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+# ---- CSV ----
+def csv_stream(rows):
+    """Encode ``rows`` as CSV, yielding about ``FLUSH_SIZE`` characters at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([csv_value(value) for value in row])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# ---- XLSX ----
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Style 1 shows a date serial as a date and time.
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+MAX_CELL_TEXT = 32767
+# Characters XML 1.0 cannot carry at all.
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+class _Sink(io.RawIOBase):
+    """An unseekable file that keeps what is written until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def xml_text(value):
+    value = INVALID_XML_RE.sub('', value[:MAX_CELL_TEXT])
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    value = cell_value(value)
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, date):
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, time.min)
+        serial = (value - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="1"><v>{serial:.8f}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{xml_text(str(value))}</t></is></c>'
+
+
+def xlsx_stream(rows, sheet='Export'):
+    """Encode ``rows`` as a one-sheet XLSX workbook, yielding the zip as it is written."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content.replace('{sheet}', xml_text(sheet)))
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as part:
+            buffer = [SHEET_START]
+            size = len(SHEET_START)
+            for row in rows:
+                line = '<row>' + ''.join(xlsx_cell(value) for value in row) + '</row>'
+                buffer.append(line)
+                size += len(line)
+                if size >= FLUSH_SIZE:
+                    part.write(''.join(buffer).encode())
+                    buffer, size = [], 0
+                    data = sink.drain()
+                    if data:
+                        yield data
+            buffer.append(SHEET_END)
+            part.write(''.join(buffer).encode())
+    yield sink.drain()
+
+
+def stream(kind, fmt, filters=None, user=None, chunk_size=CHUNK_SIZE):
+    """The encoded export of ``kind`` in ``fmt`` (``csv`` or ``xlsx``), chunk by chunk."""
+    rows = export_rows(kind, filters, user, chunk_size)
+    if fmt == 'xlsx':
+        return xlsx_stream(rows, sheet=kind)
+    return csv_stream(rows)
@@ -0,0 +1,104 @@
+"""
+Generation-counter caching for dashboard fragments.
+
+Every cached fragment names the *scopes* it is built from, e.g. ``plans``
+(the submitted-plan queue), ``user:7`` (auditor 7's own work) or
+``department:3``. Each scope has a generation counter in the cache, and the
+fragment's key includes the current generation of all of its scopes. A
+workflow save bumps the counters of the scopes it touches (see
+core/signals.py), which moves every affected fragment to a fresh key; other
+fragments stay cached, and stale entries simply age out.
+
+Hits and misses are counted on the request and reported by
+QueryBudgetMiddleware alongside the query metrics.
+"""
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+FRAGMENT_TIMEOUT = 5 * 60
+
+
+def _generation_key(scope):
+    return f'core:frag:gen:{scope}'
+
+
+def fragment_timeout():
+    return getattr(settings, 'AUDIT_FRAGMENT_TIMEOUT', FRAGMENT_TIMEOUT)
+
+
+def generations(scopes):
+    """Current generation of each scope, in one cache round trip."""
+    keys = {scope: _generation_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    missing = {key: None for key in keys.values() if key not in found}
+    if missing:
+        # Seed from the clock rather than 0, so a counter that was evicted
+        # cannot come back at a value some old fragment was stored under.
+        seed = time.time_ns()
+        missing = dict.fromkeys(missing, seed)
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for scope, key in keys.items()}
+
+
+def _bump_now(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_generation_key(scope))
+        except ValueError:
+            cache.set(_generation_key(scope), time.time_ns(), None)
+
+
+def bump(*scopes):
+    """
+    Invalidate every fragment built from any of ``scopes``.
+
+    Inside a transaction the counters are bumped again on commit: a page
+    rendered between the save and the commit still sees the old rows, and
+    must not stay cached under the new generation.
+    """
+    scopes = {scope for scope in scopes if scope}
+    if not scopes:
+        return
+    _bump_now(scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump_now(scopes))
+
+
+def fragment_key(name, scopes, vary=()):
+    current = generations(scopes)
+    parts = [name, *(f'{scope}@{current[scope]}' for scope in sorted(current)), *map(str, vary)]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'core:frag:{name}:{digest}'
+
+
+def record(request, outcome):
+    if request is None:
+        return
+    if not hasattr(request, '_fragment_cache'):
+        request._fragment_cache = Counter()
+    request._fragment_cache[outcome] += 1
+
+
+def cached(request, name, scopes, build, vary=()):
+    """Return the cached value of fragment ``name``, building it on a miss."""
+    key = fragment_key(name, scopes, vary)
+    value = cache.get(key)
+    if value is not None:
+        record(request, 'hit')
+        return value
+    record(request, 'miss')
+    value = build()
+    cache.set(key, value, fragment_timeout())
+    return value
+
+
+def request_stats(request):
+    counts = getattr(request, '_fragment_cache', None) or {}
+    return counts.get('hit', 0), counts.get('miss', 0)
@@ -0,0 +1,182 @@
+"""
+A small database-backed job queue.
+
+Views call ``enqueue`` to store a ``Job`` row; the ``run_jobs`` management
+command claims queued rows one at a time and runs the handler registered for
+their ``kind``. With ``settings.AUDIT_JOBS_EAGER`` the handler runs inline
+instead, which is what the tests and a worker-less development server use.
+
+A failed job is retried after an exponential backoff (``run_after``) and
+marked failed after ``MAX_ATTEMPTS``. While a worker runs a job it refreshes
+the job's ``heartbeat_at``, so :func:`requeue_stale` only takes back jobs
+whose worker has died, however long a healthy job runs.
+
+Handlers run outside any transaction: with SQLite's ``IMMEDIATE``
+transactions an atomic block holds the write lock from its first query, so
+a handler does its slow work first and persists the result in a short
+atomic block of its own at the end.
+"""
+import contextlib
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# Seconds before the first retry; doubled for every further attempt.
+RETRY_BACKOFF = 30
+
+_handlers = {}
+_failure_handlers = {}
+
+
+def job(kind, on_failure=None):
+    """
+    Register the decorated function as the handler for ``kind`` jobs.
+
+    ``on_failure`` is called with the job payload once the last attempt has
+    failed, so the handler can record the failure on its own objects.
+    """
+    def register(func):
+        _handlers[kind] = func
+        if on_failure:
+            _failure_handlers[kind] = on_failure
+        return func
+    return register
+
+
+def enqueue(kind, /, **payload):
+    if kind not in _handlers:
+        raise KeyError(f'No job handler registered for {kind!r}.')
+
+    queued = Job.objects.create(kind=kind, payload=payload)
+    if getattr(settings, 'AUDIT_JOBS_EAGER', False):
+        claimed = Job.objects.filter(pk=queued.pk, status='queued').update(
+            status='running', started_at=timezone.now(), attempts=1,
+        )
+        if claimed:
+            queued.refresh_from_db()
+            # No worker will come back for it, so a failure is final.
+            run(queued, retry=False)
+    return queued
+
+
+def claim_next():
+    """
+    Atomically move the oldest queued job to ``running`` and return it.
+
+    The conditional UPDATE makes the claim safe with several workers: whoever
+    loses the race simply sees zero rows updated and tries the next job.
+    """
+    while True:
+        candidate = (
+            Job.objects.filter(status='queued')
+            .filter(Q(run_after__isnull=True) | Q(run_after__lte=timezone.now()))
+            .order_by('created_at', 'id')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        claimed = Job.objects.filter(pk=candidate, status='queued').update(
+            status='running', started_at=timezone.now(), heartbeat_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=candidate)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def fail(job_id, kind, payload, **fields):
+    """Mark a job failed for good and let its handler record the failure."""
+    Job.objects.filter(pk=job_id).update(status='failed', finished_at=timezone.now(), **fields)
+    if kind in _failure_handlers:
+        _failure_handlers[kind](**payload)
+
+
+@contextlib.contextmanager
+def heartbeat(job_id, interval):
+    """Refresh the job's ``heartbeat_at`` every ``interval`` seconds until the block exits."""
+    if not interval:
+        yield
+        return
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    Job.objects.filter(pk=job_id, status='running').update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # Best effort: SQLite may be locked by another writer.
+                    logger.warning('Could not refresh the heartbeat of job %s', job_id)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(claimed, retry=True, heartbeat_interval=None):
+    """
+    Run a claimed job, outside any transaction. A failure is queued again
+    after ``retry_delay`` unless ``retry`` is false or it was the last
+    attempt.
+    """
+    handler = _handlers.get(claimed.kind)
+    try:
+        if handler is None:
+            raise KeyError(f'No job handler registered for {claimed.kind!r}.')
+        with heartbeat(claimed.pk, heartbeat_interval):
+            handler(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s failed (attempt %s)', claimed.pk, claimed.attempts)
+        if retry and handler and claimed.attempts < MAX_ATTEMPTS:
+            Job.objects.filter(pk=claimed.pk).update(
+                status='queued', error=error, finished_at=timezone.now(),
+                run_after=timezone.now() + retry_delay(claimed.attempts),
+            )
+        else:
+            fail(claimed.pk, claimed.kind, claimed.payload, error=error)
+        return False
+
+    Job.objects.filter(pk=claimed.pk).update(status='done', error='', finished_at=timezone.now())
+    return True
+
+
+def requeue_stale(timeout):
+    """
+    Take back running jobs whose heartbeat is older than ``timeout`` seconds,
+    i.e. whose worker died. Jobs out of attempts are failed instead.
+    Returns ``(requeued, failed)``.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = Job.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    failed = 0
+    for job_id, kind, payload in stale.filter(attempts__gte=MAX_ATTEMPTS).values_list('pk', 'kind', 'payload'):
+        # Conditional, so a job that finished meanwhile is left alone.
+        if Job.objects.filter(pk=job_id, status='running').update(error='Worker died while running the job.'):
+            fail(job_id, kind, payload)
+            failed += 1
+    requeued = stale.filter(attempts__lt=MAX_ATTEMPTS).update(status='queued')
+    return requeued, failed
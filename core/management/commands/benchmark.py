@@ -0,0 +1,123 @@
+import json
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the full audit workflow through the views and save per-view latency percentiles '
+        'and query counts as JSON ("run"), or flag regressions between two saved runs ("compare"). '
+        '"run" writes a scratch dataset to the configured database and removes it afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+
+        run = actions.add_parser('run', help='Generate a dataset, drive the workflow and report')
+        run.add_argument('--output', '-o', help='Write the results to this JSON file')
+        run.add_argument('--workers', type=int, default=4, help='Concurrent workers (1 runs inline)')
+        run.add_argument('--lifecycles', type=int, default=5, help='Project lifecycles per worker')
+        run.add_argument('--warmup', type=int, default=1, help='Unmeasured lifecycles run first')
+        run.add_argument('--departments', type=int, default=5)
+        run.add_argument('--projects', type=int, default=500, help='Background projects to generate')
+        run.add_argument('--auditors', type=int, default=20)
+        run.add_argument('--seed', type=int, default=0)
+        run.add_argument('--keep', action='store_true', help='Leave the generated data in place')
+
+        compare = actions.add_parser('compare', help='Compare two saved runs')
+        compare.add_argument('baseline')
+        compare.add_argument('current')
+        compare.add_argument('--threshold', type=float, default=0.2,
+                             help='Allowed latency growth, as a fraction (default 0.2 = 20%%)')
+        compare.add_argument('--min-ms', type=float, default=2.0,
+                             help='Ignore latency changes smaller than this')
+        compare.add_argument('--metric', default='p95_ms',
+                             choices=[f'p{p}_ms' for p in benchmark.PERCENTILES] + ['mean_ms'])
+
+    def handle(self, *args, **options):
+        if options['action'] == 'compare':
+            return self.compare(options)
+        return self.run(options)
+
+    # ---- run ----
+    def run(self, options):
+        workers = max(1, options['workers'])
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        self.stdout.write(f'Generating {options["projects"]} projects under "{prefix}"...')
+        dataset = seeding.generate(
+            departments=max(options['departments'], 1), projects=options['projects'],
+            auditors=max(options['auditors'], workers), managers=min(workers, 4),
+            seed=options['seed'], prefix=prefix,
+        )
+        try:
+            results = benchmark.run(
+                dataset, workers=workers, lifecycles=options['lifecycles'],
+                warmup=options['warmup'], tag=prefix, seed=options['seed'],
+            )
+        finally:
+            if not options['keep']:
+                benchmark.cleanup(dataset)
+        results['dataset'] = {
+            'prefix': prefix, 'seed': options['seed'], 'departments': len(dataset.department_ids),
+            'projects': len(dataset.project_ids), 'auditors': len(dataset.auditor_ids),
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        self.report(results)
+
+    def report(self, results):
+        profile = ', '.join(f'{key}={value}' for key, value in results['profile'].items())
+        lifecycles = results['lifecycles']
+        self.stdout.write(f'Profile: {profile}')
+        self.stdout.write(
+            f'{results["workers"]} workers, {lifecycles["completed"]} lifecycles in {results["seconds"]}s '
+            f'({results["requests_per_sec"]} requests/s)'
+        )
+        self.stdout.write(f'  {"view":<42} {"n":>5} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8}')
+        for view, row in results['views'].items():
+            self.stdout.write(
+                f'  {view:<42} {row["requests"]:>5} {row["p50_ms"]:>6.1f}ms {row["p95_ms"]:>6.1f}ms '
+                f'{row["p99_ms"]:>6.1f}ms {row.get("queries_max", "-"):>8}'
+            )
+        for message, count in results['errors'].items():
+            self.stdout.write(self.style.ERROR(f'✗ {count}x {message}'))
+        if not results['errors']:
+            self.stdout.write(self.style.SUCCESS('✓ Every lifecycle finished'))
+
+    # ---- compare ----
+    def compare(self, options):
+        runs = []
+        for path in (options['baseline'], options['current']):
+            try:
+                with open(path) as f:
+                    runs.append(json.load(f))
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+        baseline, current = runs
+
+        regressions = benchmark.compare(
+            baseline, current, threshold=options['threshold'], min_ms=options['min_ms'], metric=options['metric'],
+        )
+        metric = options['metric']
+        for view, now in current['views'].items():
+            before = baseline['views'].get(view)
+            if before is None:
+                self.stdout.write(f'  {view:<42} (new)')
+                continue
+            change = (now[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            self.stdout.write(
+                f'  {view:<42} {before[metric]:>8.1f}ms -> {now[metric]:>8.1f}ms {change:>+7.1f}%  '
+                f'queries {before.get("queries_max", "-")} -> {now.get("queries_max", "-")}'
+            )
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'✗ {regression.view}: {regression.metric} {regression.baseline} -> {regression.current}'
+            ))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS('✓ No regressions'))
@@ -0,0 +1,169 @@
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from core.benchmark import database_profile
+from core.models import AuditPlan, AuditProject, Department
+from core.stats import recount
+from core.transitions import TransitionConflict, transition
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer the database with concurrent plan reviews and reads, and report throughput. '
+        'Run it once per settings profile (e.g. AUDIT_SQLITE_TUNING=false vs the default, '
+        'or AUDIT_DB=postgres) to compare them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent threads, each with its own connection (1 runs inline)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run for')
+        parser.add_argument('--plans', type=int, default=50, help='Scratch plans to review')
+        parser.add_argument('--read-ratio', type=float, default=0.5,
+                            help='Share of operations that are dashboard-style reads')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        project = self.create_scratch(options['plans'])
+        plan_ids = list(project.plans.values_list('pk', flat=True))
+        try:
+            results = self.run_load(project.pk, plan_ids, options)
+        finally:
+            Department.objects.filter(pk=project.department_id).delete()
+
+        results['profile'] = database_profile()
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    # ---- Setup ----
+    def create_scratch(self, plan_count):
+        department = Department.objects.create(name='Load test (scratch)')
+        project = AuditProject.objects.create(title='Load test (scratch)', department=department)
+        AuditPlan.objects.bulk_create([
+            AuditPlan(project=project, status='submitted', description=f'Scratch plan {i}')
+            for i in range(plan_count)
+        ])
+        recount([project.pk])
+        return project
+
+    # ---- Load ----
+    def review(self, plan_ids, n):
+        # The same write path as plan_review: a conditional UPDATE on the
+        # version that was read, which raises TransitionConflict if another
+        # worker reviewed the plan in between.
+        plan = AuditPlan.objects.select_related('project').get(pk=random.choice(plan_ids))
+        with transaction.atomic():
+            transition(
+                plan, 'approved' if plan.status == 'submitted' else 'submitted', version=plan.version,
+                manager_notes=f'Load test review {n}', manager_reviewed_at=timezone.now(),
+            )
+
+    def read(self, project_id):
+        list(
+            AuditPlan.objects
+            .filter(project_id=project_id, status='submitted')
+            .select_related('project')
+            .order_by('-created_at', '-id')[:10]
+        )
+
+    def worker(self, project_id, plan_ids, deadline, read_ratio):
+        latencies = {'read': [], 'write': []}
+        errors = Counter()
+        conflicts = n = 0
+        try:
+            while time.perf_counter() < deadline:
+                kind = 'read' if random.random() < read_ratio else 'write'
+                started = time.perf_counter()
+                try:
+                    if kind == 'read':
+                        self.read(project_id)
+                    else:
+                        self.review(plan_ids, n)
+                except TransitionConflict:
+                    conflicts += 1
+                    continue
+                except DatabaseError as e:
+                    errors[str(e).splitlines()[0][:80]] += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - started)
+                n += 1
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+        return latencies, errors, conflicts
+
+    def run_load(self, project_id, plan_ids, options):
+        workers = max(1, options['workers'])
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        args = (project_id, plan_ids, deadline, options['read_ratio'])
+
+        if workers == 1:
+            outcomes = [self.worker(*args)]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = list(pool.map(lambda _: self.worker(*args), range(workers)))
+        elapsed = time.perf_counter() - started
+
+        latencies = {'read': [], 'write': []}
+        errors = Counter()
+        conflicts = 0
+        for worker_latencies, worker_errors, worker_conflicts in outcomes:
+            for kind, values in worker_latencies.items():
+                latencies[kind].extend(values)
+            errors.update(worker_errors)
+            conflicts += worker_conflicts
+
+        results = {
+            'workers': workers,
+            'seconds': round(elapsed, 2),
+            'conflicts': conflicts,
+            'errors': dict(errors),
+        }
+        for kind, values in latencies.items():
+            results[kind] = summarise(values, elapsed)
+        return results
+
+    # ---- Output ----
+    def report(self, results):
+        profile = ', '.join(f'{key}={value}' for key, value in results['profile'].items())
+        self.stdout.write(f'Profile: {profile}')
+        self.stdout.write(f'{results["workers"]} workers for {results["seconds"]}s')
+        for kind in ('write', 'read'):
+            row = results[kind]
+            self.stdout.write(
+                f'  {kind:<5} {row["ops"]:>7} ops  {row["ops_per_sec"]:>8.1f}/s  '
+                f'p50 {row["p50_ms"]:.1f}ms  p95 {row["p95_ms"]:.1f}ms  max {row["max_ms"]:.1f}ms'
+            )
+        # Reviews that lost a race are refused rather than overwriting; not errors.
+        self.stdout.write(f'  {results["conflicts"]} review conflicts')
+        if results['errors']:
+            for message, count in results['errors'].items():
+                self.stdout.write(self.style.ERROR(f'✗ {count}x {message}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ No database errors'))
+
+
+def summarise(values, elapsed):
+    if not values:
+        return {'ops': 0, 'ops_per_sec': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return {
+        'ops': len(values),
+        'ops_per_sec': round(len(values) / elapsed, 1),
+        'p50_ms': round(statistics.median(values) * 1000, 2),
+        'p95_ms': round(p95 * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2),
+    }
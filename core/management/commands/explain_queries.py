@@ -0,0 +1,88 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.dashboard import department_querysets, pending_preview, recent_projects
+from core.models import AuditProject, AuditPlan, AuditIssue, AuditReport
+from core.roles import managed_department_ids
+from core.views import assigned_projects, project_detail_queryset
+
+
+# SQLite: "SCAN core_auditplan" is a full scan unless it walks an index.
+# PostgreSQL: any "Seq Scan" node.
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)(?!.*\bUSING (?:COVERING )?INDEX\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+def view_queries(user):
+    """The querysets each view in core/views.py runs, keyed by view and purpose."""
+    page = slice(0, 26)
+    # An empty scope compiles to no query at all, so stand in a department id.
+    departments, pending_reports, department_projects = department_querysets(managed_department_ids(user) or [0])
+    return [
+        ('manager_dashboard: recent projects', recent_projects()),
+        ('manager_dashboard: pending plans', pending_preview(AuditPlan)),
+        ('manager_dashboard: pending issues', pending_preview(AuditIssue)),
+        ('manager_dashboard: pending reports', pending_preview(AuditReport)),
+        ('manager_dashboard: pending plan count',
+         AuditPlan.objects.filter(status='submitted').values('pk')),
+        ('auditor_dashboard: assigned projects', assigned_projects(user)[page]),
+        ('department_dashboard: departments', departments),
+        ('department_dashboard: reports sent to department', pending_reports),
+        ('department_dashboard: recent projects', department_projects),
+        ('project_detail', project_detail_queryset().filter(pk=1)),
+        ('projects_list', AuditProject.objects.order_by('-created_at', '-id')[page]),
+        ('plans_list', AuditPlan.objects.order_by('-created_at', '-id')[page]),
+        ('issues_list', AuditIssue.objects.order_by('-created_at', '-id')[page]),
+        ('reports_list', AuditReport.objects.order_by('-created_at', '-id')[page]),
+        ('issues_list: auditor',
+         AuditIssue.objects.filter(project__assignments__auditor=user).order_by('-created_at', '-id')[page]),
+        ('report_create: approved issues',
+         AuditIssue.objects.filter(project_id=1, status='approved').values('pk')[:1]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries issued by the core views and report any full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if any query falls back to a full scan')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f'EXPLAIN analysis is not supported for {vendor}.')
+
+        user = User.objects.order_by('pk').first() or User(pk=0)
+        queries = view_queries(user)
+        scans = []
+        for label, queryset in queries:
+            plan = queryset.explain()
+            full_scans = FULL_SCAN_PATTERNS[vendor].findall(plan)
+            sorts = SORT_PATTERNS[vendor].search(plan)
+
+            if full_scans:
+                tables = ', '.join(sorted(set(full_scans)))
+                scans.append(label)
+                self.stdout.write(self.style.ERROR(f'✗ {label}: full scan of {tables}'))
+            elif sorts:
+                self.stdout.write(self.style.WARNING(f'! {label}: index used, but sorted in memory'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {label}'))
+
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+
+        if scans and options['fail_on_scan']:
+            raise CommandError(f'{len(scans)} queries fall back to a full scan.')
+        self.stdout.write(f'\n{len(scans)} of {len(queries)} queries use a full scan.')
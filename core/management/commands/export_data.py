@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import BadRequest
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import CHUNK_SIZE, EXPORTS, FORMATS, parse_filters, stream
+
+
+class Command(BaseCommand):
+    help = 'Stream projects, issues or reports to a CSV or XLSX file without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout, CSV only)')
+        parser.add_argument('--department', help='Department id')
+        parser.add_argument('--status')
+        parser.add_argument('--since', help='First creation date, YYYY-MM-DD')
+        parser.add_argument('--until', help='Last creation date, YYYY-MM-DD')
+        parser.add_argument('--user', help='Only export what this username can see')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        kind, fmt, output = options['kind'], options['format'], options['output']
+        if fmt == 'xlsx' and not output:
+            raise CommandError('XLSX exports need --output.')
+        try:
+            filters = parse_filters(EXPORTS[kind], options)
+        except BadRequest as e:
+            raise CommandError(e)
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {options["user"]!r}.')
+
+        started = time.perf_counter()
+        chunks = stream(kind, fmt, filters, user=user, chunk_size=options['chunk_size'])
+        written = 0
+        if output:
+            with open(output, 'wb') as f:
+                for chunk in chunks:
+                    data = chunk.encode() if isinstance(chunk, str) else chunk
+                    f.write(data)
+                    written += len(data)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+                written += len(chunk)
+            self.stdout.flush()
+        elapsed = time.perf_counter() - started
+        if output:
+            self.stderr.write(self.style.SUCCESS(f'✓ Wrote {written} bytes of {kind} to {output} in {elapsed:.2f}s'))
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.storage import adopt_existing, attachment_storage, collect_blobs, release_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        'Release attachment files no plan, issue or report refers to any more, '
+        'and delete the content blobs nothing references'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=1,
+                            help='Leave files stored within this many hours alone (uploads still in flight)')
+        parser.add_argument('--adopt', action='store_true',
+                            help='First move attachments stored before deduplication into blobs')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+
+    def handle(self, *args, **options):
+        storage = attachment_storage()
+        dry_run = options['dry_run']
+
+        def verb(past, present):
+            return f'Would {present}' if dry_run else past
+
+        if options['adopt']:
+            count, size = adopt_existing(storage, dry_run=dry_run)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {verb("Adopted", "adopt")} {count} existing files ({size} bytes)'
+            ))
+
+        older_than = timezone.now() - timedelta(hours=options['grace_hours'])
+        orphans = release_orphans(storage, older_than, dry_run=dry_run)
+        if orphans:
+            self.stdout.write(self.style.WARNING(
+                f'! {verb("Released", "release")} {orphans} attachment files nothing refers to'
+            ))
+
+        count, freed = collect_blobs(storage, dry_run=dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb("Removed", "remove")} {count} unreferenced blobs ({freed} bytes)'
+        ))
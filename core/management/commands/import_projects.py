@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.projects import IMPORT_BATCH_SIZE, import_projects, parse_import
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import audit projects and auditor assignments from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file to import')
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help='File format (default: guessed from the extension)')
+        parser.add_argument('--created-by', required=True,
+                            help='Username recorded as creator and assigner of the projects')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        try:
+            created_by = User.objects.get(username=options['created_by'])
+        except User.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["created_by"]}')
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        started = time.perf_counter()
+        try:
+            rows = parse_import(data, fmt, path)
+            created, assigned = import_projects(rows, created_by, batch_size=options['batch_size'])
+        except ValidationError as e:
+            for message in e.messages:
+                self.stdout.write(self.style.ERROR(f'✗ {message}'))
+            raise CommandError('Nothing was imported.')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Imported {created} projects and {assigned} assignments in {elapsed:.2f}s'
+        ))
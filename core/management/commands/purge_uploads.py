@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.uploads import purge_stale
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were abandoned or never attached, and their partial files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help='Only purge uploads untouched for this many hours')
+
+    def handle(self, *args, **options):
+        purged = purge_stale(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'✓ Purged {purged} stale uploads'))
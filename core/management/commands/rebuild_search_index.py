@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import SOURCES, reindex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents of every project, issue, report and final report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        for model, source in SOURCES.items():
+            count = reindex(model, batch_size=options['batch_size'])
+            self.stdout.write(f'  {source.kind:<13} {count:>8} documents')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt the search index in {elapsed:.2f}s'))
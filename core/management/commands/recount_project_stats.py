@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.stats import RECOUNT_BATCH_SIZE, recount
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-project workflow counters from the plan, issue, report and assignment tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help='Only recount this project id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=RECOUNT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked, fixed = recount(options['projects'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'! Corrected counters for {fixed} of {checked} projects'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Checked {checked} projects in {elapsed:.2f}s'))
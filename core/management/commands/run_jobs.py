@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (final report assembly, etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue running jobs whose worker has not been heard from for this many seconds')
+        parser.add_argument('--heartbeat', type=float, default=30.0,
+                            help='Seconds between heartbeats of the running job (keep well under --stale-after)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Waiting for jobs...' if not options['burst'] else 'Draining job queue...')
+        processed = 0
+        try:
+            while True:
+                self.requeue_stale(options['stale_after'])
+                claimed = jobs.claim_next()
+                if claimed is None:
+                    if options['burst']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                if jobs.run(claimed, heartbeat_interval=options['heartbeat']):
+                    self.stdout.write(self.style.SUCCESS(f'✓ {claimed.kind} #{claimed.pk}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'✗ {claimed.kind} #{claimed.pk} (attempt {claimed.attempts})'))
+                processed += 1
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(f'Processed {processed} jobs.')
+
+    def requeue_stale(self, stale_after):
+        requeued, failed = jobs.requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'! Requeued {requeued} stale jobs'))
+        if failed:
+            self.stdout.write(self.style.ERROR(f'✗ Failed {failed} stale jobs that were out of attempts'))
@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a large, referentially consistent synthetic dataset (users, departments, projects '
+        'and their workflow rows) with batched bulk inserts, for staging and benchmark databases'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=100)
+        parser.add_argument('--projects', type=int, default=100000)
+        parser.add_argument('--auditors', type=int, default=10000)
+        parser.add_argument('--managers', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Projects per transaction, and rows per INSERT')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes (ignored on SQLite, which takes one writer at a time)')
+        parser.add_argument('--prefix', default='scale', help='Name prefix of the generated users and departments')
+        parser.add_argument('--password', default='scale', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        for name in ('departments', 'auditors', 'managers', 'batch_size', 'processes'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be at least 1.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Data with the prefix "{prefix}" already exists; choose another --prefix.')
+
+        processes = options['processes']
+        if processes > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('! SQLite takes one writer at a time; seeding in one process'))
+            processes = 1
+
+        started = time.perf_counter()
+        dataset = seeding.create_people(
+            departments=options['departments'], auditors=options['auditors'], managers=options['managers'],
+            prefix=prefix, password=options['password'], batch_size=options['batch_size'],
+        )
+        people = len(dataset.manager_ids) + len(dataset.auditor_ids) + 2 * len(dataset.head_ids)
+        self.stdout.write(f'✓ {people} users and departments in {time.perf_counter() - started:.1f}s')
+
+        total = options['projects']
+        self.done = self.rows = 0
+        self.started = time.perf_counter()
+        if processes > 1:
+            batches = seeding.create_batches_parallel(
+                dataset, options['seed'], options['batch_size'], total, processes,
+            )
+        else:
+            batches = (
+                seeding.create_batch(dataset, first, count, options['seed'], options['batch_size'])
+                for first, count in seeding.batches(total, options['batch_size'])
+            )
+        for batch in batches:
+            self.progress(batch, total)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Seeded {self.done} projects ({self.rows + people} rows) in {elapsed:.1f}s '
+            f'with {processes} process{"es" if processes > 1 else ""}'
+        ))
+
+    def progress(self, batch, total):
+        self.done += len(batch.project_ids)
+        self.rows += batch.rows
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'  {self.done:>9}/{total} projects  {self.rows:>10} rows  '
+            f'{self.rows / elapsed if elapsed else 0:>9.0f} rows/s'
+        )
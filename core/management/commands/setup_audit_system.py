@@ -41,6 +41,8 @@ class Command(BaseCommand):
         
         # Create sample users
         self.stdout.write('Creating sample users...')
+        # Hashed once: every sample user has the same password.
+        password = make_password('password123')
         
         # Audit Manager
         audit_manager, created = User.objects.get_or_create(
@@ -49,7 +51,7 @@ class Command(BaseCommand):
                 'email': 'audit.manager@company.com',
                 'first_name': 'John',
                 'last_name': 'Manager',
-                'password': make_password('password123'),
+                'password': password,
                 'is_staff': True
             }
         )
@@ -73,7 +75,7 @@ class Command(BaseCommand):
                     'email': auditor_data['email'],
                     'first_name': auditor_data['first_name'],
                     'last_name': auditor_data['last_name'],
-                    'password': make_password('password123'),
+                    'password': password,
                 }
             )
             if created:
@@ -96,7 +98,7 @@ class Command(BaseCommand):
                     'email': manager_data['email'],
                     'first_name': manager_data['first_name'],
                     'last_name': manager_data['last_name'],
-                    'password': make_password('password123'),
+                    'password': password,
                 }
             )
             if created:
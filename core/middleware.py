@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .fragments import request_stats
+
+
+logger = logging.getLogger('core.metrics')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook that counts and times every SQL statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # Parameters are kept out of the SQL text, so the statement itself
+            # is the fingerprint: an N+1 loop shows up as one repeated entry.
+            self.fingerprints[sql] += 1
+
+    def duplicates(self):
+        return {sql: n for sql, n in self.fingerprints.items() if n > 1}
+
+
+def query_budget(view_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+class QueryBudgetMiddleware:
+    """
+    Record per-view SQL count, SQL time, repeated statements, render time and
+    fragment cache hits/misses.
+
+    The numbers are returned in a ``Server-Timing`` header and logged as JSON
+    on the ``core.metrics`` logger. A view that issues more queries than its
+    entry in ``settings.QUERY_BUDGETS`` is logged as a warning, or raises
+    ``QueryBudgetExceeded`` when ``settings.QUERY_BUDGET_STRICT`` is set so
+    the test suite catches N+1 regressions.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        # Stamped by core.context_processors.render_timer.
+        render_started = getattr(request, '_render_started', None)
+        render_time = finished - render_started if render_started else 0.0
+        duplicates = recorder.duplicates()
+        cache_hits, cache_misses = request_stats(request)
+
+        metrics = {
+            'view': view_name,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 2),
+            'render_ms': round(render_time * 1000, 2),
+            'total_ms': round((finished - start) * 1000, 2),
+            'duplicate_queries': sum(duplicates.values()) - len(duplicates),
+            'fragment_hits': cache_hits,
+            'fragment_misses': cache_misses,
+        }
+        response['Server-Timing'] = (
+            f'db;dur={metrics["sql_ms"]};desc="{recorder.count} queries", '
+            f'render;dur={metrics["render_ms"]}, '
+            f'total;dur={metrics["total_ms"]}'
+        )
+        if cache_hits or cache_misses:
+            response['Server-Timing'] += f', fragments;desc="{cache_hits} hit, {cache_misses} miss"'
+
+        logger.info(json.dumps(metrics), extra={'metrics': metrics})
+
+        budget = query_budget(view_name) if view_name else None
+        if budget is not None and recorder.count > budget:
+            worst = sorted(duplicates.items(), key=lambda item: -item[1])[:3]
+            message = (
+                f'{view_name} ran {recorder.count} queries (budget {budget}). '
+                + ' '.join(f'[{n}x] {sql[:200]}' for sql, n in worst)
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'metrics': metrics})
+
+        return response
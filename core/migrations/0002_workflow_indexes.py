@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditissue',
+            index=models.Index(fields=['-created_at', '-id'], name='core_issue_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditissue',
+            index=models.Index(fields=['project', 'status'], name='core_issue_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditissue',
+            index=models.Index(condition=models.Q(('status', 'submitted')), fields=['-created_at', '-id'], name='core_issue_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditplan',
+            index=models.Index(fields=['-created_at', '-id'], name='core_plan_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditplan',
+            index=models.Index(fields=['project', 'status'], name='core_plan_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditplan',
+            index=models.Index(condition=models.Q(('status', 'submitted')), fields=['-created_at', '-id'], name='core_plan_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditproject',
+            index=models.Index(fields=['-created_at', '-id'], name='core_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditproject',
+            index=models.Index(fields=['status', '-created_at'], name='core_project_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditproject',
+            index=models.Index(fields=['department', '-created_at'], name='core_project_dept_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditreport',
+            index=models.Index(fields=['-created_at', '-id'], name='core_report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditreport',
+            index=models.Index(fields=['project', 'status'], name='core_report_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditreport',
+            index=models.Index(condition=models.Q(('status', 'submitted')), fields=['-created_at', '-id'], name='core_report_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditreport',
+            index=models.Index(condition=models.Q(('status', 'sent_to_department')), fields=['project'], name='core_report_dept_pending_idx'),
+        ),
+    ]
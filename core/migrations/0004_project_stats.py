@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+# (model, total counter, {status: status counter}) as in core/stats.py at
+# the time of this migration.
+COUNTERS = [
+    ('AuditPlan', 'plan_count', {'submitted': 'pending_plan_count'}),
+    ('AuditIssue', 'issue_count', {'submitted': 'pending_issue_count', 'approved': 'approved_issue_count'}),
+    ('AuditReport', 'report_count', {'submitted': 'pending_report_count'}),
+    ('AuditAssignment', 'assignment_count', {}),
+]
+
+
+def backfill_stats(apps, schema_editor):
+    AuditProject = apps.get_model('core', 'AuditProject')
+    ProjectStats = apps.get_model('core', 'ProjectStats')
+
+    stats = {pk: ProjectStats(project_id=pk) for pk in AuditProject.objects.values_list('pk', flat=True)}
+    for model_name, total_field, status_fields in COUNTERS:
+        aggregates = {total_field: Count('pk')}
+        for status, field in status_fields.items():
+            aggregates[field] = Count('pk', filter=Q(status=status))
+        rows = apps.get_model('core', model_name).objects.order_by().values('project_id').annotate(**aggregates)
+        for row in rows:
+            row_stats = stats[row.pop('project_id')]
+            for field, value in row.items():
+                setattr(row_stats, field, value)
+    ProjectStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.auditproject')),
+                ('plan_count', models.PositiveIntegerField(default=0)),
+                ('pending_plan_count', models.PositiveIntegerField(default=0)),
+                ('issue_count', models.PositiveIntegerField(default=0)),
+                ('pending_issue_count', models.PositiveIntegerField(default=0)),
+                ('approved_issue_count', models.PositiveIntegerField(default=0)),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('pending_report_count', models.PositiveIntegerField(default=0)),
+                ('assignment_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
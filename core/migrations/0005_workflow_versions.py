@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_project_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditissue',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auditplan',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auditproject',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auditreport',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_workflow_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('project', 'Project'), ('report', 'Report')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(max_length=50)),
+                ('from_status', models.CharField(max_length=30)),
+                ('to_status', models.CharField(max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='workflow_actions', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='core.auditproject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='core_history_created_idx'), models.Index(fields=['project', '-created_at'], name='core_history_project_idx'), models.Index(fields=['kind', 'object_id', '-created_at'], name='core_history_object_idx'), models.Index(fields=['to_status', '-created_at'], name='core_history_status_idx')],
+            },
+        ),
+    ]
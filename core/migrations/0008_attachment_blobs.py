@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:30
+
+import core.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditissue',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='audit/issues/'),
+        ),
+        migrations.AlterField(
+            model_name='auditplan',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='audit/plans/'),
+        ),
+        migrations.AlterField(
+            model_name='auditreport',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='audit/reports/'),
+        ),
+        migrations.AlterField(
+            model_name='finalreport',
+            name='attachment',
+            field=models.FileField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='audit/final_reports/'),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refcount', 0)), fields=['created_at'], name='core_blob_unreferenced_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='files', to='core.blob')),
+            ],
+        ),
+    ]
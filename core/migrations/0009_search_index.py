@@ -0,0 +1,121 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE core_search_fts USING fts5(
+        title, body, content='core_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_search_fts_insert AFTER INSERT ON core_searchdocument BEGIN
+        INSERT INTO core_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_search_fts_delete AFTER DELETE ON core_searchdocument BEGIN
+        INSERT INTO core_search_fts(core_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_search_fts_update AFTER UPDATE OF title, body ON core_searchdocument BEGIN
+        INSERT INTO core_search_fts(core_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO core_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+POSTGRES_INDEX = [
+    """
+    ALTER TABLE core_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX core_search_vector_idx ON core_searchdocument USING GIN (search_vector)',
+]
+
+DROP_INDEX = {
+    'sqlite': [
+        'DROP TRIGGER core_search_fts_insert',
+        'DROP TRIGGER core_search_fts_delete',
+        'DROP TRIGGER core_search_fts_update',
+        'DROP TABLE core_search_fts',
+    ],
+    'postgresql': [
+        'DROP INDEX core_search_vector_idx',
+        'ALTER TABLE core_searchdocument DROP COLUMN search_vector',
+    ],
+}
+
+# (model, kind, title fields, body fields) as in core/search.py at the time
+# of this migration.
+SOURCES = [
+    ('AuditProject', 'project', ['title'], ['description']),
+    ('AuditIssue', 'issue', [], ['description']),
+    ('AuditReport', 'report', [], [
+        'description', 'manager_notes', 'department_notes', 'auditor_final_notes', 'final_manager_notes',
+    ]),
+    ('FinalReport', 'final_report', [], ['content']),
+]
+
+
+def create_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    for statement in DROP_INDEX.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def backfill_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    now = timezone.now()
+    for model_name, kind, title_fields, body_fields in SOURCES:
+        model = apps.get_model('core', model_name)
+        fields = ['pk', *title_fields, *body_fields]
+        if kind != 'project':
+            fields.append('project_id')
+        documents = []
+        for row in model.objects.values(*fields).iterator():
+            documents.append(SearchDocument(
+                kind=kind, object_id=row['pk'], project_id=row.get('project_id', row['pk']), updated_at=now,
+                title='\n'.join(row[name] for name in title_fields if row[name]),
+                body='\n'.join(row[name] for name in body_fields if row[name]),
+            ))
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('project', 'Project'), ('issue', 'Issue'), ('report', 'Report'), ('final_report', 'Final Report')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='core.auditproject')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='core_search_document_unique')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditassignment',
+            index=models.Index(fields=['-assigned_at', '-id'], name='core_assignment_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditissue',
+            index=models.Index(fields=['status', '-created_at'], name='core_issue_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditplan',
+            index=models.Index(fields=['status', '-created_at'], name='core_plan_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditreport',
+            index=models.Index(fields=['status', '-created_at'], name='core_report_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='finalreport',
+            index=models.Index(fields=['-created_at', '-id'], name='core_final_report_created_idx'),
+        ),
+    ]
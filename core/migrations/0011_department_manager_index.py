@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(fields=['manager', 'id'], name='core_department_manager_idx'),
+        ),
+        migrations.AlterField(
+            model_name='department',
+            name='manager',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='managed_departments', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_department_manager_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='run_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
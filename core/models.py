@@ -1,13 +1,38 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .storage import attachment_storage
+
+
+def related_label(obj, field, attr):
+    """
+    ``attr`` of the object behind ``field`` when it is already loaded, else
+    ``#<id>``, so ``__str__`` never runs a query of its own. Load the
+    relation with ``select_related`` wherever the full label matters.
+    """
+    if obj._meta.get_field(field).is_cached(obj):
+        related = getattr(obj, field)
+        return getattr(related, attr) if related is not None else '-'
+    return f"#{getattr(obj, f'{field}_id')}"
+
 
 class Department(models.Model):
     name = models.CharField(max_length=100)
-    manager = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='managed_departments')
+    # Indexed together with the id below, so resolving a manager's departments
+    # (core.roles.managed_department_ids) reads the index alone.
+    manager = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='managed_departments', db_index=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['manager', 'id'], name='core_department_manager_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -29,12 +54,40 @@ class AuditProject(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_projects')
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='created')
+    # Bumped by every status transition; see core/transitions.py.
+    version = models.PositiveIntegerField(default=0)
     manager_notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_project_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='core_project_status_idx'),
+            models.Index(fields=['department', '-created_at'], name='core_project_dept_idx'),
+        ]
+    
     def __str__(self):
         return self.title
 
 
+class ProjectStats(models.Model):
+    """
+    Denormalised workflow counters for one project, kept current by the
+    signal handlers in core/signals.py and rebuilt by ``recount_project_stats``.
+    """
+    project = models.OneToOneField(AuditProject, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    plan_count = models.PositiveIntegerField(default=0)
+    pending_plan_count = models.PositiveIntegerField(default=0)
+    issue_count = models.PositiveIntegerField(default=0)
+    pending_issue_count = models.PositiveIntegerField(default=0)
+    approved_issue_count = models.PositiveIntegerField(default=0)
+    report_count = models.PositiveIntegerField(default=0)
+    pending_report_count = models.PositiveIntegerField(default=0)
+    assignment_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Stats for project #{self.project_id}"
+
+
 class AuditAssignment(models.Model):
     project = models.ForeignKey(AuditProject, on_delete=models.CASCADE, related_name='assignments')
     auditor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='audit_assignments')
@@ -43,9 +96,12 @@ class AuditAssignment(models.Model):
     
     class Meta:
         unique_together = ['project', 'auditor']
+        indexes = [
+            models.Index(fields=['-assigned_at', '-id'], name='core_assignment_assigned_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.auditor.username} - {self.project.title}"
+        return f"{related_label(self, 'auditor', 'username')} - {related_label(self, 'project', 'title')}"
 
 
 class AuditPlan(models.Model):
@@ -60,13 +116,26 @@ class AuditPlan(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_plans')
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Bumped by every status transition; see core/transitions.py.
+    version = models.PositiveIntegerField(default=0)
     description = models.TextField(default="")
-    attachment = models.FileField(upload_to='audit/plans/', blank=True, null=True)
+    attachment = models.FileField(upload_to='audit/plans/', storage=attachment_storage, blank=True, null=True)
     manager_notes = models.TextField(blank=True)
     manager_reviewed_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_plan_created_idx'),
+            models.Index(fields=['project', 'status'], name='core_plan_project_idx'),
+            models.Index(fields=['status', '-created_at'], name='core_plan_status_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(status='submitted'),
+                name='core_plan_pending_idx',
+            ),
+        ]
+    
     def __str__(self):
-        return f"Plan for {self.project.title}"
+        return f"Plan for {related_label(self, 'project', 'title')}"
 
 
 class AuditIssue(models.Model):
@@ -80,13 +149,26 @@ class AuditIssue(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_issues')
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='submitted')
+    # Bumped by every status transition; see core/transitions.py.
+    version = models.PositiveIntegerField(default=0)
     description = models.TextField(default="")
-    attachment = models.FileField(upload_to='audit/issues/', blank=True, null=True)
+    attachment = models.FileField(upload_to='audit/issues/', storage=attachment_storage, blank=True, null=True)
     manager_notes = models.TextField(blank=True)
     manager_reviewed_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_issue_created_idx'),
+            models.Index(fields=['project', 'status'], name='core_issue_project_idx'),
+            models.Index(fields=['status', '-created_at'], name='core_issue_status_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(status='submitted'),
+                name='core_issue_pending_idx',
+            ),
+        ]
+    
     def __str__(self):
-        return f"Issue for {self.project.title}"
+        return f"Issue for {related_label(self, 'project', 'title')}"
 
 
 class AuditReport(models.Model):
@@ -105,23 +187,193 @@ class AuditReport(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_reports')
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='submitted')
+    # Bumped by every status transition; see core/transitions.py.
+    version = models.PositiveIntegerField(default=0)
     description = models.TextField(default="")
-    attachment = models.FileField(upload_to='audit/reports/', blank=True, null=True)
+    attachment = models.FileField(upload_to='audit/reports/', storage=attachment_storage, blank=True, null=True)
     manager_notes = models.TextField(blank=True)
     department_notes = models.TextField(blank=True)
     auditor_final_notes = models.TextField(blank=True)
     final_manager_notes = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_report_created_idx'),
+            models.Index(fields=['project', 'status'], name='core_report_project_idx'),
+            models.Index(fields=['status', '-created_at'], name='core_report_status_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(status='submitted'),
+                name='core_report_pending_idx',
+            ),
+            models.Index(
+                fields=['project'], condition=models.Q(status='sent_to_department'),
+                name='core_report_dept_pending_idx',
+            ),
+        ]
+    
     def __str__(self):
-        return f"Report for {self.project.title}"
+        return f"Report for {related_label(self, 'project', 'title')}"
 
 
 class FinalReport(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     project = models.OneToOneField(AuditProject, on_delete=models.CASCADE, related_name='final_report')
     created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ready')
     content = models.TextField(default="")
-    attachment = models.FileField(upload_to='audit/final_reports/', blank=True, null=True)
+    attachment = models.FileField(upload_to='audit/final_reports/', storage=attachment_storage, blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_final_report_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Final Report for {related_label(self, 'project', 'title')}"
+
+
+
+class WorkflowHistory(models.Model):
+    """Append-only log of every workflow transition, written by core/workflow.py."""
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('report', 'Report'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    project = models.ForeignKey(AuditProject, on_delete=models.CASCADE, related_name='history')
+    action = models.CharField(max_length=50)
+    from_status = models.CharField(max_length=30)
+    to_status = models.CharField(max_length=30)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='workflow_actions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='core_history_created_idx'),
+            models.Index(fields=['project', '-created_at'], name='core_history_project_idx'),
+            models.Index(fields=['kind', 'object_id', '-created_at'], name='core_history_object_idx'),
+            models.Index(fields=['to_status', '-created_at'], name='core_history_status_idx'),
+        ]
     
     def __str__(self):
-        return f"Final Report for {self.project.title}"
+        return f"{self.kind} #{self.object_id}: {self.from_status} -> {self.to_status}"
 
+
+class Job(models.Model):
+    """A unit of background work, queued in the database and run by ``run_jobs``."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Not claimed before this time; set by the retry backoff in core/jobs.py.
+    run_after = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; see core.jobs.requeue_stale.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], condition=models.Q(status='queued'), name='core_job_queued_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """A chunked attachment upload in progress, written by core/uploads.py."""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+        ('attached', 'Attached'),
+    ]
+    
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='core_upload_stale_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+
+class Blob(models.Model):
+    """One stored file body, shared by every attachment with the same content (see core/storage.py)."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(refcount=0), name='core_blob_unreferenced_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.refcount} refs)"
+
+
+class StoredFile(models.Model):
+    """A name in the attachment storage, hard-linked to the blob holding its content."""
+    name = models.CharField(max_length=255, unique=True)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='files')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.name
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of one project, issue, report or final report,
+    kept current by core/signals.py. The full-text index over it is
+    database-specific and created by migration 0009 (see core/search.py).
+    """
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('issue', 'Issue'),
+        ('report', 'Report'),
+        ('final_report', 'Final Report'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    project = models.ForeignKey(AuditProject, on_delete=models.CASCADE, related_name='search_documents')
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='core_search_document_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
@@ -0,0 +1,113 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+ESTIMATE_THRESHOLD = 10000
+
+
+class KeysetPage:
+    """One page of a ``(created_at, id)`` keyset walk, newest first."""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest('Invalid cursor.')
+
+
+def keyset_paginate(queryset, cursor=None, per_page=25):
+    """
+    Return the page of ``queryset`` that follows ``cursor``.
+
+    Rows are ordered by ``(-created_at, -id)`` and the next page starts with a
+    range condition on those columns instead of an OFFSET, so every page
+    costs the same no matter how deep the caller has scrolled.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1])
+    return KeysetPage(rows, next_cursor)
+
+
+# ---- Estimated counts ----
+def estimated_count(queryset):
+    """
+    A cheap row count for an unfiltered ``queryset`` from the database's own
+    bookkeeping, or ``None`` when there is no estimate: PostgreSQL's planner
+    statistics, or the highest rowid on SQLite (rows deleted since make it
+    an overestimate).
+    """
+    if not isinstance(queryset, QuerySet):
+        return None
+    query = queryset.query
+    if query.where or query.distinct or query.combinator or query.is_sliced:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 for a table that has never been analysed.
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that skips the exact ``COUNT(*)`` over unfiltered tables of
+    more than ``AUDIT_ESTIMATE_THRESHOLD`` rows, where the count costs more
+    than the page itself. Filtered lists are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= getattr(settings, 'AUDIT_ESTIMATE_THRESHOLD', ESTIMATE_THRESHOLD):
+            return estimate
+        return super().count
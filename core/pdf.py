@@ -0,0 +1,148 @@
+"""
+PDF export of final and audit reports, rendered with WeasyPrint and joined
+with pypdf.
+
+A PDF is identified by a SHA-256 over the data it is rendered from, and is
+kept on disk under that digest. Unchanged reports are therefore served from
+the cache; a changed report gets a new digest and is rendered again by the
+``render_pdf`` background job.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .models import AuditReport, FinalReport
+
+
+# Bump when the PDF templates change so cached files are not reused.
+TEMPLATE_VERSION = '1'
+ISSUES_PER_PART = 500
+ISSUE_CHUNK_SIZE = 2000
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def cache_dir():
+    return getattr(settings, 'AUDIT_PDF_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'pdf_cache'))
+
+
+def cache_path(digest):
+    return os.path.join(cache_dir(), digest[:2], f'{digest}.pdf')
+
+
+def pdf_models():
+    return {'final_report': FinalReport, 'report': AuditReport}
+
+
+def load(kind, pk):
+    model = pdf_models()[kind]
+    return model.objects.select_related('project__department').get(pk=pk)
+
+
+def approved_issues(project):
+    return (
+        project.issues.filter(status='approved')
+        .order_by('pk')
+        .values_list('description', 'created_at', 'created_by__username')
+        .iterator(chunk_size=ISSUE_CHUNK_SIZE)
+    )
+
+
+def source_parts(kind, obj):
+    """Yield every value the PDF is rendered from, in rendering order."""
+    project = obj.project
+    yield TEMPLATE_VERSION
+    yield kind
+    yield from (project.title, project.description, project.department.name)
+    if kind == 'final_report':
+        yield obj.content
+        yield obj.attachment.name or ''
+    else:
+        yield from (
+            obj.status, obj.description, obj.manager_notes, obj.department_notes,
+            obj.auditor_final_notes, obj.final_manager_notes,
+        )
+        for row in approved_issues(project):
+            yield from (str(value) for value in row)
+
+
+def content_digest(kind, obj):
+    digest = hashlib.sha256()
+    for part in source_parts(kind, obj):
+        encoded = part.encode()
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ.
+        digest.update(len(encoded).to_bytes(8, 'big'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_parts(kind, obj):
+    """
+    Yield the report as a sequence of HTML documents.
+
+    The issue list is streamed from the database and split into parts of
+    ``ISSUES_PER_PART`` rows, so neither the template nor WeasyPrint's
+    parse/cascade step ever holds thousands of issues at once.
+    """
+    context = {'kind': kind, 'obj': obj, 'project': obj.project}
+    yield render_to_string('core/pdf/report.html', {**context, 'part': 'header'})
+    if kind == 'report':
+        for issues in chunked(approved_issues(obj.project), ISSUES_PER_PART):
+            yield render_to_string('core/pdf/report.html', {**context, 'part': 'issues', 'issues': issues})
+
+
+def write_pdf(kind, obj, path):
+    """
+    Render ``obj`` to ``path``. Each part is laid out and written to its own
+    PDF before the next is rendered, so only one part's layout is in memory
+    at a time; the parts are then joined page by page with pypdf.
+    """
+    from pypdf import PdfWriter
+    from weasyprint import HTML  # imported lazily: needs Pango at runtime
+
+    base_url = str(settings.BASE_DIR)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Work next to the target and rename, so readers never see half a file.
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as scratch:
+        parts = []
+        for n, html in enumerate(render_parts(kind, obj)):
+            parts.append(os.path.join(scratch, f'part-{n}.pdf'))
+            HTML(string=html, base_url=base_url).write_pdf(parts[-1])
+
+        joined = os.path.join(scratch, 'joined.pdf')
+        if len(parts) == 1:
+            os.replace(parts[0], joined)
+        else:
+            writer = PdfWriter()
+            for part in parts:
+                writer.append(part)
+            writer.write(joined)
+            writer.close()
+        os.replace(joined, path)
+
+
+def render_cached(kind, pk, digest):
+    """Render ``kind`` #``pk`` into the cache unless ``digest`` is stale or done."""
+    path = cache_path(digest)
+    if os.path.exists(path):
+        return
+    obj = load(kind, pk)
+    if content_digest(kind, obj) != digest:
+        # The report changed after the render was queued; the next request
+        # for it will queue a render under the new digest.
+        return
+    write_pdf(kind, obj, path)
@@ -0,0 +1,224 @@
+"""
+Creating audit projects together with their auditor assignments, one at a
+time from the project form or in bulk from a CSV/JSON import.
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import search
+from .models import AuditAssignment, AuditProject, Department, ProjectStats
+from .roles import AUDITORS
+from .fragments import bump as bump_fragments
+from .stats import bump
+
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_TEXT_FIELDS = ('title', 'description', 'manager_notes')
+
+
+def validate_auditor_ids(auditor_ids):
+    """Return the auditor ids as ints, checking them all in a single query."""
+    try:
+        ids = {int(aid) for aid in auditor_ids}
+    except (TypeError, ValueError):
+        raise ValidationError('Invalid auditor id.')
+    found = set(
+        User.objects.filter(pk__in=ids, groups__name=AUDITORS).values_list('pk', flat=True)
+    )
+    missing = ids - found
+    if missing:
+        raise ValidationError(
+            'Unknown auditors: %(ids)s', params={'ids': ', '.join(map(str, sorted(missing)))}
+        )
+    return sorted(ids)
+
+
+@transaction.atomic
+def create_project(*, title, department_id, created_by, description='', manager_notes='', auditor_ids=()):
+    """Create a project and all of its assignments, or nothing at all."""
+    if not title:
+        raise ValidationError('A project title is required.')
+    try:
+        department_id = int(department_id)
+    except (TypeError, ValueError):
+        raise ValidationError('Unknown department.')
+    if not Department.objects.filter(pk=department_id).exists():
+        raise ValidationError('Unknown department.')
+    ids = validate_auditor_ids(auditor_ids)
+
+    project = AuditProject.objects.create(
+        department_id=department_id,
+        title=title,
+        description=description or '',
+        manager_notes=manager_notes or '',
+        created_by=created_by,
+    )
+    AuditAssignment.objects.bulk_create([
+        AuditAssignment(project=project, auditor_id=aid, assigned_by=created_by)
+        for aid in ids
+    ])
+    # bulk_create skips the counter and fragment signals.
+    bump(project.pk, assignment_count=len(ids))
+    bump_fragments(f'department:{department_id}', *(f'user:{aid}' for aid in ids))
+    return project
+
+
+# ---- Bulk import ----
+def parse_import(data, fmt, name='The import file'):
+    """
+    Parse an import file into row dicts. ``name`` is how errors refer to the
+    file.
+
+    CSV files need a header row with ``title`` and ``department`` columns and
+    may add ``description``, ``manager_notes`` and ``auditors`` (usernames
+    separated by ``;``). JSON files hold a list of objects with the same keys,
+    where ``auditors`` is a list.
+    """
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError as e:
+            raise ValidationError(
+                f'{name} is not UTF-8 text (invalid byte at position {e.start}); save it as "CSV UTF-8".'
+            )
+
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise ValidationError(f'Invalid JSON: {e}')
+        if not isinstance(rows, list):
+            raise ValidationError('The JSON file must contain a list of projects.')
+        return rows
+
+    if fmt == 'csv':
+        rows = []
+        try:
+            for row in csv.DictReader(io.StringIO(data)):
+                auditors = row.get('auditors') or ''
+                row['auditors'] = [username.strip() for username in auditors.split(';') if username.strip()]
+                rows.append(row)
+        except csv.Error as e:
+            raise ValidationError(f'{name}, row {len(rows) + 1}: {e}.')
+        return rows
+
+    raise ValidationError(f'Unsupported import format: {fmt}')
+
+
+def _type_errors(row):
+    """What is wrong with the types of ``row``'s values, for rows parsed from JSON."""
+    errors = [
+        f'{field} must be text' for field in IMPORT_TEXT_FIELDS
+        if row.get(field) is not None and not isinstance(row[field], str)
+    ]
+    if row.get('department') is not None and not isinstance(row['department'], (str, int)):
+        errors.append('department must be a name or id')
+    auditors = row.get('auditors')
+    if auditors is not None and not (
+        isinstance(auditors, list) and all(isinstance(name, str) for name in auditors)
+    ):
+        errors.append('auditors must be a list of usernames')
+    return errors
+
+
+def _resolve_rows(rows):
+    """Validate every row up front, with one query for departments and one for auditors."""
+    departments = {}
+    for pk, name in Department.objects.values_list('pk', 'name'):
+        departments[str(pk)] = pk
+        departments.setdefault(name, pk)
+
+    for row in rows:
+        if isinstance(row, dict) and isinstance(row.get('auditors'), str):
+            row['auditors'] = [name.strip() for name in row['auditors'].split(';') if name.strip()]
+    usernames = {
+        name for row in rows if isinstance(row, dict) and not _type_errors(row)
+        for name in (row.get('auditors') or [])
+    }
+    auditors = dict(
+        User.objects.filter(username__in=usernames, groups__name=AUDITORS)
+        .values_list('username', 'pk')
+    )
+
+    resolved, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f'Row {number}: expected an object.')
+            continue
+        invalid = _type_errors(row)
+        if invalid:
+            errors.append(f'Row {number}: {"; ".join(invalid)}.')
+            continue
+        title = (row.get('title') or '').strip()
+        department_id = departments.get(str(row.get('department') or '').strip())
+        names = row.get('auditors') or []
+        unknown = [name for name in names if name not in auditors]
+
+        if not title:
+            errors.append(f'Row {number}: missing title.')
+        if department_id is None:
+            errors.append(f'Row {number}: unknown department {row.get("department")!r}.')
+        if unknown:
+            errors.append(f'Row {number}: unknown auditors {", ".join(unknown)}.')
+        if title and department_id is not None and not unknown:
+            resolved.append((
+                AuditProject(
+                    title=title,
+                    department_id=department_id,
+                    description=row.get('description') or '',
+                    manager_notes=row.get('manager_notes') or '',
+                ),
+                sorted({auditors[name] for name in names}),
+            ))
+
+    if errors:
+        raise ValidationError(errors)
+    return resolved
+
+
+@transaction.atomic
+def import_projects(rows, created_by, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create many projects and their assignments with batched inserts.
+
+    All rows are validated before anything is written, and the whole import
+    runs in one transaction, so a bad row never leaves a partial import.
+    Returns ``(project_count, assignment_count)``.
+    """
+    resolved = _resolve_rows(rows)
+    project_count = assignment_count = 0
+
+    for start in range(0, len(resolved), batch_size):
+        batch = resolved[start:start + batch_size]
+        projects = [project for project, _ in batch]
+        for project in projects:
+            project.created_by = created_by
+        AuditProject.objects.bulk_create(projects)
+        # bulk_create skips the signals that would create the counters and
+        # search documents.
+        ProjectStats.objects.bulk_create([
+            ProjectStats(project=project, assignment_count=len(auditor_ids))
+            for project, auditor_ids in batch
+        ])
+
+        assignments = [
+            AuditAssignment(project=project, auditor_id=aid, assigned_by=created_by)
+            for project, auditor_ids in batch
+            for aid in auditor_ids
+        ]
+        AuditAssignment.objects.bulk_create(assignments, batch_size=batch_size)
+        search.upsert([search.document_for(project) for project in projects], batch_size)
+        project_count += len(projects)
+        assignment_count += len(assignments)
+
+    bump_fragments(
+        'projects',
+        *{f'department:{project.department_id}' for project, _ in resolved},
+        *{f'user:{aid}' for _, auditor_ids in resolved for aid in auditor_ids},
+    )
+    return project_count, assignment_count
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import Department
+
+
+AUDIT_MANAGERS = "Audit Managers"
+AUDITORS = "Auditors"
+DEPARTMENT_MANAGERS = "Department Managers"
+
+# Order matters: the first role a user holds is the one shown in the navbar
+# and used to pick their dashboard.
+ROLE_PRECEDENCE = [AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS]
+
+GENERATION_KEY = 'core:roles:generation'
+ROLES_TIMEOUT = 60 * 60
+# With a per-process cache, invalidation only reaches the process that made
+# the change, so other workers may keep serving revoked roles this long.
+LOCAL_ROLES_TIMEOUT = 5
+
+
+def roles_timeout():
+    """
+    How long resolved roles and department scopes are cached. Roles decide
+    access, so with a per-process (locmem) cache they only live a few
+    seconds; a shared cache sees every invalidation and keeps them an hour.
+    """
+    if isinstance(caches['default'], LocMemCache):
+        return getattr(settings, 'AUDIT_LOCAL_ROLES_TIMEOUT', LOCAL_ROLES_TIMEOUT)
+    return ROLES_TIMEOUT
+
+
+def _user_key(user_id):
+    return f'core:roles:user:{user_id}'
+
+
+def get_user_roles(user):
+    """
+    Return the set of group names the user belongs to.
+
+    The result is memoised on the user object, so it is resolved at most once
+    per request, and cached across requests under the user id together with a
+    global generation counter that is bumped whenever groups change.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_audit_roles', None)
+    if roles is not None:
+        return roles
+
+    key = _user_key(user.pk)
+    cached = cache.get_many([GENERATION_KEY, key])
+    generation = cached.get(GENERATION_KEY, 0)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == generation:
+        roles = entry[1]
+    else:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(key, (generation, roles), roles_timeout())
+
+    user._audit_roles = roles
+    return roles
+
+
+def primary_role(user):
+    roles = get_user_roles(user)
+    for role in ROLE_PRECEDENCE:
+        if role in roles:
+            return role
+    return None
+
+
+def invalidate_user_roles(*user_ids):
+    cache.delete_many([_user_key(user_id) for user_id in user_ids])
+
+
+def invalidate_all_roles():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+# ---- Department scope ----
+# Departments rarely change, so any Department save or delete simply moves
+# every cached scope to a new generation.
+DEPARTMENTS_GENERATION_KEY = 'core:departments:generation'
+
+
+def _departments_key(user_id):
+    return f'core:departments:user:{user_id}'
+
+
+def managed_department_ids(user):
+    """
+    Return the ids of the departments the user manages, as a sorted tuple.
+
+    Memoised on the user object and cached across requests like the roles,
+    against a generation counter that ``invalidate_department_scopes`` bumps.
+    Filtering on these ids keeps department-scoped queries to a single join
+    instead of a second one through ``Department.manager``.
+    """
+    if not user.is_authenticated:
+        return ()
+
+    department_ids = getattr(user, '_audit_departments', None)
+    if department_ids is not None:
+        return department_ids
+
+    key = _departments_key(user.pk)
+    cached = cache.get_many([DEPARTMENTS_GENERATION_KEY, key])
+    generation = cached.get(DEPARTMENTS_GENERATION_KEY, 0)
+    entry = cached.get(key)
+    if entry is not None and entry[0] == generation:
+        department_ids = entry[1]
+    else:
+        department_ids = tuple(
+            Department.objects.filter(manager=user).order_by('pk').values_list('pk', flat=True)
+        )
+        cache.set(key, (generation, department_ids), roles_timeout())
+
+    user._audit_departments = department_ids
+    return department_ids
+
+
+def invalidate_department_scopes():
+    try:
+        cache.incr(DEPARTMENTS_GENERATION_KEY)
+    except ValueError:
+        cache.set(DEPARTMENTS_GENERATION_KEY, 1, None)
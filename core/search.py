@@ -0,0 +1,208 @@
+"""
+Full-text search over projects, issues, reports and final reports.
+
+Each searchable row has a ``SearchDocument`` holding its text, upserted by
+the signal receivers in core/signals.py whenever an indexed field changes.
+Migration 0009 builds the inverted index over that table for the database
+in use:
+
+* SQLite: an external-content FTS5 table, ``core_search_fts``, kept in step
+  by triggers and ranked with ``bm25()``.
+* PostgreSQL: a generated ``search_vector`` tsvector column with a GIN
+  index, ranked with ``ts_rank_cd()``.
+
+Both use language-neutral tokenising (``unicode61`` / the ``simple``
+configuration), since the text is a mix of Arabic and English. Results are
+limited to the projects the user may see, like the list views.
+"""
+import re
+from typing import NamedTuple
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import AuditIssue, AuditProject, AuditReport, FinalReport, SearchDocument
+from .roles import AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS, get_user_roles, managed_department_ids
+
+
+class Source(NamedTuple):
+    kind: str
+    title_fields: tuple
+    body_fields: tuple
+
+
+SOURCES = {
+    AuditProject: Source('project', ('title',), ('description',)),
+    AuditIssue: Source('issue', (), ('description',)),
+    AuditReport: Source('report', (), (
+        'description', 'manager_notes', 'department_notes', 'auditor_final_notes', 'final_manager_notes',
+    )),
+    FinalReport: Source('final_report', (), ('content',)),
+}
+
+INDEXED_FIELDS = {model: set(source.title_fields + source.body_fields) for model, source in SOURCES.items()}
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TOKENS = 8
+# Snippet highlight markers; the text is escaped before they become <mark>.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+# ---- Indexing ----
+def document_for(instance):
+    model = type(instance)
+    source = SOURCES[model]
+    project_id = instance.pk if model is AuditProject else instance.project_id
+
+    def text(fields):
+        return '\n'.join(value for value in (getattr(instance, name) for name in fields) if value)
+
+    return SearchDocument(
+        kind=source.kind, object_id=instance.pk, project_id=project_id,
+        title=text(source.title_fields), body=text(source.body_fields),
+    )
+
+
+def upsert(documents, batch_size=500):
+    """Insert or refresh ``documents`` in one statement per batch."""
+    SearchDocument.objects.bulk_create(
+        documents, batch_size=batch_size, update_conflicts=True,
+        unique_fields=['kind', 'object_id'], update_fields=['project', 'title', 'body', 'updated_at'],
+    )
+
+
+def indexed_text(instance):
+    """The indexed field values of ``instance``, or ``None`` if any is deferred."""
+    names = INDEXED_FIELDS[type(instance)]
+    if not names <= instance.__dict__.keys():
+        return None
+    return tuple(instance.__dict__[name] for name in sorted(names))
+
+
+def index(instance):
+    upsert([document_for(instance)])
+
+
+def unindex(model, pk):
+    SearchDocument.objects.filter(kind=SOURCES[model].kind, object_id=pk).delete()
+
+
+def reindex(model, pks=None, batch_size=500):
+    """Rebuild the documents of ``model`` (only ``pks``, if given); returns how many."""
+    fields = ['pk'] + ([] if model is AuditProject else ['project_id']) + sorted(INDEXED_FIELDS[model])
+    rows = model.objects.only(*fields).order_by('pk')
+    if pks is not None:
+        rows = rows.filter(pk__in=pks)
+    count = 0
+    batch = []
+    for instance in rows.iterator(chunk_size=batch_size):
+        batch.append(document_for(instance))
+        if len(batch) == batch_size:
+            upsert(batch, batch_size)
+            count += len(batch)
+            batch = []
+    if batch:
+        upsert(batch, batch_size)
+        count += len(batch)
+    return count
+
+
+# ---- Querying ----
+class SearchPage(NamedTuple):
+    hits: list
+    page: int
+    has_next: bool
+
+
+def visible_projects(user):
+    """
+    The projects ``user`` may search, as a subquery, or ``None`` for all of
+    them: the same rules as ``views.can_view_project``.
+    """
+    roles = get_user_roles(user)
+    if AUDIT_MANAGERS in roles:
+        return None
+    conditions = Q()
+    if AUDITORS in roles:
+        conditions |= Q(assignments__auditor=user)
+    if DEPARTMENT_MANAGERS in roles:
+        conditions |= Q(department_id__in=managed_department_ids(user))
+    if not conditions:
+        return AuditProject.objects.none()
+    return AuditProject.objects.filter(conditions).values('pk')
+
+
+def match_expression(query):
+    """
+    Turn free text into a prefix query that every document must match all
+    words of, or ``None`` if there is nothing to search for. Only word
+    characters get through, so user input cannot inject FTS syntax.
+    """
+    tokens = TOKEN_RE.findall(query.lower())[:MAX_TOKENS]
+    if not tokens:
+        return None
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f'{token}:*' for token in tokens)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search(user, query, kind=None, page=1, page_size=20):
+    """One page of ``user``'s best matches for ``query``, best first."""
+    expression = match_expression(query)
+    if expression is None:
+        return SearchPage([], page, False)
+
+    where, params = [], []
+    projects = visible_projects(user)
+    if projects is not None:
+        try:
+            sql, scope_params = projects.query.sql_with_params()
+        except EmptyResultSet:
+            return SearchPage([], page, False)
+        where.append(f'd.project_id IN ({sql})')
+        params += scope_params
+    if kind:
+        where.append('d.kind = %s')
+        params.append(kind)
+    filters = ''.join(f' AND {clause}' for clause in where)
+    limit = [page_size + 1, (page - 1) * page_size]
+
+    if connection.vendor == 'postgresql':
+        sql = f"""
+            SELECT d.id, d.kind, d.object_id, d.project_id, d.title, p.title AS project_title,
+                   ts_rank_cd(d.search_vector, q) AS rank,
+                   ts_headline('simple', d.body, q, %s) AS snippet
+            FROM core_searchdocument d
+            JOIN core_auditproject p ON p.id = d.project_id,
+                 to_tsquery('simple', %s) q
+            WHERE d.search_vector @@ q{filters}
+            ORDER BY rank DESC, d.id
+            LIMIT %s OFFSET %s
+        """
+        headline = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=30, MinWords=10'
+        params = [headline, expression, *params, *limit]
+    else:
+        sql = f"""
+            SELECT d.id, d.kind, d.object_id, d.project_id, d.title, p.title AS project_title,
+                   bm25(core_search_fts, 4.0, 1.0) AS rank,
+                   snippet(core_search_fts, 1, %s, %s, '…', 16) AS snippet
+            FROM core_search_fts
+            JOIN core_searchdocument d ON d.id = core_search_fts.rowid
+            JOIN core_auditproject p ON p.id = d.project_id
+            WHERE core_search_fts MATCH %s{filters}
+            ORDER BY rank, d.id
+            LIMIT %s OFFSET %s
+        """
+        params = [MARK_START, MARK_END, expression, *params, *limit]
+
+    hits = list(SearchDocument.objects.raw(sql, params))
+    for hit in hits:
+        hit.snippet = highlight(hit.snippet)
+    return SearchPage(hits[:page_size], page, len(hits) > page_size)
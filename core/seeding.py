@@ -0,0 +1,268 @@
+"""
+Synthetic audit data for benchmarks and staging databases.
+
+Every generated project is a plausible snapshot of the workflow: its status
+is drawn from ``STAGE_WEIGHTS`` and it gets the plans, issues, reports and
+final report a project at that stage would have, written by auditors
+assigned to it. Rows are inserted with ``bulk_create`` a batch of projects
+at a time, each batch in its own transaction, and since ``bulk_create``
+skips the signal receivers the batch's ``ProjectStats`` and search
+documents are rebuilt before it commits.
+
+Generated departments and users carry a name prefix, so a dataset can be
+removed again with :func:`remove`.
+"""
+import multiprocessing
+import random
+from typing import NamedTuple
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import search
+from .models import (
+    AuditAssignment, AuditIssue, AuditPlan, AuditProject, AuditReport, Department, FinalReport,
+)
+from .roles import AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS
+from .stats import recount
+
+
+# Share of projects at each workflow stage.
+STAGE_WEIGHTS = {
+    'created': 15,
+    'plan_pending': 15,
+    'audit_in_progress': 30,
+    'report_pending_manager': 10,
+    'report_pending_department': 10,
+    'final_review': 5,
+    'finalized': 15,
+}
+STAGES = list(STAGE_WEIGHTS)
+
+ISSUE_WEIGHTS = {'submitted': 40, 'approved': 45, 'rejected': 15}
+REVIEWED_ISSUE_WEIGHTS = {'approved': 75, 'rejected': 25}
+# The report a project at each stage past audit_in_progress is waiting on.
+STAGE_REPORTS = {
+    'report_pending_manager': ['approved_by_manager'],
+    'report_pending_department': ['sent_to_department', 'dept_replied'],
+    'final_review': ['auditor_approved'],
+    'finalized': ['final_approved'],
+}
+REPORT_STATUSES = [value for value, _ in AuditReport.STATUS_CHOICES]
+
+WORDS = (
+    'payroll vendor invoice ledger reconciliation inventory procurement contract approval '
+    'segregation duties access control expense travel petty cash asset register depreciation '
+    'budget variance revenue receivable payable journal entry backup retention policy '
+    'compliance evidence sample exception remediation owner deadline risk rating finding '
+    'مراجعة رواتب مخزون عقود مشتريات سياسة مخاطر ضوابط'
+).split()
+
+
+class Dataset(NamedTuple):
+    prefix: str
+    department_ids: list
+    manager_ids: list
+    auditor_ids: list
+    head_ids: list
+    project_ids: list
+
+
+def text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def role_groups():
+    return {name: Group.objects.get_or_create(name=name)[0] for name in (AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS)}
+
+
+def create_users(prefix, role, count, password, group, batch_size):
+    """``count`` users sharing one precomputed ``password`` hash, all in ``group``."""
+    users = User.objects.bulk_create(
+        [User(username=f'{prefix}-{role}-{i}', password=password) for i in range(count)],
+        batch_size=batch_size,
+    )
+    User.groups.through.objects.bulk_create(
+        [User.groups.through(user_id=user.pk, group_id=group.pk) for user in users],
+        batch_size=batch_size,
+    )
+    return [user.pk for user in users]
+
+
+def project_children(rng, project, auditor_ids):
+    """The assignments, plans, issues, reports and final report of ``project``'s stage."""
+    stage = STAGES.index(project.status)
+    now = timezone.now()
+    assigned = rng.sample(auditor_ids, k=rng.randint(1, min(3, len(auditor_ids))))
+    author = assigned[0]
+    rows = {model: [] for model in (AuditAssignment, AuditPlan, AuditIssue, AuditReport, FinalReport)}
+    rows[AuditAssignment] = [
+        AuditAssignment(project=project, auditor_id=auditor_id, assigned_by_id=project.created_by_id)
+        for auditor_id in assigned
+    ]
+    if stage < STAGES.index('plan_pending'):
+        return rows
+
+    if stage >= STAGES.index('audit_in_progress') and rng.random() < 0.2:
+        rows[AuditPlan].append(AuditPlan(
+            project=project, created_by_id=author, status='rejected', description=text(rng, 30),
+            manager_notes=text(rng, 8), manager_reviewed_at=now,
+        ))
+    approved = stage >= STAGES.index('audit_in_progress')
+    rows[AuditPlan].append(AuditPlan(
+        project=project, created_by_id=author, status='approved' if approved else 'submitted',
+        description=text(rng, 30), manager_notes=text(rng, 8) if approved else '',
+        manager_reviewed_at=now if approved else None,
+    ))
+    if not approved:
+        return rows
+
+    in_progress = project.status == 'audit_in_progress'
+    weights = ISSUE_WEIGHTS if in_progress else REVIEWED_ISSUE_WEIGHTS
+    statuses = rng.choices(list(weights), list(weights.values()), k=rng.randint(0 if in_progress else 1, 6))
+    if not in_progress and 'approved' not in statuses:
+        statuses[0] = 'approved'
+    for status in statuses:
+        reviewed = status != 'submitted'
+        rows[AuditIssue].append(AuditIssue(
+            project=project, created_by_id=rng.choice(assigned), status=status, description=text(rng, 25),
+            manager_notes=text(rng, 8) if reviewed else '', manager_reviewed_at=now if reviewed else None,
+        ))
+
+    if in_progress:
+        if 'approved' in statuses and rng.random() < 0.4:
+            status = rng.choice(['submitted', 'rejected'])
+            rows[AuditReport].append(AuditReport(
+                project=project, created_by_id=author, status=status, description=text(rng, 60),
+                manager_notes=text(rng, 10) if status == 'rejected' else '',
+            ))
+        return rows
+
+    status = rng.choice(STAGE_REPORTS[project.status])
+    reached = REPORT_STATUSES.index(status)
+
+    def notes(written_at):
+        return text(rng, 12) if reached >= REPORT_STATUSES.index(written_at) else ''
+
+    rows[AuditReport].append(AuditReport(
+        project=project, created_by_id=author, status=status, description=text(rng, 60),
+        manager_notes=notes('approved_by_manager'), department_notes=notes('dept_replied'),
+        auditor_final_notes=notes('auditor_approved'), final_manager_notes=notes('final_approved'),
+    ))
+    if project.status == 'finalized':
+        rows[FinalReport].append(FinalReport(project=project, status='ready', content=text(rng, 120)))
+    return rows
+
+
+class Batch(NamedTuple):
+    project_ids: list
+    rows: int
+
+
+def batches(projects, batch_size):
+    """``(first, count)`` of each batch of ``projects`` projects."""
+    return [(first, min(batch_size, projects - first)) for first in range(0, projects, batch_size)]
+
+
+def create_people(*, departments, auditors, managers, prefix, password, batch_size):
+    """
+    The users and departments of a dataset, in one transaction. All users
+    share one password hash: hashing it per user would cost a full PBKDF2
+    run each.
+    """
+    groups = role_groups()
+    password = make_password(password)
+    with transaction.atomic():
+        manager_ids = create_users(prefix, 'manager', managers, password, groups[AUDIT_MANAGERS], batch_size)
+        auditor_ids = create_users(prefix, 'auditor', auditors, password, groups[AUDITORS], batch_size)
+        head_ids = create_users(prefix, 'head', departments, password, groups[DEPARTMENT_MANAGERS], batch_size)
+        department_ids = [
+            department.pk for department in Department.objects.bulk_create([
+                Department(name=f'{prefix} department {i}', manager_id=head_id)
+                for i, head_id in enumerate(head_ids)
+            ], batch_size=batch_size)
+        ]
+    return Dataset(prefix, department_ids, manager_ids, auditor_ids, head_ids, [])
+
+
+def create_batch(dataset, first, count, seed, batch_size):
+    """
+    Create projects ``first`` to ``first + count`` of ``dataset`` with
+    their workflow rows, in one transaction. Each batch draws from its own
+    generator seeded by ``seed`` and ``first``, so a dataset comes out the
+    same however its batches are spread over processes.
+    """
+    rng = random.Random(f'{seed}:{first}')
+    with transaction.atomic():
+        projects = AuditProject.objects.bulk_create([
+            AuditProject(
+                title=f'{dataset.prefix} project {n}: {text(rng, 4)}', description=text(rng, 40),
+                department_id=rng.choice(dataset.department_ids), created_by_id=rng.choice(dataset.manager_ids),
+                status=rng.choices(STAGES, list(STAGE_WEIGHTS.values()))[0],
+            )
+            for n in range(first, first + count)
+        ], batch_size=batch_size)
+        rows = len(projects)
+
+        children = {}
+        for project in projects:
+            for model, objs in project_children(rng, project, dataset.auditor_ids).items():
+                children.setdefault(model, []).extend(objs)
+        for model, objs in children.items():
+            created = model.objects.bulk_create(objs, batch_size=batch_size)
+            rows += len(created)
+            if model in search.SOURCES and created:
+                search.upsert([search.document_for(obj) for obj in created], batch_size)
+
+        project_ids = [project.pk for project in projects]
+        search.upsert([search.document_for(project) for project in projects], batch_size)
+        recount(project_ids)
+    return Batch(project_ids, rows)
+
+
+def generate(*, departments=5, projects=100, auditors=10, managers=2, seed=0, prefix='synthetic',
+             password='synthetic', batch_size=1000, progress=None):
+    """
+    Create a dataset of ``projects`` projects spread over ``departments``
+    departments, each with its own department manager, in this process.
+    ``progress(batch)`` is called after every committed batch of projects.
+    """
+    dataset = create_people(
+        departments=departments, auditors=auditors, managers=managers,
+        prefix=prefix, password=password, batch_size=batch_size,
+    )
+    for first, count in batches(projects, batch_size):
+        batch = create_batch(dataset, first, count, seed, batch_size)
+        dataset.project_ids.extend(batch.project_ids)
+        if progress:
+            progress(batch)
+    return dataset
+
+
+# ---- Parallel seeding ----
+def _create_batch(args):
+    return create_batch(*args)
+
+
+def create_batches_parallel(dataset, seed, batch_size, projects, processes):
+    """
+    Create the projects of ``dataset`` in ``processes`` worker processes,
+    one batch (and transaction) per task. Yields each ``Batch`` as it
+    commits. Only for databases that take concurrent writers.
+    """
+    # Children start from scratch rather than from a fork holding our connections.
+    connections.close_all()
+    context = multiprocessing.get_context('spawn')
+    tasks = [(dataset, first, count, seed, batch_size) for first, count in batches(projects, batch_size)]
+    # Tasks are unpickled after the initializer, so once the app registry is ready.
+    with context.Pool(processes, initializer=django.setup) as pool:
+        yield from pool.imap_unordered(_create_batch, tasks)
+
+
+def remove(prefix):
+    """Delete every department (and so project) and user generated under ``prefix``."""
+    Department.objects.filter(name__startswith=f'{prefix} department ').delete()
+    User.objects.filter(username__startswith=f'{prefix}-').delete()
@@ -0,0 +1,251 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+
+from . import events, search
+from .fragments import bump as bump_fragments
+from .models import (
+    AuditAssignment, AuditIssue, AuditPlan, AuditProject, AuditReport, Department, FinalReport,
+    ProjectStats,
+)
+from .roles import invalidate_all_roles, invalidate_department_scopes, invalidate_user_roles
+from .stats import TRACKED, apply_change, tracked_state
+
+
+# Sent by core.transitions.transition() after a conditional status UPDATE,
+# which bypasses post_save. Arguments: instance, old_status, new_status and
+# fields (the names of the other columns the UPDATE wrote).
+status_changed = Signal()
+
+
+# ---- Database tuning ----
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'AUDIT_SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# ---- Role cache invalidation ----
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+
+    if not reverse:
+        instance.__dict__.pop('_audit_roles', None)
+        invalidate_user_roles(instance.pk)
+    elif action == 'pre_clear':
+        # pk_set is empty on clear(), so collect the members before they go.
+        invalidate_user_roles(*instance.user_set.values_list('pk', flat=True))
+    elif pk_set:
+        invalidate_user_roles(*pk_set)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    # Primary keys can be reused (e.g. SQLite after a rollback), so never let
+    # a new account inherit a cached role set.
+    if created:
+        invalidate_user_roles(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user_roles(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_saved_or_deleted(sender, instance, **kwargs):
+    invalidate_all_roles()
+
+
+# ---- Project counters and dashboard fragments ----
+def project_department(project_id, instance):
+    """The department of ``instance``'s project, without a query if it is loaded."""
+    project = instance._state.fields_cache.get('project')
+    if project is not None:
+        return project.department_id
+    return AuditProject.objects.filter(pk=project_id).values_list('department_id', flat=True).first()
+
+
+def fragment_scopes(model, instance, counters_changed):
+    """The dashboard fragment scopes a saved or deleted row affects."""
+    scopes = []
+    if counters_changed and model is not AuditAssignment:
+        # Recent projects show the plan/issue/report counters.
+        scopes.append('projects')
+    if model is AuditPlan:
+        scopes += ['plans', f'user:{instance.created_by_id}']
+    elif model is AuditIssue:
+        scopes += ['issues', f'user:{instance.created_by_id}']
+    elif model is AuditReport:
+        scopes += ['reports', f'department:{project_department(instance.project_id, instance)}']
+    elif model is AuditAssignment:
+        scopes += [
+            f'user:{instance.auditor_id}',
+            f'department:{project_department(instance.project_id, instance)}',
+        ]
+    return scopes
+
+
+def project_fragment_scopes(project, created=False):
+    scopes = ['projects', f'department:{project.department_id}']
+    if not created:
+        # Assigned auditors see the project's title and status on their dashboard.
+        auditor_ids = getattr(project, '_auditor_ids', None)
+        if auditor_ids is None:
+            auditor_ids = project.assignments.values_list('auditor_id', flat=True)
+        scopes += [f'user:{auditor_id}' for auditor_id in auditor_ids]
+    return scopes
+
+
+@receiver(post_save, sender=AuditProject)
+def project_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        ProjectStats.objects.create(project=instance)
+    scopes = project_fragment_scopes(instance, created)
+    bump_fragments(*scopes)
+    if created:
+        events.publish(scopes, events.event_for(instance))
+
+
+@receiver(post_delete, sender=AuditProject)
+def project_deleted(sender, instance, **kwargs):
+    bump_fragments('projects', f'department:{instance.department_id}')
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def department_saved_or_deleted(sender, instance, **kwargs):
+    # A new manager changes who the department belongs to, so every user's
+    # cached department scope is dropped, not only the current manager's.
+    invalidate_department_scopes()
+    bump_fragments(f'department:{instance.pk}')
+
+
+def remember_tracked_state(sender, instance, **kwargs):
+    # Snapshot what the row currently counts towards, so post_save can tell
+    # whether a save moved it to another status or project.
+    instance._stats_state = tracked_state(instance)
+
+
+def tracked_row_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old_state = None if created else instance._stats_state
+    new_state = tracked_state(instance)
+    changed = created or (old_state is not None and old_state != new_state)
+    if changed:
+        apply_change(sender, old_state, new_state)
+    instance._stats_state = new_state
+    scopes = fragment_scopes(sender, instance, changed)
+    bump_fragments(*scopes)
+    # Rows loaded with a deferred status have no state to compare.
+    status_moved = created or (old_state and new_state and old_state[1] != new_state[1])
+    if sender in events.EVENT_NAMES and status_moved:
+        events.publish(scopes, events.event_for(instance))
+
+
+def tracked_row_deleted(sender, instance, origin=None, **kwargs):
+    # Rows removed by deleting their project take the counters with them,
+    # and the project's own delete handler covers the fragments.
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model in (AuditProject, ProjectStats):
+        if sender is AuditAssignment:
+            bump_fragments(f'user:{instance.auditor_id}')
+        return
+    state = getattr(instance, '_stats_state', None) or tracked_state(instance)
+    if state is not None:
+        apply_change(sender, state, None)
+    bump_fragments(*fragment_scopes(sender, instance, True))
+
+
+for model in TRACKED:
+    post_init.connect(remember_tracked_state, sender=model, dispatch_uid=f'stats_init_{model.__name__}')
+    post_save.connect(tracked_row_saved, sender=model, dispatch_uid=f'stats_save_{model.__name__}')
+    post_delete.connect(tracked_row_deleted, sender=model, dispatch_uid=f'stats_delete_{model.__name__}')
+
+
+@receiver(status_changed)
+def status_transitioned(sender, instance, old_status, new_status, **kwargs):
+    if sender is AuditProject:
+        scopes = project_fragment_scopes(instance)
+        bump_fragments(*scopes)
+        events.publish(scopes, events.event_for(instance, new_status))
+        return
+    if sender not in TRACKED:
+        return
+    old_state = (instance.project_id, old_status)
+    new_state = (instance.project_id, new_status)
+    changed = old_state != new_state
+    if changed:
+        apply_change(sender, old_state, new_state)
+    instance._stats_state = new_state
+    scopes = fragment_scopes(sender, instance, changed)
+    bump_fragments(*scopes)
+    if sender in events.EVENT_NAMES:
+        events.publish(scopes, events.event_for(instance, new_status))
+
+
+# ---- Attachment storage ----
+def attachment_deleted(sender, instance, **kwargs):
+    # Drops the name's reference to its blob; gc_attachments frees the blob.
+    name = instance.__dict__.get('attachment')
+    if name:
+        storage = instance.attachment.storage
+        transaction.on_commit(lambda: storage.delete(str(name)))
+
+
+for model in (AuditPlan, AuditIssue, AuditReport, FinalReport):
+    post_delete.connect(attachment_deleted, sender=model, dispatch_uid=f'attachment_delete_{model.__name__}')
+
+
+# ---- Search index ----
+def remember_indexed_text(sender, instance, **kwargs):
+    instance._search_text = search.indexed_text(instance)
+
+
+def searchable_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    text = search.indexed_text(instance)
+    if created:
+        # A new row only needs a document once it has some text.
+        changed = text is None or any(text)
+    else:
+        changed = text is None or text != instance._search_text
+    if changed:
+        search.index(instance)
+    instance._search_text = text
+
+
+def searchable_deleted(sender, instance, origin=None, **kwargs):
+    # A project's documents go with it through the foreign key cascade.
+    origin_model = getattr(origin, 'model', type(origin))
+    if AuditProject not in (sender, origin_model):
+        search.unindex(sender, instance.pk)
+
+
+@receiver(status_changed)
+def searchable_transitioned(sender, instance, fields=(), **kwargs):
+    # Reviews write their notes in the same UPDATE as the new status.
+    if sender in search.SOURCES and search.INDEXED_FIELDS[sender] & set(fields):
+        search.index(instance)
+        instance._search_text = search.indexed_text(instance)
+
+
+for model in search.SOURCES:
+    post_init.connect(remember_indexed_text, sender=model, dispatch_uid=f'search_init_{model.__name__}')
+    post_save.connect(searchable_saved, sender=model, dispatch_uid=f'search_save_{model.__name__}')
+    post_delete.connect(searchable_deleted, sender=model, dispatch_uid=f'search_delete_{model.__name__}')
@@ -0,0 +1,138 @@
+"""
+Per-project workflow counters (``ProjectStats``).
+
+Every tracked row contributes to its project's total for its model and, for
+a few statuses, to a matching "pending"/"approved" counter. The signal
+handlers turn a save or delete into the change in those contributions and
+apply it with a single ``F()`` UPDATE, so concurrent writers never lose an
+increment. Code that bypasses signals (``bulk_create``, ``QuerySet.update``)
+must call :func:`bump` itself; ``recount_project_stats`` repairs any drift.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import AuditAssignment, AuditIssue, AuditPlan, AuditProject, AuditReport, ProjectStats
+
+
+RECOUNT_BATCH_SIZE = 1000
+
+# model -> (total counter, {status: status counter})
+TRACKED = {
+    AuditPlan: ('plan_count', {'submitted': 'pending_plan_count'}),
+    AuditIssue: ('issue_count', {'submitted': 'pending_issue_count', 'approved': 'approved_issue_count'}),
+    AuditReport: ('report_count', {'submitted': 'pending_report_count'}),
+    AuditAssignment: ('assignment_count', {}),
+}
+
+COUNTER_FIELDS = [
+    'plan_count', 'pending_plan_count', 'issue_count', 'pending_issue_count',
+    'approved_issue_count', 'report_count', 'pending_report_count', 'assignment_count',
+]
+
+
+def tracked_state(instance):
+    """
+    The ``(project_id, status)`` a row counts towards, or ``None`` if either
+    field was deferred when the row was loaded. Read from ``__dict__`` so a
+    deferred field is never fetched just to snapshot it.
+    """
+    fields = instance.__dict__
+    if 'project_id' not in fields:
+        return None
+    if hasattr(type(instance), 'status') and 'status' not in fields:
+        return None
+    return fields['project_id'], fields.get('status')
+
+
+def contribution(model, state, sign):
+    total_field, status_fields = TRACKED[model]
+    project_id, status = state
+    deltas = {(project_id, total_field): sign}
+    if status in status_fields:
+        deltas[(project_id, status_fields[status])] = sign
+    return deltas
+
+
+def bump(project_id, **deltas):
+    """Add ``deltas`` to the project's counters in one atomic UPDATE."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if deltas:
+        ProjectStats.objects.filter(project_id=project_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+
+def apply_change(model, old_state, new_state):
+    """Move a row's contribution from ``old_state`` to ``new_state``."""
+    changes = Counter()
+    if old_state is not None:
+        changes.update(contribution(model, old_state, -1))
+    if new_state is not None:
+        changes.update(contribution(model, new_state, 1))
+
+    per_project = defaultdict(dict)
+    for (project_id, field), delta in changes.items():
+        per_project[project_id][field] = delta
+    for project_id, deltas in per_project.items():
+        bump(project_id, **deltas)
+
+
+def count_projects(project_ids):
+    """Count every tracked relation for ``project_ids`` with one grouped query per model."""
+    counts = {pk: dict.fromkeys(COUNTER_FIELDS, 0) for pk in project_ids}
+    for model, (total_field, status_fields) in TRACKED.items():
+        aggregates = {total_field: Count('pk')}
+        for status, field in status_fields.items():
+            aggregates[field] = Count('pk', filter=Q(status=status))
+        rows = (
+            model.objects
+            .filter(project_id__in=project_ids)
+            .order_by()
+            .values('project_id')
+            .annotate(**aggregates)
+        )
+        for row in rows:
+            project_id = row.pop('project_id')
+            counts[project_id].update(row)
+    return counts
+
+
+def recount(project_ids=None, batch_size=RECOUNT_BATCH_SIZE):
+    """
+    Rebuild the counters from the source tables, a batch of projects at a
+    time. Returns ``(projects_checked, projects_fixed)``.
+    """
+    projects = AuditProject.objects.order_by('pk').values_list('pk', flat=True)
+    if project_ids is not None:
+        projects = projects.filter(pk__in=project_ids)
+
+    checked = fixed = 0
+    last_pk = 0
+    while True:
+        batch = list(projects.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1]
+
+        with transaction.atomic():
+            existing = {
+                stats.project_id: stats
+                for stats in ProjectStats.objects.select_for_update().filter(project_id__in=batch)
+            }
+            to_create, to_update = [], []
+            for project_id, values in count_projects(batch).items():
+                stats = existing.get(project_id)
+                if stats is None:
+                    to_create.append(ProjectStats(project_id=project_id, **values))
+                elif any(getattr(stats, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(stats, field, value)
+                    to_update.append(stats)
+            ProjectStats.objects.bulk_create(to_create)
+            ProjectStats.objects.bulk_update(to_update, COUNTER_FIELDS)
+
+        checked += len(batch)
+        fixed += len(to_create) + len(to_update)
+    return checked, fixed
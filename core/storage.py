@@ -0,0 +1,205 @@
+"""
+Content-addressed storage for plan, issue and report attachments.
+
+The same evidence files are uploaded again and again, and every copy used
+to take its own space under ``MEDIA_ROOT/audit/``. This backend keeps one
+*blob* per distinct content, at ``blobs/<aa>/<sha256>``, and makes each
+attachment name (``audit/issues/scan.pdf``) a hard link to it, so URLs,
+downloads and ``FieldFile.open()`` work as before while identical uploads
+share their disk blocks.
+
+``Blob.refcount`` counts the names linked to each blob, through the
+``StoredFile`` rows written on every save and removed on every delete.
+``manage.py gc_attachments`` drops names no attachment field refers to any
+more and removes the blobs nothing references.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import F
+
+
+READ_BLOCK = 64 * 1024
+
+
+def attachment_storage():
+    return storages['attachments']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, blob_dir='blobs', **kwargs):
+        super().__init__(**kwargs)
+        self.blob_dir = blob_dir
+
+    def blob_path(self, digest):
+        return self.path(os.path.join(self.blob_dir, digest[:2], digest))
+
+    def _save(self, name, content):
+        # Spool next to the blobs so the first copy can become the blob by
+        # linking rather than copying.
+        directory = self.path(self.blob_dir)
+        os.makedirs(directory, exist_ok=True)
+        fd, spool = tempfile.mkstemp(dir=directory, suffix='.upload')
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+            return self._link(name, spool, hasher.hexdigest(), size)
+        finally:
+            if os.path.exists(spool):
+                os.remove(spool)
+
+    def adopt(self, name, path, digest):
+        """
+        Store the file at ``path``, whose SHA-256 is already known, under
+        the free ``name`` without reading it again. ``path`` is consumed.
+        """
+        try:
+            return self._link(name, path, digest, os.path.getsize(path))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _link(self, name, source, digest, size):
+        from .models import Blob, StoredFile
+
+        with transaction.atomic():
+            # Reference the blob before touching its file, so a concurrent
+            # gc_attachments never removes a blob this save is about to use.
+            Blob.objects.get_or_create(sha256=digest, defaults={'size': size})
+            Blob.objects.filter(pk=digest).update(refcount=F('refcount') + 1)
+            StoredFile.objects.create(name=name, blob_id=digest)
+
+            blob_path = self.blob_path(digest)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if not os.path.exists(blob_path):
+                link_or_copy(source, blob_path)
+
+            target = self.path(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            link_or_copy(blob_path, target)
+        return name
+
+    def delete(self, name):
+        from .models import Blob, StoredFile
+
+        super().delete(name)
+        with transaction.atomic():
+            digest = StoredFile.objects.filter(name=name).values_list('blob_id', flat=True).first()
+            if digest is not None:
+                StoredFile.objects.filter(name=name).delete()
+                Blob.objects.filter(pk=digest).update(refcount=F('refcount') - 1)
+
+    def discard(self, name):
+        """
+        Delete ``name`` after the transaction that stored it rolled back,
+        along with its blob if that rolled-back save was what created it.
+        """
+        from .models import Blob
+
+        hasher = hashlib.sha256()
+        try:
+            with open(self.path(name), 'rb') as f:
+                for block in iter(lambda: f.read(READ_BLOCK), b''):
+                    hasher.update(block)
+        except FileNotFoundError:
+            return
+        self.delete(name)
+        if not Blob.objects.filter(pk=hasher.hexdigest()).exists():
+            self.remove_blob(hasher.hexdigest())
+
+    def remove_blob(self, digest):
+        try:
+            os.remove(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+
+def link_or_copy(source, target):
+    """Hard-link ``source`` to ``target`` (replacing it), copying across filesystems."""
+    staging = f'{target}.{uuid.uuid4().hex}.tmp'
+    try:
+        os.link(source, staging)
+    except OSError:
+        shutil.copyfile(source, staging)
+    os.replace(staging, target)
+
+
+# ---- Garbage collection ----
+def attachment_names():
+    """Every name an attachment field currently points at."""
+    from .models import AuditIssue, AuditPlan, AuditReport, FinalReport
+
+    names = set()
+    for model in (AuditPlan, AuditIssue, AuditReport, FinalReport):
+        names.update(
+            model.objects.exclude(attachment='').exclude(attachment__isnull=True)
+            .values_list('attachment', flat=True).iterator()
+        )
+    return names
+
+
+def release_orphans(storage, older_than, dry_run=False):
+    """Delete stored names no attachment refers to; returns how many."""
+    from .models import StoredFile
+
+    live = attachment_names()
+    orphans = [
+        name for name in
+        StoredFile.objects.filter(created_at__lt=older_than).values_list('name', flat=True).iterator()
+        if name not in live
+    ]
+    if not dry_run:
+        for name in orphans:
+            storage.delete(name)
+    return len(orphans)
+
+
+def collect_blobs(storage, dry_run=False):
+    """Remove blobs nothing links to; returns ``(count, bytes)``."""
+    from .models import Blob
+
+    count = freed = 0
+    for digest, size in list(Blob.objects.filter(refcount=0).values_list('sha256', 'size')):
+        if not dry_run:
+            # Conditional, so a save that referenced the blob meanwhile keeps it.
+            if not Blob.objects.filter(pk=digest, refcount=0).delete()[0]:
+                continue
+            storage.remove_blob(digest)
+        count += 1
+        freed += size
+    return count, freed
+
+
+def adopt_existing(storage, dry_run=False):
+    """
+    Move attachments saved before this backend existed into blobs, so
+    existing duplicates are deduplicated too. Returns ``(count, bytes)``.
+    """
+    from .models import StoredFile
+
+    known = set(StoredFile.objects.values_list('name', flat=True).iterator())
+    count = size = 0
+    for name in sorted(attachment_names() - known):
+        path = storage.path(name)
+        if not os.path.exists(path):
+            continue
+        count += 1
+        size += os.path.getsize(path)
+        if dry_run:
+            continue
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_BLOCK), b''):
+                hasher.update(block)
+        storage._link(name, path, hasher.hexdigest(), os.path.getsize(path))
+    return count, size
@@ -0,0 +1,69 @@
+from django.db import transaction
+
+from .jobs import job
+from .models import AuditReport, FinalReport
+from .pdf import render_cached
+from .search import index
+
+
+ISSUE_CHUNK_SIZE = 2000
+
+
+def final_report_content(report):
+    """
+    Assemble the plain-text final report for ``report``'s project.
+
+    Approved issues are streamed from the database as bare descriptions, so
+    a project with thousands of issues never materialises model instances.
+    """
+    project = report.project
+    plan = (
+        project.plans.order_by('pk')
+        .values_list('description', flat=True)
+        .first()
+    )
+    issues = (
+        project.issues.filter(status='approved')
+        .order_by('pk')
+        .values_list('description', flat=True)
+        .iterator(chunk_size=ISSUE_CHUNK_SIZE)
+    )
+
+    lines = [
+        f"Final Audit Report for {project.title}",
+        "",
+        f"Project Description: {project.description}",
+        f"Department: {project.department.name}",
+        "",
+        f"Audit Plan: {plan if plan is not None else 'No plan'}",
+        "",
+        "Issues Found:",
+    ]
+    lines.extend(f"- {description}" for description in issues)
+    lines += [
+        "",
+        f"Department Response: {report.department_notes}",
+        "",
+        f"Final Manager Notes: {report.final_manager_notes}",
+    ]
+    return "\n".join(lines)
+
+
+def mark_final_report_failed(final_report_id, report_id):
+    FinalReport.objects.filter(pk=final_report_id).update(status='failed')
+
+
+@job('build_final_report', on_failure=mark_final_report_failed)
+def build_final_report(final_report_id, report_id):
+    report = AuditReport.objects.select_related('project__department').get(pk=report_id)
+    # Assembled before the transaction, so the write lock is only held for the writes.
+    content = final_report_content(report)
+    with transaction.atomic():
+        FinalReport.objects.filter(pk=final_report_id).update(content=content, status='ready')
+        # update() skips the post_save receiver that keeps the search index current.
+        index(FinalReport(pk=final_report_id, project_id=report.project_id, content=content))
+
+
+@job('render_pdf')
+def render_pdf(kind, pk, digest):
+    render_cached(kind, pk, digest)
@@ -0,0 +1,63 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.fragments import cached
+
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, scopes, scoped, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.scopes = scopes
+        self.scoped = scoped
+        self.vary = vary
+
+    def render(self, context):
+        scopes = []
+        for scope in self.scopes:
+            value = scope.resolve(context)
+            scopes += value if isinstance(value, (list, tuple)) else [value]
+        scopes += [f'{kind}:{value.resolve(context)}' for kind, value in self.scoped]
+        vary = [context.get('user_role'), *(value.resolve(context) for value in self.vary)]
+        html = cached(
+            context.get('request'), self.name.resolve(context), scopes,
+            lambda: self.nodelist.render(context), vary=vary,
+        )
+        return mark_safe(html)
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """
+    Cache the enclosed template under a generation-versioned key::
+
+        {% cachedfragment "pending_plans" "plans" %}...{% endcachedfragment %}
+        {% cachedfragment "my_work" user=request.user.pk vary=request.GET.page %}
+            ...
+        {% endcachedfragment %}
+
+    Arguments after the name are scopes (a list adds each of its items);
+    ``kind=value`` adds the scope
+    ``kind:value`` (so ``user=7`` is ``user:7``); ``vary=value`` only enters
+    the key. The current user's role is always part of the key.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f'{bits[0]} needs a name and at least one scope.')
+
+    scopes, scoped, vary = [], [], []
+    for bit in bits[2:]:
+        kind, sep, value = bit.partition('=')
+        if not sep:
+            scopes.append(parser.compile_filter(bit))
+        elif kind == 'vary':
+            vary.append(parser.compile_filter(value))
+        else:
+            scoped.append((kind, parser.compile_filter(value)))
+
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), scopes, scoped, vary)
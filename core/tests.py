@@ -1,3 +1,1492 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import Group, User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    AuditAssignment, AuditIssue, AuditPlan, AuditProject, AuditReport, Blob, Department,
+    FinalReport, Job, ProjectStats, SearchDocument, UploadSession, WorkflowHistory,
+)
+from . import benchmark, events, exports, jobs, seeding, uploads, workflow
+from .pagination import EstimatedCountPaginator, keyset_paginate
+from .pdf import cache_path, content_digest
+from .projects import import_projects, parse_import
+from .transitions import TransitionConflict, atomic_with_attachments, store_attachment, transition
+from .workflow import PROJECT_WORKFLOW, InvalidTransition, apply, bulk_apply
+from .search import search
+from .roles import (
+    AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS, ROLES_TIMEOUT, get_user_roles, managed_department_ids, roles_timeout,
+)
+from .middleware import QueryBudgetExceeded
+from .views import is_audit_manager, is_auditor
+
+
+def weasyprint_available():
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class AuditTestCase(TestCase):
+    """
+    Every view request made by the tests is held to its query budget, and
+    every test starts from an empty cache so fragments never leak between
+    tests whose rows reuse primary keys.
+    """
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        cache.clear()
+
+
+class RoleCacheTests(AuditTestCase):
+    def setUp(self):
+        self.managers = Group.objects.create(name=AUDIT_MANAGERS)
+        self.auditors = Group.objects.create(name=AUDITORS)
+        self.user = User.objects.create_user('alice', password='x')
+        self.user.groups.add(self.auditors)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_resolved_once_per_request(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_auditor(user))
+            self.assertFalse(is_audit_manager(user))
+            self.assertTrue(is_auditor(user))
+
+    def test_roles_cached_across_requests(self):
+        get_user_roles(self.fresh_user())
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_roles(user), {AUDITORS})
+
+    def test_group_membership_change_invalidates(self):
+        get_user_roles(self.fresh_user())
+        self.user.groups.add(self.managers)
+        self.assertTrue(is_audit_manager(self.fresh_user()))
+
+        self.managers.user_set.remove(self.user)
+        self.assertFalse(is_audit_manager(self.fresh_user()))
+
+        self.auditors.user_set.clear()
+        self.assertFalse(is_auditor(self.fresh_user()))
+
+    def test_group_rename_invalidates(self):
+        get_user_roles(self.fresh_user())
+        self.auditors.name = 'Former Auditors'
+        self.auditors.save()
+        self.assertFalse(is_auditor(self.fresh_user()))
+
+
+    def test_per_process_cache_keeps_roles_briefly(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            get_user_roles(self.fresh_user())
+        self.assertEqual(cache_set.call_args.args[2], 5)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(roles_timeout(), ROLES_TIMEOUT)
+
+
+class DepartmentScopeTests(AuditTestCase):
+    def setUp(self):
+        self.head = User.objects.create_user('head', password='x')
+        self.head.groups.add(Group.objects.create(name=DEPARTMENT_MANAGERS))
+        self.finance = Department.objects.create(name='Finance', manager=self.head)
+        self.stores = Department.objects.create(name='Stores', manager=self.head)
+        self.other = Department.objects.create(name='Legal')
+        for department in (self.finance, self.stores, self.other):
+            for i in range(3):
+                project = AuditProject.objects.create(title=f'{department.name} {i}', department=department)
+                AuditReport.objects.create(project=project, status='sent_to_department', created_by=self.head)
+
+    def fresh_head(self):
+        return User.objects.get(pk=self.head.pk)
+
+    def test_scope_cached_and_invalidated_on_department_save(self):
+        self.assertEqual(managed_department_ids(self.fresh_head()), (self.finance.pk, self.stores.pk))
+        head = self.fresh_head()
+        with self.assertNumQueries(0):
+            self.assertEqual(managed_department_ids(head), (self.finance.pk, self.stores.pk))
+
+        self.stores.manager = None
+        self.stores.save()
+        self.assertEqual(managed_department_ids(self.fresh_head()), (self.finance.pk,))
+        self.other.manager = self.head
+        self.other.save()
+        self.assertEqual(managed_department_ids(self.fresh_head()), (self.finance.pk, self.other.pk))
+
+    def test_lists_and_dashboard_cover_every_managed_department(self):
+        self.client.force_login(self.head)
+        response = self.client.get(reverse('core:reports_list'))
+        self.assertEqual(len(response.context['reports']), 6)
+        response = self.client.get(reverse('core:projects_list'))
+        self.assertEqual(len(response.context['projects']), 6)
+
+        cache.clear()
+        response = self.client.get(reverse('core:department_dashboard'))
+        self.assertEqual(len(response.context['pending_reports']), 6)
+        self.assertContains(response, 'Stores 2')
+        self.assertNotContains(response, 'Legal 0')
+        self.assertContains(response, 'View All Projects')
+
+    def test_dashboard_queries_do_not_grow_with_reports(self):
+        self.client.force_login(self.head)
+        self.client.get(reverse('core:department_dashboard'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('core:department_dashboard'))
+        for i in range(5):
+            auditor = User.objects.create_user(f'auditor{i}')
+            project = AuditProject.objects.create(title=f'More {i}', department=self.stores)
+            AuditAssignment.objects.create(project=project, auditor=auditor)
+            AuditReport.objects.create(project=project, status='sent_to_department', created_by=auditor)
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse('core:department_dashboard'))
+        self.assertEqual(len(few), len(many))
+
+    def test_report_review_checks_managed_departments(self):
+        self.client.force_login(self.head)
+        foreign = AuditReport.objects.get(project__title='Legal 0')
+        response = self.client.post(reverse('core:department_report_review', args=[foreign.pk]))
+        self.assertRedirects(response, reverse('core:department_dashboard'))
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'sent_to_department')
+
+
+class AuditorViewsQueryTests(AuditTestCase):
+    def setUp(self):
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.department = Department.objects.create(name='Finance')
+        self.client.force_login(self.auditor)
+        get_user_roles(self.auditor)  # warm the role cache
+
+    def assign_projects(self, count):
+        for i in range(count):
+            project = AuditProject.objects.create(title=f'P{i}', department=self.department)
+            AuditAssignment.objects.create(project=project, auditor=self.auditor)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_assignments(self):
+        for name in ('core:auditor_dashboard', 'core:projects_list'):
+            with self.subTest(view=name):
+                AuditAssignment.objects.all().delete()
+                self.assign_projects(2)
+                small = self.count_queries(reverse(name))
+                self.assign_projects(8)
+                self.assertEqual(self.count_queries(reverse(name)), small)
+
+    def test_only_assigned_projects_listed(self):
+        self.assign_projects(1)
+        AuditProject.objects.create(title='Other', department=self.department)
+        response = self.client.get(reverse('core:projects_list'))
+        self.assertEqual([p.title for p in response.context['projects']], ['P0'])
+
+
+class ManagerDashboardTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.department = Department.objects.create(name='Finance')
+        self.client.force_login(self.manager)
+        get_user_roles(self.manager)
+
+    def add_pending_work(self, count):
+        for i in range(count):
+            project = AuditProject.objects.create(title=f'P{i}', department=self.department)
+            AuditPlan.objects.create(project=project, status='submitted')
+            AuditIssue.objects.create(project=project, status='submitted')
+            AuditReport.objects.create(project=project, status='submitted')
+
+    def test_stats_endpoint(self):
+        self.add_pending_work(2)
+        AuditIssue.objects.update(status='approved')
+        response = self.client.get(reverse('core:manager_dashboard_stats'))
+        stats = response.json()
+        self.assertEqual(stats['total_projects'], 2)
+        self.assertEqual(stats['pending_plans'], 2)
+        self.assertEqual(stats['pending_issues'], 0)
+        self.assertEqual(stats['pending_reports'], 2)
+
+    def test_dashboard_query_count_is_constant(self):
+        self.add_pending_work(1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('core:manager_dashboard'))
+        self.add_pending_work(10)
+        # Compare cold renders, not a cold one against cached fragments.
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('core:manager_dashboard'))
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(response.context['stats']['total_projects'], 11)
+
+
+class DashboardFragmentCacheTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.department = Department.objects.create(name='Finance')
+        self.project = AuditProject.objects.create(title='Payroll', department=self.department)
+        self.issue = AuditIssue.objects.create(project=self.project, created_by=self.auditor)
+
+    def fragments(self, response):
+        timing = response['Server-Timing']
+        return timing[timing.index('fragments;'):]
+
+    def test_manager_dashboard_served_from_cache(self):
+        self.client.force_login(self.manager)
+        url = reverse('core:manager_dashboard')
+        with CaptureQueriesContext(connection) as cold:
+            response = self.client.get(url)
+        self.assertIn('0 hit, 4 miss', self.fragments(response))
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(url)
+        self.assertIn('4 hit, 0 miss', self.fragments(response))
+        self.assertLess(len(warm), len(cold))
+        self.assertContains(response, 'Payroll')
+
+    def test_save_bumps_only_affected_fragments(self):
+        self.client.force_login(self.manager)
+        url = reverse('core:manager_dashboard')
+        self.client.get(url)
+
+        # A notes-only edit leaves the project counters alone.
+        self.issue.manager_notes = 'Checked'
+        self.issue.save()
+        self.assertIn('2 hit, 2 miss', self.fragments(self.client.get(url)))
+
+        AuditPlan.objects.create(project=self.project, status='submitted')
+        response = self.client.get(url)
+        self.assertIn('1 hit, 3 miss', self.fragments(response))
+        self.assertContains(response, 'Pending Plans (1)')
+
+    def test_auditor_fragments_are_per_user(self):
+        other = User.objects.create_user('other', password='x')
+        other.groups.add(Group.objects.get(name=AUDITORS))
+        AuditAssignment.objects.create(project=self.project, auditor=self.auditor)
+
+        self.client.force_login(self.auditor)
+        self.assertContains(self.client.get(reverse('core:auditor_dashboard')), 'Payroll')
+        self.client.force_login(other)
+        self.assertNotContains(self.client.get(reverse('core:auditor_dashboard')), 'Payroll')
+
+        self.project.title = 'Payroll 2026'
+        self.project.save()
+        self.client.force_login(self.auditor)
+        self.assertContains(self.client.get(reverse('core:auditor_dashboard')), 'Payroll 2026')
+
+
+class ProjectDetailTests(AuditTestCase):
+    def setUp(self):
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'),
+            created_by=self.auditor,
+        )
+        AuditAssignment.objects.create(project=self.project, auditor=self.auditor)
+        self.client.force_login(self.auditor)
+        get_user_roles(self.auditor)
+
+    def add_rows(self, count):
+        for i in range(count):
+            author = User.objects.create_user(f'author{AuditPlan.objects.count()}')
+            AuditPlan.objects.create(project=self.project, created_by=author)
+            AuditIssue.objects.create(project=self.project, created_by=author)
+            AuditReport.objects.create(project=self.project, created_by=author)
+            AuditAssignment.objects.create(project=self.project, auditor=author)
+
+    def test_query_count_is_constant(self):
+        url = reverse('core:project_detail', args=[self.project.pk])
+        # session, user, project with its counters, one prefetch per related list
+        with self.assertNumQueries(7):
+            self.client.get(url)
+        self.add_rows(6)
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+
+        project = response.context['project']
+        self.assertEqual(project.stats.plan_count, 6)
+        self.assertEqual(project.stats.issue_count, 6)
+        self.assertEqual(project.stats.report_count, 6)
+        self.assertEqual(project.stats.assignment_count, 7)
+        self.assertTrue(response.context['is_assigned_auditor'])
+
+
+class ProjectCreationTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        auditors = Group.objects.create(name=AUDITORS)
+        self.auditors = []
+        for i in range(6):
+            user = User.objects.create_user(f'auditor{i}', password='x')
+            user.groups.add(auditors)
+            self.auditors.append(user)
+        self.department = Department.objects.create(name='Finance')
+        self.client.force_login(self.manager)
+        get_user_roles(self.manager)  # warm the role cache
+
+    def create(self, auditors):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('core:project_create'), {
+                'title': 'Payroll',
+                'department': self.department.pk,
+                'auditors': [a.pk for a in auditors],
+            })
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_independent_of_auditors(self):
+        response, one = self.create(self.auditors[:1])
+        self.assertEqual(response.status_code, 302)
+        _, many = self.create(self.auditors)
+        self.assertEqual(many, one)
+        self.assertEqual(AuditAssignment.objects.count(), 7)
+
+    def test_unknown_auditor_creates_nothing(self):
+        response = self.client.post(reverse('core:project_create'), {
+            'title': 'Payroll',
+            'department': self.department.pk,
+            'auditors': [self.auditors[0].pk, self.manager.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(AuditProject.objects.exists())
+        self.assertFalse(AuditAssignment.objects.exists())
+
+    def test_csv_import(self):
+        rows = parse_import(
+            'title,department,auditors\n'
+            'Payroll,Finance,auditor0;auditor1\n'
+            f'Stores,{self.department.pk},\n',
+            'csv',
+        )
+        with self.assertNumQueries(8):
+            self.assertEqual(import_projects(rows, self.manager), (2, 2))
+        self.assertEqual(
+            sorted(AuditAssignment.objects.values_list('project__title', 'auditor__username')),
+            [('Payroll', 'auditor0'), ('Payroll', 'auditor1')],
+        )
+        self.assertEqual(
+            sorted(ProjectStats.objects.values_list('project__title', 'assignment_count')),
+            [('Payroll', 2), ('Stores', 0)],
+        )
+
+    def test_bad_row_aborts_import(self):
+        rows = parse_import(json.dumps([
+            {'title': 'Payroll', 'department': 'Finance', 'auditors': ['auditor0']},
+            {'title': 'Stores', 'department': 'Nowhere'},
+        ]), 'json')
+        with self.assertRaises(ValidationError) as ctx:
+            import_projects(rows, self.manager)
+        self.assertIn("Row 2: unknown department 'Nowhere'.", ctx.exception.messages)
+        self.assertFalse(AuditProject.objects.exists())
+
+    def test_unreadable_files_are_reported(self):
+        upload = SimpleUploadedFile('projects.csv', 'title,department\nRévision paie,Finance\n'.encode('cp1252'))
+        response = self.client.post(reverse('core:project_import'), {'file': upload})
+        self.assertContains(response, 'projects.csv is not UTF-8 text', status_code=400)
+        self.assertFalse(AuditProject.objects.exists())
+
+        huge = 'title,department\nPayroll,Finance\n"' + 'x' * (csv.field_size_limit() + 1) + '",Finance\n'
+        with self.assertRaises(ValidationError) as ctx:
+            parse_import(huge, 'csv', 'big.csv')
+        self.assertTrue(ctx.exception.messages[0].startswith('big.csv, row 2: field larger than field limit'))
+
+    def test_wrongly_typed_json_values_are_reported(self):
+        rows = parse_import(json.dumps([
+            {'title': 42, 'department': 'Finance'},
+            {'title': ['Payroll'], 'department': 'Finance', 'auditors': [7]},
+            {'title': None, 'department': 'Finance', 'description': {}},
+        ]), 'json')
+        with self.assertRaises(ValidationError) as ctx:
+            import_projects(rows, self.manager)
+        self.assertEqual(ctx.exception.messages, [
+            'Row 1: title must be text.',
+            'Row 2: title must be text; auditors must be a list of usernames.',
+            'Row 3: description must be text.',
+        ])
+        self.assertFalse(AuditProject.objects.exists())
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump([{'title': 'Payroll', 'department': 'Finance', 'auditors': 'auditor0;auditor2'}], f)
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command('import_projects', f.name, created_by='manager', stdout=out)
+        self.assertIn('Imported 1 projects and 2 assignments', out.getvalue())
+
+
+class ProjectStatsTests(AuditTestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name='Finance')
+        self.project = AuditProject.objects.create(title='Payroll', department=self.department)
+
+    def stats(self):
+        return ProjectStats.objects.get(project=self.project)
+
+    def test_counters_follow_saves_and_deletes(self):
+        AuditPlan.objects.create(project=self.project, status='submitted')
+        issue = AuditIssue.objects.create(project=self.project)
+        AuditIssue.objects.create(project=self.project)
+        AuditReport.objects.create(project=self.project)
+        self.assertEqual(
+            (self.stats().plan_count, self.stats().pending_plan_count,
+             self.stats().issue_count, self.stats().pending_issue_count,
+             self.stats().report_count, self.stats().pending_report_count),
+            (1, 1, 2, 2, 1, 1),
+        )
+
+        issue = AuditIssue.objects.get(pk=issue.pk)
+        issue.status = 'approved'
+        issue.save()
+        stats = self.stats()
+        self.assertEqual((stats.issue_count, stats.pending_issue_count, stats.approved_issue_count), (2, 1, 1))
+
+        issue.delete()
+        stats = self.stats()
+        self.assertEqual((stats.issue_count, stats.pending_issue_count, stats.approved_issue_count), (1, 1, 0))
+
+    def test_saving_without_a_status_change_costs_no_update(self):
+        issue = AuditIssue.objects.create(project=self.project)
+        issue = AuditIssue.objects.get(pk=issue.pk)
+        issue.manager_notes = 'Looks fine'
+        with self.assertNumQueries(1):
+            issue.save()
+
+    def test_deleting_project_removes_counters(self):
+        AuditIssue.objects.create(project=self.project)
+        self.project.delete()
+        self.assertFalse(ProjectStats.objects.exists())
+
+    def test_recount_fixes_drift(self):
+        AuditPlan.objects.create(project=self.project)
+        AuditIssue.objects.create(project=self.project, status='approved')
+        ProjectStats.objects.filter(project=self.project).update(plan_count=7, approved_issue_count=0)
+        orphan = AuditProject.objects.create(title='Stores', department=self.department)
+        ProjectStats.objects.filter(project=orphan).delete()
+
+        out = StringIO()
+        call_command('recount_project_stats', stdout=out)
+        self.assertIn('Corrected counters for 2 of 2 projects', out.getvalue())
+        stats = self.stats()
+        self.assertEqual((stats.plan_count, stats.approved_issue_count), (1, 1))
+        self.assertTrue(ProjectStats.objects.filter(project=orphan).exists())
+
+
+class KeysetPaginationTests(AuditTestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name='Finance')
+        projects = [
+            AuditProject.objects.create(title=f'P{i}', department=self.department)
+            for i in range(5)
+        ]
+        # Ties on created_at must still be walked exactly once.
+        AuditProject.objects.filter(pk__in=[p.pk for p in projects[1:4]]).update(
+            created_at=projects[0].created_at
+        )
+
+    def test_walks_every_row_once(self):
+        expected = list(AuditProject.objects.order_by('-created_at', '-id'))
+        seen, cursor = [], None
+        while True:
+            page = keyset_paginate(AuditProject.objects.all(), cursor, per_page=2)
+            seen.extend(page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_bad_request(self):
+        manager = User.objects.create_user('manager', password='x')
+        manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.client.force_login(manager)
+        response = self.client.get(reverse('core:issues_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('core.views.LIST_PAGE_SIZE', 2)
+    def test_htmx_requests_get_rows_partial(self):
+        manager = User.objects.create_user('manager', password='x')
+        manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.client.force_login(manager)
+
+        first = self.client.get(reverse('core:projects_list'))
+        cursor = first.context['page'].next_cursor
+        self.assertTemplateUsed(first, 'core/projects/list.html')
+
+        second = self.client.get(
+            reverse('core:projects_list'), {'cursor': cursor}, HTTP_HX_REQUEST='true'
+        )
+        self.assertTemplateNotUsed(second, 'core/projects/list.html')
+        self.assertTemplateUsed(second, 'core/partials/project_rows.html')
+        self.assertEqual(len(second.context['projects']), 2)
+
+
+class ExplainQueriesCommandTests(AuditTestCase):
+    def test_view_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', '--fail-on-scan', stdout=out)
+        self.assertIn('0 of', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite profile only')
+class SqliteTuningTests(AuditTestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(AUDIT_SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -4000})
+    def test_pragmas_applied_to_new_connections(self):
+        from .signals import tune_sqlite
+        tune_sqlite(sender=type(connection), connection=connection)
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        self.assertEqual(self.pragma('cache_size'), -4000)
+
+    def test_loadtest_command_cleans_up(self):
+        out = StringIO()
+        call_command('db_loadtest', workers=1, duration=0.2, plans=3, json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual((results['errors'], results['conflicts']), ({}, 0))
+        self.assertGreater(results['read']['ops'] + results['write']['ops'], 0)
+        self.assertFalse(Department.objects.exists())
+
+
+class QueryBudgetMiddlewareTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.client.force_login(self.manager)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('core:projects_list'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    def test_budget_overrun_fails_in_strict_mode(self):
+        with override_settings(QUERY_BUDGETS={'core:projects_list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('core:projects_list'))
+
+    def test_budget_overrun_only_logs_otherwise(self):
+        with override_settings(QUERY_BUDGETS={'core:projects_list': 1}, QUERY_BUDGET_STRICT=False):
+            with self.assertLogs('core.metrics', 'WARNING') as logs:
+                response = self.client.get(reverse('core:projects_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('core:projects_list ran', logs.output[0])
+
+
+class ReviewConcurrencyTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'), status='plan_pending',
+        )
+        self.plan = AuditPlan.objects.create(project=self.project, status='submitted', description='x' * 5000)
+        self.client.force_login(self.manager)
+
+    def review(self, action, version, **headers):
+        return self.client.post(
+            reverse('core:plan_review', args=[self.plan.pk]),
+            {'action': action, 'manager_notes': action, 'version': version}, **headers,
+        )
+
+    def test_second_reviewer_gets_conflict(self):
+        self.assertEqual(self.review('approve', 0).status_code, 302)
+        response = self.review('reject', 0, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 409)
+
+        self.plan.refresh_from_db()
+        self.project.refresh_from_db()
+        self.assertEqual((self.plan.status, self.plan.version, self.plan.manager_notes), ('approved', 1, 'approve'))
+        self.assertEqual(self.project.status, 'audit_in_progress')
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.plan_count, stats.pending_plan_count), (1, 0))
+
+    def test_second_plan_reviewed_after_project_moved_on(self):
+        other = AuditPlan.objects.create(project=self.project, status='submitted')
+        self.assertEqual(self.review('approve', 0).status_code, 302)
+        response = self.client.post(
+            reverse('core:plan_review', args=[other.pk]), {'action': 'reject', 'version': 0},
+        )
+        self.assertEqual(response.status_code, 302)
+        other.refresh_from_db()
+        self.project.refresh_from_db()
+        self.assertEqual(other.status, 'rejected')
+        self.assertEqual(self.project.status, 'audit_in_progress')
+
+    def test_stale_review_redirects_to_the_detail_page(self):
+        head = User.objects.create_user('head', password='x')
+        head.groups.add(Group.objects.create(name=DEPARTMENT_MANAGERS))
+        self.project.department.manager = head
+        self.project.department.save()
+        auditor = User.objects.create_user('auditor', password='x')
+        auditor.groups.add(Group.objects.create(name=AUDITORS))
+        AuditAssignment.objects.create(project=self.project, auditor=auditor)
+
+        def report(status):
+            return AuditReport.objects.create(project=self.project, status=status)
+
+        issue = AuditIssue.objects.create(project=self.project)
+        cases = [
+            (self.manager, 'core:plan_review', self.plan, 'core:plan_detail'),
+            (self.manager, 'core:issue_review', issue, 'core:issue_detail'),
+            (self.manager, 'core:report_review', report('submitted'), 'core:report_detail'),
+            (head, 'core:department_report_review', report('sent_to_department'), 'core:report_detail'),
+            (auditor, 'core:auditor_final_review', report('dept_replied'), 'core:report_detail'),
+            (self.manager, 'core:final_manager_review', report('auditor_approved'), 'core:report_detail'),
+        ]
+        for user, view, obj, detail in cases:
+            with self.subTest(view):
+                self.client.force_login(user)
+                response = self.client.post(reverse(view, args=[obj.pk]), {'action': 'approve', 'version': 7})
+                self.assertRedirects(response, reverse(detail, args=[obj.pk]), fetch_redirect_response=False)
+                self.assertEqual(type(obj).objects.get(pk=obj.pk).version, 0)
+                self.assertIn('Someone else updated', str(list(get_messages(response.wsgi_request))[0]))
+
+    def test_stale_copy_cannot_overwrite(self):
+        first = AuditPlan.objects.get(pk=self.plan.pk)
+        second = AuditPlan.objects.get(pk=self.plan.pk)
+        transition(first, 'approved')
+        with self.assertRaises(TransitionConflict):
+            transition(second, 'rejected')
+        self.assertEqual(AuditPlan.objects.get(pk=self.plan.pk).status, 'approved')
+
+    def test_only_changed_columns_are_written(self):
+        with CaptureQueriesContext(connection) as ctx:
+            transition(self.plan, 'approved', manager_notes='ok')
+        update = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "core_auditplan"'))
+        self.assertIn('"manager_notes"', update)
+        self.assertNotIn('"description"', update)
+
+
+class WorkflowTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.finance = Department.objects.create(name='Finance')
+        self.reports = []
+        for i in range(3):
+            project = AuditProject.objects.create(
+                title=f'P{i}', department=self.finance, status='report_pending_manager',
+            )
+            self.reports.append(AuditReport.objects.create(project=project, status='approved_by_manager'))
+
+    def test_invalid_action_is_rejected_without_queries(self):
+        self.assertEqual(PROJECT_WORKFLOW.allowed('plan_pending', self.manager), ['approve_plan', 'reject_plan'])
+        report = self.reports[0]
+        report.status = 'submitted'
+        with self.assertNumQueries(0), self.assertRaises(InvalidTransition):
+            apply(report, 'send_to_department', user=self.manager)
+
+    def test_invalid_action_answers_400_not_conflict(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(
+            reverse('core:report_review', args=[self.reports[0].pk]), {'action': 'approve'}, HTTP_HX_REQUEST='true',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(response, 'not available', status_code=400)
+
+    def test_apply_moves_project_and_records_history(self):
+        report = AuditReport.objects.select_related('project').get(pk=self.reports[0].pk)
+        apply(report, 'send_to_department', user=self.manager)
+        report.project.refresh_from_db()
+        self.assertEqual(report.project.status, 'report_pending_department')
+        self.assertEqual(
+            list(WorkflowHistory.objects.order_by('id').values_list('kind', 'action', 'to_status')),
+            [('report', 'send_to_department', 'sent_to_department'),
+             ('project', 'send_report', 'report_pending_department')],
+        )
+
+    def test_bulk_send_approved_reports(self):
+        self.client.force_login(self.manager)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('core:reports_send_approved'), {'department': self.finance.pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(AuditReport.objects.filter(status='sent_to_department').count(), 3)
+        self.assertEqual(AuditProject.objects.filter(status='report_pending_department').count(), 3)
+        self.assertEqual(WorkflowHistory.objects.count(), 6)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "core_workflowhistory"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_bulk_apply_is_all_or_nothing(self):
+        def refuse(obj, tr, user):
+            if obj.pk == self.reports[2].pk:
+                raise InvalidTransition('refused')
+
+        hooks = {(AuditReport, 'send_to_department'): [refuse]}
+        with mock.patch.dict(workflow._hooks['after'], hooks), self.assertRaises(InvalidTransition):
+            bulk_apply(AuditReport.objects.all(), 'send_to_department', user=self.manager)
+        self.assertEqual(AuditReport.objects.filter(status='approved_by_manager').count(), 3)
+        self.assertFalse(AuditProject.objects.filter(status='report_pending_department').exists())
+        self.assertFalse(WorkflowHistory.objects.exists())
+
+    def test_bulk_send_skips_projects_already_moved_on(self):
+        project = self.reports[0].project
+        sent = AuditReport.objects.create(project=project, status='approved_by_manager')
+        second = AuditReport.objects.create(project=project, status='approved_by_manager')
+        apply(AuditReport.objects.select_related('project').get(pk=sent.pk), 'send_to_department', user=self.manager)
+
+        objs = bulk_apply(
+            AuditReport.objects.filter(project__department=self.finance), 'send_to_department', user=self.manager,
+        )
+        self.assertEqual(len(objs), 4)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'sent_to_department')
+        self.assertEqual(AuditProject.objects.filter(status='report_pending_department').count(), 3)
+        self.assertEqual(
+            WorkflowHistory.objects.filter(kind='project', object_id=project.pk).count(), 1,
+        )
+
+
+class FinalReportJobTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'),
+            status='final_review',
+        )
+        AuditPlan.objects.create(project=self.project, description='Sample payroll runs')
+        AuditIssue.objects.create(project=self.project, description='Duplicate payee', status='approved')
+        AuditIssue.objects.create(project=self.project, description='Draft note', status='rejected')
+        self.report = AuditReport.objects.create(
+            project=self.project, status='auditor_approved', department_notes='Fixed',
+        )
+        self.client.force_login(self.manager)
+
+    def approve(self, **headers):
+        return self.client.post(
+            reverse('core:final_manager_review', args=[self.report.pk]),
+            {'action': 'approve', 'final_notes': 'Closed'}, **headers,
+        )
+
+    def test_approval_queues_report_for_worker(self):
+        response = self.approve(HTTP_HX_REQUEST='true')
+        final_report = FinalReport.objects.get(project=self.project)
+        self.assertEqual(final_report.status, 'pending')
+        self.assertContains(response, 'hx-trigger="every 2s"')
+        self.assertEqual(Job.objects.get().status, 'queued')
+
+        call_command('run_jobs', '--burst', stdout=StringIO())
+
+        final_report.refresh_from_db()
+        self.assertEqual(final_report.status, 'ready')
+        self.assertIn('- Duplicate payee', final_report.content)
+        self.assertNotIn('Draft note', final_report.content)
+        self.assertIn('Audit Plan: Sample payroll runs', final_report.content)
+        self.assertIn('Final Manager Notes: Closed', final_report.content)
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    @override_settings(AUDIT_JOBS_EAGER=True)
+    def test_eager_mode_builds_inline(self):
+        self.approve()
+        self.assertEqual(FinalReport.objects.get(project=self.project).status, 'ready')
+
+    def test_report_is_assembled_outside_a_transaction(self):
+        self.approve()
+        outer = len(connection.atomic_blocks)
+        depths = []
+
+        def content(report):
+            depths.append(len(connection.atomic_blocks) - outer)
+            return 'Assembled'
+
+        with mock.patch('core.tasks.final_report_content', content):
+            call_command('run_jobs', '--burst', stdout=StringIO())
+        self.assertEqual(depths, [0])
+        final_report = FinalReport.objects.get(project=self.project)
+        self.assertEqual((final_report.status, final_report.content), ('ready', 'Assembled'))
+
+    @contextlib.contextmanager
+    def failing_build(self):
+        handler = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict(jobs._handlers, {'build_final_report': handler}), self.assertLogs('core.jobs', 'ERROR'):
+            yield
+
+    def test_failed_job_backs_off_then_fails(self):
+        self.approve()
+        final_report = FinalReport.objects.get(project=self.project)
+        with self.failing_build():
+            call_command('run_jobs', '--burst', stdout=StringIO())
+            job = Job.objects.get()
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+            self.assertGreater(job.run_after, timezone.now())
+            # Not claimed again before its backoff has passed.
+            self.assertIsNone(jobs.claim_next())
+
+            for attempt in range(2, jobs.MAX_ATTEMPTS + 1):
+                Job.objects.update(run_after=timezone.now())
+                call_command('run_jobs', '--burst', stdout=StringIO())
+        job.refresh_from_db()
+        final_report.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', jobs.MAX_ATTEMPTS))
+        self.assertIn('boom', job.error)
+        self.assertEqual(final_report.status, 'failed')
+
+    @override_settings(AUDIT_JOBS_EAGER=True)
+    def test_eager_failure_is_recorded(self):
+        with self.failing_build():
+            self.approve()
+        self.assertEqual(Job.objects.get().status, 'failed')
+        self.assertEqual(FinalReport.objects.get(project=self.project).status, 'failed')
+
+    def test_stale_sweep_follows_the_heartbeat(self):
+        self.approve()
+        job = jobs.claim_next()
+        long_ago = timezone.now() - timezone.timedelta(hours=1)
+        Job.objects.filter(pk=job.pk).update(started_at=long_ago)
+        self.assertEqual(jobs.requeue_stale(600), (0, 0))
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        self.assertEqual(jobs.requeue_stale(600), (1, 0))
+        job = jobs.claim_next()
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=long_ago, attempts=jobs.MAX_ATTEMPTS)
+        self.assertEqual(jobs.requeue_stale(600), (0, 1))
+        self.assertEqual(FinalReport.objects.get(project=self.project).status, 'failed')
+
+    def test_status_needs_access_to_the_project(self):
+        self.approve()
+        url = reverse('core:final_report_status', args=[FinalReport.objects.get().pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user('outsider', password='x'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ReportPdfTests(AuditTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        override = override_settings(AUDIT_PDF_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('manager', password='x')
+        self.user.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'),
+        )
+        self.issue = AuditIssue.objects.create(project=self.project, description='Duplicate payee')
+        self.report = AuditReport.objects.create(project=self.project, description='Findings')
+        self.url = reverse('core:report_pdf', args=[self.report.pk])
+        self.client.force_login(self.user)
+
+    def test_digest_tracks_report_content(self):
+        digest = content_digest('report', self.report)
+        self.assertEqual(content_digest('report', self.report), digest)
+
+        self.issue.status = 'approved'
+        self.issue.save()
+        self.assertNotEqual(content_digest('report', self.report), digest)
+
+    def test_missing_pdf_is_queued_once(self):
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.assertEqual(Job.objects.filter(kind='render_pdf').count(), 1)
+
+    def test_poll_does_not_recompute_the_digest(self):
+        digest = content_digest('report', self.report)
+        response = self.client.get(self.url, HTTP_HX_REQUEST='true')
+        self.assertContains(response, f'?digest={digest}', status_code=202)
+
+        with mock.patch('core.views.content_digest') as recompute:
+            response = self.client.get(self.url, {'digest': digest}, HTTP_HX_REQUEST='true')
+            self.assertEqual(response.status_code, 202)
+            # Only a digest with a render of this report in the queue is trusted.
+            recompute.return_value = digest
+            self.client.get(self.url, {'digest': '0' * 64}, HTTP_HX_REQUEST='true')
+            Job.objects.update(status='done')
+            self.client.get(self.url, {'digest': digest}, HTTP_HX_REQUEST='true')
+        self.assertEqual(recompute.call_count, 2)
+
+    def test_cached_pdf_served_with_ranges(self):
+        path = cache_path(content_digest('report', self.report))
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.7 0123456789')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 0123456789')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=9-12')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 9-12/19')
+        self.assertEqual(b''.join(response.streaming_content), b'0123')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=50-').status_code, 416)
+        self.assertFalse(Job.objects.exists())
+
+    @skipUnless(weasyprint_available(), 'WeasyPrint (with Pango) is not installed')
+    @override_settings(AUDIT_JOBS_EAGER=True)
+    def test_render_pdf(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class ChunkedUploadTests(AuditTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(
+            MEDIA_ROOT=self.media, AUDIT_UPLOAD_TEMP_DIR=os.path.join(self.media, 'partial'),
+            AUDIT_UPLOAD_CHUNK_SIZE=8, AUDIT_UPLOAD_MAX_SIZE=64,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'),
+        )
+        AuditAssignment.objects.create(project=self.project, auditor=self.auditor)
+        self.client.force_login(self.auditor)
+        self.data = b'evidence-scan-0123456789'
+
+    def start(self, size=None):
+        response = self.client.post(
+            reverse('core:upload_start'), {'filename': 'scan.pdf', 'size': len(self.data) if size is None else size},
+        )
+        return response.status_code, response.json()
+
+    def put(self, url, start, end, body=None):
+        return self.client.put(
+            url, self.data[start:end] if body is None else body, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.data)}',
+        )
+
+    def test_resumed_upload_is_hashed_and_attached(self):
+        status, state = self.start()
+        self.assertEqual((status, state['offset']), (201, 0))
+        self.assertEqual(self.put(state['url'], 0, 8).json()['offset'], 8)
+
+        # The connection drops halfway through the next chunk.
+        self.assertEqual(self.put(state['url'], 8, 16, body=self.data[8:12]).json()['offset'], 12)
+        # A chunk from the wrong offset is refused with the offset to resume from.
+        response = self.put(state['url'], 8, 16)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 12))
+
+        # The next chunk lands in another process, which rehashes the partial file.
+        uploads._hashers.clear()
+        self.assertEqual(self.client.get(state['url']).json()['offset'], 12)
+        self.put(state['url'], 12, 20)
+        state = self.put(state['url'], 20, 24).json()
+        self.assertEqual(state['status'], 'complete')
+        self.assertEqual(state['sha256'], hashlib.sha256(self.data).hexdigest())
+
+        self.client.post(
+            reverse('core:plan_create', args=[self.project.pk]),
+            {'description': 'Sampling', 'attachment_upload': state['token']},
+        )
+        plan = AuditPlan.objects.get()
+        self.assertTrue(plan.attachment.name.startswith('audit/plans/scan'))
+        with plan.attachment.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(UploadSession.objects.get().status, 'attached')
+        self.assertEqual(os.listdir(os.path.join(self.media, 'partial')), [])
+
+    def test_abandoned_uploads_release_their_hashers(self):
+        uploads._hashers.clear()
+        _, first = self.start()
+        _, second = self.start()
+        self.put(first['url'], 0, 8)
+        self.put(second['url'], 0, 8)
+        self.assertEqual(len(uploads._hashers), 2)
+
+        # Idle hashers are dropped when another upload moves on...
+        with mock.patch('core.uploads.time.monotonic', return_value=time.monotonic() + uploads.HASHER_IDLE + 1):
+            self.put(second['url'], 8, 16)
+        self.assertEqual(list(uploads._hashers), [UploadSession.objects.get(token=second['token']).pk])
+
+        # ...and purged sessions take theirs with them.
+        self.assertEqual(uploads.purge_stale(timezone.now() + timezone.timedelta(seconds=1)), 2)
+        self.assertEqual(uploads._hashers, {})
+
+    def test_limits(self):
+        self.assertEqual(self.start(size=65)[0], 413)
+        _, state = self.start()
+        self.assertEqual(self.put(state['url'], 0, 16).status_code, 413)
+
+        # Another auditor can neither resume nor attach someone else's upload.
+        other = User.objects.create_user('other', password='x')
+        other.groups.add(Group.objects.get(name=AUDITORS))
+        AuditAssignment.objects.create(project=self.project, auditor=other)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(state['url']).status_code, 404)
+        response = self.client.post(
+            reverse('core:plan_create', args=[self.project.pk]),
+            {'description': 'x', 'attachment_upload': state['token']},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AuditPlan.objects.exists())
+
+
+class AttachmentStorageTests(AuditTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'),
+        )
+
+    def issue_with(self, content, name='scan.pdf'):
+        issue = AuditIssue.objects.create(project=self.project)
+        store_attachment(issue, SimpleUploadedFile(name, content))
+        return issue
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.issue_with(b'same evidence')
+        second = self.issue_with(b'same evidence')
+        self.issue_with(b'other evidence')
+
+        self.assertNotEqual(first.attachment.name, second.attachment.name)
+        blob = Blob.objects.get(sha256=hashlib.sha256(b'same evidence').hexdigest())
+        self.assertEqual((blob.refcount, Blob.objects.count()), (2, 2))
+        self.assertEqual(
+            os.stat(first.attachment.path).st_ino, os.stat(second.attachment.path).st_ino,
+        )
+        with second.attachment.open('rb') as f:
+            self.assertEqual(f.read(), b'same evidence')
+
+    def test_replaced_and_deleted_attachments_are_collected(self):
+        issue = self.issue_with(b'draft')
+        old_path = issue.attachment.path
+        with self.captureOnCommitCallbacks(execute=True):
+            store_attachment(issue, SimpleUploadedFile('scan.pdf', b'final'))
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(Blob.objects.get(sha256=hashlib.sha256(b'draft').hexdigest()).refcount, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.issue_with(b'final').delete()
+        call_command('gc_attachments', stdout=StringIO())
+        self.assertEqual(list(Blob.objects.values_list('refcount', flat=True)), [1])
+        blobs = [name for _, _, names in os.walk(os.path.join(self.media, 'blobs')) for name in names]
+        self.assertEqual(blobs, [hashlib.sha256(b'final').hexdigest()])
+
+
+    def test_rolled_back_attachments_leave_no_files(self):
+        issue = AuditIssue.objects.create(project=self.project)
+        with self.assertRaises(TransitionConflict):
+            with atomic_with_attachments():
+                with atomic_with_attachments():
+                    store_attachment(issue, SimpleUploadedFile('scan.pdf', b'evidence'))
+                path = AuditIssue.objects.get(pk=issue.pk).attachment.path
+                self.assertTrue(os.path.exists(path))
+                raise TransitionConflict
+
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(AuditIssue.objects.get(pk=issue.pk).attachment)
+        self.assertFalse(Blob.objects.exists())
+        files = [name for _, _, names in os.walk(self.media) for name in names]
+        self.assertEqual(files, [])
+
+
+class AttachmentDownloadTests(AuditTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.department_manager = User.objects.create_user('head', password='x')
+        self.department_manager.groups.add(Group.objects.create(name=DEPARTMENT_MANAGERS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance', manager=self.department_manager),
+        )
+        self.issue = AuditIssue.objects.create(project=self.project)
+        store_attachment(self.issue, SimpleUploadedFile('scan.pdf', b'%PDF-1.7 evidence'))
+        self.url = reverse('core:attachment_download', args=['issue', self.issue.pk])
+
+    def test_only_project_members_can_download(self):
+        self.client.force_login(self.auditor)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        AuditAssignment.objects.create(project=self.project, auditor=self.auditor)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 evidence')
+
+        self.client.force_login(self.department_manager)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_conditional_and_ranged_requests(self):
+        self.client.force_login(self.department_manager)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=9-', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'evidence')
+        # A partial copy of another version gets the whole file.
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=9-', HTTP_IF_RANGE='"old"').status_code, 200)
+
+    @override_settings(AUDIT_SENDFILE='nginx', AUDIT_SENDFILE_PREFIX='/protected-media/')
+    def test_nginx_handoff(self):
+        self.client.force_login(self.department_manager)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.issue.attachment.name}')
+        self.assertEqual(response.content, b'')
+
+
+class SearchTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        finance = Department.objects.create(name='Finance')
+        self.payroll = AuditProject.objects.create(title='Payroll controls', department=finance)
+        self.stores = AuditProject.objects.create(title='Stores', department=finance)
+        AuditAssignment.objects.create(project=self.payroll, auditor=self.auditor)
+        self.issue = AuditIssue.objects.create(project=self.payroll, description='Duplicate payee <b>bank</b> accounts')
+        AuditIssue.objects.create(project=self.stores, description='Duplicate stock counts')
+
+    def titles(self, user, query, **kwargs):
+        return [(hit.kind, hit.object_id) for hit in search(user, query, **kwargs).hits]
+
+    def test_index_follows_saves_transitions_and_deletes(self):
+        self.assertEqual(self.titles(self.manager, 'payro'), [('project', self.payroll.pk)])
+        report = AuditReport.objects.create(project=self.payroll)
+        self.assertEqual(self.titles(self.manager, 'reconciled'), [])
+
+        transition(report, 'approved_by_manager', manager_notes='Reconciled with the ledger')
+        self.assertEqual(self.titles(self.manager, 'reconciled ledger'), [('report', report.pk)])
+
+        self.issue.delete()
+        self.assertEqual(self.titles(self.manager, 'payee'), [])
+        self.stores.delete()
+        self.assertEqual(SearchDocument.objects.filter(project_id=self.stores.pk).count(), 0)
+
+    def test_results_are_ranked_and_role_scoped(self):
+        self.assertEqual(len(self.titles(self.manager, 'duplicate')), 2)
+        self.assertEqual(self.titles(self.auditor, 'duplicate'), [('issue', self.issue.pk)])
+        self.assertEqual(self.titles(self.auditor, 'duplicate', kind='project'), [])
+        self.assertEqual(self.titles(User.objects.create_user('nobody'), 'duplicate'), [])
+        # Query syntax is stripped rather than passed to the index.
+        self.assertEqual(len(self.titles(self.manager, '"duplicate* (')), 2)
+        # Title matches outrank body matches.
+        issue = AuditIssue.objects.create(project=self.stores, description='Payroll paid from the stores account')
+        self.assertEqual(self.titles(self.manager, 'payroll'), [('project', self.payroll.pk), ('issue', issue.pk)])
+
+        self.client.force_login(self.auditor)
+        response = self.client.get(reverse('core:search'), {'q': 'bank'}, HTTP_HX_REQUEST='true')
+        self.assertContains(response, '<mark>bank</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+        self.assertTemplateUsed(response, 'core/partials/search_results.html')
+
+
+class AdminChangelistTests(AuditTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='x')
+        self.department = Department.objects.create(name='Finance')
+
+    def add_plans(self, n):
+        for i in range(n):
+            project = AuditProject.objects.create(title=f'P{i}', department=self.department)
+            AuditPlan.objects.create(project=project, created_by=self.admin)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:core_auditplan_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        self.add_plans(2)
+        self.changelist_queries()  # warm the role cache
+        baseline = self.changelist_queries()
+        self.add_plans(10)
+        self.assertEqual(self.changelist_queries(), baseline)
+
+    def test_str_never_queries(self):
+        self.add_plans(1)
+        plan = AuditPlan.objects.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(str(plan), f'Plan for #{plan.project_id}')
+        self.assertEqual(str(AuditPlan.objects.select_related('project').get()), 'Plan for P0')
+
+    @override_settings(AUDIT_ESTIMATE_THRESHOLD=3)
+    def test_large_unfiltered_lists_use_estimated_count(self):
+        self.add_plans(4)
+        AuditPlan.objects.filter(pk=AuditPlan.objects.order_by('pk').first().pk).delete()
+        # The highest rowid still counts the deleted row.
+        self.assertEqual(EstimatedCountPaginator(AuditPlan.objects.order_by('pk'), 25).count, 4)
+        self.assertEqual(EstimatedCountPaginator(AuditPlan.objects.filter(status='draft').order_by('pk'), 25).count, 3)
+        with override_settings(AUDIT_ESTIMATE_THRESHOLD=10):
+            self.assertEqual(EstimatedCountPaginator(AuditPlan.objects.order_by('pk'), 25).count, 3)
+
+
+class ExportTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.finance = Department.objects.create(name='Finance')
+        self.payroll = AuditProject.objects.create(title='Payroll', department=self.finance)
+        stores = AuditProject.objects.create(title='Stores', department=Department.objects.create(name='Stores'))
+        AuditAssignment.objects.create(project=self.payroll, auditor=self.auditor)
+        self.issue = AuditIssue.objects.create(project=self.payroll, description='Ghost, "employees"\non payroll')
+        AuditIssue.objects.create(project=stores, description='Stock count gap', status='approved')
+
+    def export(self, kind, **params):
+        response = self.client.get(reverse('core:export', args=[kind]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def csv_rows(self, kind, **params):
+        return list(csv.reader(StringIO(self.export(kind, **params).decode())))
+
+    def test_csv_is_role_scoped_and_filtered(self):
+        self.client.force_login(self.auditor)
+        rows = self.csv_rows('issues')
+        self.assertEqual(rows[0][:3], ['id', 'project_id', 'project'])
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.issue.pk)])
+        self.assertEqual(rows[1][8], 'Ghost, "employees"\non payroll')
+
+        self.client.force_login(self.manager)
+        self.assertEqual(len(self.csv_rows('issues')), 3)
+        self.assertEqual(len(self.csv_rows('issues', status='approved')), 2)
+        self.assertEqual(len(self.csv_rows('issues', department=self.finance.pk)), 2)
+        self.assertEqual(len(self.csv_rows('issues', until='2000-01-01')), 1)
+        self.assertEqual(len(self.csv_rows('projects', since=str(timezone.localdate()))), 3)
+
+        response = self.client.get(reverse('core:export', args=['issues']), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('core:export', args=['users'])).status_code, 404)
+
+    def test_xlsx_is_valid_and_streamed(self):
+        for i in range(50):
+            AuditIssue.objects.create(project=self.payroll, description=f'Finding {i} <&>')
+        self.client.force_login(self.manager)
+        with zipfile.ZipFile(BytesIO(self.export('issues', format='xlsx'))) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 53)
+        self.assertIn('Finding 49 &lt;&amp;&gt;', sheet)
+        self.assertIn('<c s="1">', sheet)
+
+        # The zip is yielded as rows arrive, not assembled at the end.
+        consumed = []
+        def rows():
+            for i in range(2000):
+                consumed.append(i)
+                yield (i, os.urandom(64).hex())
+        stream = exports.xlsx_stream(rows())
+        next(stream)
+        self.assertLess(len(consumed), 2000)
+        self.assertGreater(sum(1 for _ in stream), 1)
+
+    def test_command_writes_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'reports.xlsx')
+        AuditReport.objects.create(project=self.payroll, description='Q3')
+        err = StringIO()
+        call_command('export_data', 'reports', '--format', 'xlsx', '--output', path, stderr=err)
+        self.assertIn('✓', err.getvalue())
+        with zipfile.ZipFile(path) as workbook:
+            self.assertIn('Q3', workbook.read('xl/worksheets/sheet1.xml').decode())
+
+        out = StringIO()
+        call_command('export_data', 'projects', '--user', 'auditor', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1].split(',')[1], 'Payroll')
+
+    def test_formulas_are_exported_as_text(self):
+        AuditIssue.objects.create(project=self.payroll, description='=HYPERLINK("http://x", "open")')
+        AuditIssue.objects.create(project=self.payroll, description='-2+3')
+        self.client.force_login(self.manager)
+
+        descriptions = [row[8] for row in self.csv_rows('issues')[-2:]]
+        self.assertEqual(descriptions, ['\'=HYPERLINK("http://x", "open")', "'-2+3"])
+        with zipfile.ZipFile(BytesIO(self.export('issues', format='xlsx'))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        # Excel never evaluates inline strings, so they are kept verbatim.
+        self.assertIn('<t xml:space="preserve">=HYPERLINK(', sheet)
+        self.assertIn('>-2+3<', sheet)
+        self.assertNotIn(">'", sheet)
+
+
+class EventTests(AuditTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x')
+        self.manager.groups.add(Group.objects.create(name=AUDIT_MANAGERS))
+        self.auditor = User.objects.create_user('auditor', password='x')
+        self.auditor.groups.add(Group.objects.create(name=AUDITORS))
+        self.other = User.objects.create_user('other', password='x')
+        self.other.groups.add(Group.objects.get(name=AUDITORS))
+        self.project = AuditProject.objects.create(
+            title='Payroll', department=Department.objects.create(name='Finance'), status='plan_pending',
+        )
+        self.plan = AuditPlan.objects.create(project=self.project, created_by=self.auditor, status='submitted')
+
+    def approve_plan(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(AuditPlan.objects.get(pk=self.plan.pk), 'approved')
+
+    async def test_review_reaches_the_author_and_managers_only(self):
+        streams = {}
+        for user in (self.manager, self.auditor, self.other):
+            topics = await sync_to_async(events.user_topics)(user)
+            streams[user.username] = events.stream(topics)
+            self.assertEqual(await anext(streams[user.username]), b'retry: 5000\n\n')
+
+        await sync_to_async(self.approve_plan)()
+        for name in ('manager', 'auditor'):
+            frame = await asyncio.wait_for(anext(streams[name]), 1)
+            self.assertTrue(frame.startswith(b'event: plan\n'))
+            self.assertEqual(json.loads(frame.split(b'data: ')[1]), {
+                'id': self.plan.pk, 'project': self.project.pk, 'status': 'approved',
+            })
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(anext(streams['other']), 0.2)
+        for stream in streams.values():
+            await stream.aclose()
+        self.assertFalse(events.backend()._subscriptions)
+
+    def test_event_refetch_renders_only_the_target_fragment(self):
+        self.client.force_login(self.manager)
+        url = reverse('core:manager_dashboard')
+        page = self.client.get(url)
+        self.assertContains(page, 'id="pending-items"')
+        self.assertContains(page, 'Quick Actions')
+
+        response = self.client.get(url, HTTP_HX_REQUEST='true', HTTP_HX_TARGET='pending-items')
+        self.assertContains(response, 'id="pending-items"')
+        self.assertNotContains(response, 'id="recent-projects"')
+        self.assertNotContains(response, 'Quick Actions')
+
+    async def test_stream_served_over_asgi_only(self):
+        await self.async_client.aforce_login(self.auditor)
+        response = await self.async_client.get(reverse('core:events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b'retry: 5000\n\n')
+        await sync_to_async(self.approve_plan)()
+        self.assertTrue((await asyncio.wait_for(anext(content), 1)).startswith(b'event: plan\n'))
+        await content.aclose()
+
+        await sync_to_async(self.client.force_login)(self.auditor)
+        response = await sync_to_async(self.client.get)(reverse('core:events'))
+        self.assertEqual(response.status_code, 204)
+
+
+class BenchmarkTests(AuditTestCase):
+    def test_generated_projects_are_consistent_with_their_stage(self):
+        dataset = seeding.generate(departments=2, projects=60, auditors=4, seed=7, prefix='t', batch_size=25)
+        self.assertEqual(len(dataset.project_ids), 60)
+        self.assertEqual(Department.objects.filter(manager_id__in=dataset.head_ids).count(), 2)
+        for project in AuditProject.objects.prefetch_related('plans', 'issues', 'reports', 'assignments'):
+            self.assertTrue(project.assignments.all())
+            if project.status == 'created':
+                self.assertFalse(project.plans.all())
+            if project.status in seeding.STAGE_REPORTS:
+                self.assertIn(project.reports.get().status, seeding.STAGE_REPORTS[project.status])
+                self.assertTrue(any(issue.status == 'approved' for issue in project.issues.all()))
+        self.assertEqual(
+            FinalReport.objects.count(), AuditProject.objects.filter(status='finalized').count(),
+        )
+        # bulk_create skips the signals, so the counters are rebuilt per batch.
+        stats = ProjectStats.objects.get(project_id=dataset.project_ids[-1])
+        self.assertEqual(stats.issue_count, AuditIssue.objects.filter(project_id=dataset.project_ids[-1]).count())
+
+        seeding.remove('t')
+        self.assertFalse(AuditProject.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='t-').exists())
+
+    def test_seed_scale_is_reproducible_and_reports_throughput(self):
+        out = StringIO()
+        call_command('seed_scale', '--projects', '25', '--auditors', '5', '--departments', '2',
+                     '--managers', '1', '--batch-size', '10', '--seed', '3', stdout=out)
+        self.assertIn('25/25 projects', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='scale-').count(), 8)
+        self.assertEqual(User.objects.get(username='scale-auditor-0').password,
+                         User.objects.get(username='scale-auditor-4').password)
+        with self.assertRaises(CommandError):
+            call_command('seed_scale', '--projects', '1', stdout=StringIO())
+
+        # A batch comes out the same whichever process creates it, and in any order.
+        titles = list(AuditProject.objects.order_by('pk').values_list('title', flat=True)[20:25])
+        seeding.remove('scale')
+        dataset = seeding.create_people(departments=2, auditors=5, managers=1, prefix='scale',
+                                        password='x', batch_size=10)
+        seeding.create_batch(dataset, 20, 5, 3, 10)
+        self.assertEqual(list(AuditProject.objects.order_by('pk').values_list('title', flat=True)), titles)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_run_drives_lifecycles_and_compare_flags_regressions(self):
+        dataset = seeding.generate(departments=1, projects=5, auditors=1, managers=1, prefix='bench')
+        results = benchmark.run(dataset, workers=1, lifecycles=1, warmup=0, tag='bench')
+        self.assertEqual(results['lifecycles'], {'completed': 1, 'failed': 0})
+        review = results['views']['POST core:final_manager_review']
+        self.assertEqual(review['requests'], 1)
+        self.assertGreater(review['queries_max'], 0)
+
+        slower = json.loads(json.dumps(results))
+        slower['views']['GET core:projects_list']['p95_ms'] += 100
+        slower['views']['GET core:search']['queries_max'] += 1
+        regressions = benchmark.compare(results, slower)
+        self.assertEqual(
+            {(r.view, r.metric) for r in regressions},
+            {('GET core:projects_list', 'p95_ms'), ('GET core:search', 'queries_max')},
+        )
+        self.assertEqual(benchmark.compare(results, results), [])
+
+        benchmark.cleanup(dataset)
+        self.assertFalse(AuditProject.objects.exists())
+        self.assertFalse(Job.objects.exists())
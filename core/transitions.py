@@ -0,0 +1,122 @@
+"""
+Optimistic concurrency for workflow status changes.
+
+A review used to load a row, change ``status`` in Python and ``save()`` the
+whole row back, so two managers acting at once silently overwrote each
+other. :func:`transition` instead issues one conditional UPDATE that only
+matches if the row still has the status and version the reviewer saw, and
+writes just the status, the version and the fields the review changed.
+
+``QuerySet.update()`` does not send ``post_save``, so every transition sends
+``core.signals.status_changed`` for the counter, cache and history code
+that follows status changes.
+
+Attachments are stored while the review's transaction is still open. Run
+the review in :func:`atomic_with_attachments` so that the files it wrote
+are removed again if the transaction rolls back.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.core.exceptions import BadRequest
+from django.db import transaction
+from django.db.models import F
+
+from .models import UploadSession
+from .signals import status_changed
+from .uploads import attach_upload
+
+
+_written = threading.local()
+
+
+class TransitionConflict(Exception):
+    """The row's status or version changed after it was loaded."""
+
+
+def posted_version(request):
+    """The ``version`` the submitted form was rendered with, if it sent one."""
+    value = request.POST.get('version')
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest('Invalid version.')
+
+
+def transition(obj, status, *, version=None, **fields):
+    """
+    Move ``obj`` to ``status`` and write ``fields``, or raise
+    ``TransitionConflict`` without writing anything.
+
+    The UPDATE is conditional on the status ``obj`` was loaded with and on
+    ``version`` (by default the version ``obj`` was loaded with; pass the
+    one from the submitted form to also catch changes made while the form
+    was open). On success ``obj`` is updated in place.
+    """
+    model = type(obj)
+    expected_version = obj.version if version is None else version
+    updated = model.objects.filter(
+        pk=obj.pk, status=obj.status, version=expected_version,
+    ).update(status=status, version=F('version') + 1, **fields)
+    if not updated:
+        raise TransitionConflict(f'{model.__name__} #{obj.pk} was changed by someone else.')
+
+    old_status = obj.status
+    obj.status = status
+    obj.version = expected_version + 1
+    for name, value in fields.items():
+        setattr(obj, name, value)
+    status_changed.send(
+        sender=model, instance=obj, old_status=old_status, new_status=status, fields=tuple(fields),
+    )
+
+
+@contextmanager
+def atomic_with_attachments():
+    """
+    ``transaction.atomic()`` that deletes the attachments stored inside it
+    when it rolls back. A nested block hands its files on to the enclosing
+    one, which may still roll back after the inner block succeeded.
+    """
+    stack = _written.__dict__.setdefault('stack', [])
+    written = []
+    stack.append(written)
+    try:
+        with transaction.atomic():
+            yield
+    except BaseException:
+        for storage, name in written:
+            getattr(storage, 'discard', storage.delete)(name)
+        raise
+    else:
+        if len(stack) > 1:
+            stack[-2].extend(written)
+    finally:
+        stack.pop()
+
+
+def store_attachment(obj, upload, field='attachment'):
+    """
+    Save ``upload`` (an uploaded file or a finished ``UploadSession``) to
+    ``obj``'s file field, writing only that column. Called outside
+    :func:`atomic_with_attachments`, it runs in a block of its own.
+    """
+    if not getattr(_written, 'stack', None):
+        with atomic_with_attachments():
+            return store_attachment(obj, upload, field)
+
+    file = getattr(obj, field)
+    replaced = file.name
+    if isinstance(upload, UploadSession):
+        attach_upload(obj, upload, field)
+    else:
+        file.save(upload.name, upload, save=False)
+    stored = getattr(obj, field)
+    _written.stack[-1].append((stored.storage, stored.name))
+    if not isinstance(upload, UploadSession):
+        type(obj).objects.filter(pk=obj.pk).update(**{field: stored.name})
+    if replaced:
+        # Release the old file only once the new name is committed.
+        transaction.on_commit(lambda: file.storage.delete(replaced))
@@ -0,0 +1,233 @@
+"""
+Chunked, resumable attachment uploads.
+
+Large evidence files used to arrive in one multipart POST: Django spooled
+the whole file to a temp file (or memory), and a dropped connection meant
+starting again. Instead the browser opens an :class:`UploadSession` and
+PUTs the file in ``Content-Range`` chunks. Each chunk is streamed straight
+onto a ``.part`` file while the SHA-256 is updated, so the digest is ready
+the moment the last byte lands. After an interruption the client asks for
+the current offset and carries on from there.
+
+A finished upload is attached to a plan, issue or report by moving the
+partial file into the attachment storage (see core/storage.py, which reuses
+the digest computed here), so the file is never copied or read again. The partial directory must therefore be on the
+same filesystem as ``MEDIA_ROOT``.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import BadRequest, ValidationError
+
+from .models import UploadSession
+from .storage import ContentAddressedStorage
+
+
+MAX_SIZE = 2 * 1024 ** 3
+CHUNK_SIZE = 8 * 1024 ** 2
+READ_BLOCK = 64 * 1024
+# Seconds a kept hasher may go unused before it is dropped.
+HASHER_IDLE = 15 * 60
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """The chunk or upload was refused; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_size():
+    return getattr(settings, 'AUDIT_UPLOAD_MAX_SIZE', MAX_SIZE)
+
+
+def chunk_size():
+    return getattr(settings, 'AUDIT_UPLOAD_CHUNK_SIZE', CHUNK_SIZE)
+
+
+def partial_dir():
+    return getattr(settings, 'AUDIT_UPLOAD_TEMP_DIR', os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial'))
+
+
+def partial_path(session):
+    return os.path.join(partial_dir(), f'{session.token.hex}.part')
+
+
+def start_upload(owner, filename, size):
+    """Open an upload session for a file of ``size`` bytes."""
+    filename = os.path.basename(filename or '').strip()
+    if not filename:
+        raise UploadError('A file name is required.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('Invalid file size.')
+    if size < 0:
+        raise UploadError('Invalid file size.')
+    if size > max_size():
+        raise UploadError(f'Files may be at most {max_size()} bytes.', status=413)
+
+    session = UploadSession.objects.create(owner=owner, filename=filename[:255], size=size)
+    os.makedirs(partial_dir(), exist_ok=True)
+    open(partial_path(session), 'wb').close()
+    if size == 0:
+        UploadSession.objects.filter(pk=session.pk).update(
+            status='complete', sha256=hashlib.sha256().hexdigest(),
+        )
+        session.refresh_from_db()
+    return session
+
+
+def parse_content_range(header, size):
+    """``(start, end)`` of a ``bytes start-end/size`` header, end exclusive."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('A "Content-Range: bytes start-end/size" header is required.')
+    start, last, total = map(int, match.groups())
+    if total != size or last < start or last >= size:
+        raise UploadError(f'Content range {header!r} does not fit a {size} byte upload.', status=416)
+    return start, last + 1
+
+
+# ---- Streaming digest ----
+# The SHA-256 state cannot be stored in the database, so each process keeps
+# the hasher of the sessions it is receiving. When a chunk lands in a
+# different process (or after a restart) the digest of the bytes already on
+# disk is rebuilt once, and the upload carries on from there. The same
+# rebuild covers hashers dropped for being idle, so an abandoned upload only
+# holds its entry for ``HASHER_IDLE`` seconds.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _keep_hasher(session, hasher):
+    now = time.monotonic()
+    with _hashers_lock:
+        for pk in [pk for pk, (_, _, used) in _hashers.items() if now - used > HASHER_IDLE]:
+            del _hashers[pk]
+        _hashers[session.pk] = (session.received, hasher, now)
+
+
+def _drop_hashers(pks):
+    with _hashers_lock:
+        for pk in pks:
+            _hashers.pop(pk, None)
+
+
+def _hasher(session):
+    with _hashers_lock:
+        offset, hasher, _ = _hashers.pop(session.pk, (None, None, None))
+    if offset == session.received:
+        return hasher
+    hasher = hashlib.sha256()
+    remaining = session.received
+    with open(partial_path(session), 'rb') as f:
+        while remaining:
+            block = f.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def write_chunk(session, content_range, stream):
+    """
+    Append the chunk in ``stream`` to ``session``.
+
+    The chunk must start at the session's current offset. If the body stops
+    early (the connection dropped), the bytes that did arrive are kept and
+    the client resumes from the new offset.
+    """
+    if session.status != 'open':
+        raise UploadError('This upload is already complete.', status=409)
+    start, end = parse_content_range(content_range, session.size)
+    if start != session.received:
+        raise UploadError(f'Expected a chunk starting at byte {session.received}.', status=409)
+    if end - start > chunk_size():
+        raise UploadError(f'Chunks may be at most {chunk_size()} bytes.', status=413)
+
+    hasher = _hasher(session)
+    received = start
+    with open(partial_path(session), 'r+b') as f:
+        f.seek(start)
+        f.truncate()
+        while received < end:
+            block = stream.read(min(READ_BLOCK, end - received))
+            if not block:
+                break
+            f.write(block)
+            hasher.update(block)
+            received += len(block)
+
+    changes = {'received': received}
+    if received == session.size:
+        changes.update(status='complete', sha256=hasher.hexdigest())
+    # Conditional on the offset we started from, so of two clients racing on
+    # one session only the first moves it forward.
+    if not UploadSession.objects.filter(pk=session.pk, received=start, status='open').update(**changes):
+        raise UploadError('This upload was changed by another request.', status=409)
+    for name, value in changes.items():
+        setattr(session, name, value)
+    if session.status == 'open':
+        _keep_hasher(session, hasher)
+    return session
+
+
+# ---- Attaching ----
+def posted_upload(request, name='attachment'):
+    """
+    The attachment submitted with a form: a regular file in
+    ``request.FILES``, or the token of a finished chunked upload in
+    ``<name>_upload``.
+    """
+    token = request.POST.get(f'{name}_upload')
+    if not token:
+        return request.FILES.get(name)
+    try:
+        return UploadSession.objects.get(token=token, owner=request.user, status='complete')
+    except (UploadSession.DoesNotExist, ValidationError):
+        raise BadRequest('Unknown or unfinished upload.')
+
+
+def attach_upload(obj, session, field='attachment'):
+    """Move the finished upload into ``obj``'s file field without copying it."""
+    file_field = obj._meta.get_field(field)
+    storage = file_field.storage
+    name = storage.get_available_name(
+        file_field.generate_filename(obj, session.filename), max_length=file_field.max_length,
+    )
+    if isinstance(storage, ContentAddressedStorage):
+        storage.adopt(name, partial_path(session), session.sha256)
+    else:
+        path = storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(partial_path(session), path)
+
+    type(obj).objects.filter(pk=obj.pk).update(**{field: name})
+    setattr(obj, field, name)
+    UploadSession.objects.filter(pk=session.pk).update(status='attached')
+    session.status = 'attached'
+
+
+# ---- Cleanup ----
+def purge_stale(older_than):
+    """Delete unattached uploads untouched since ``older_than`` and their partial files."""
+    stale = UploadSession.objects.filter(status__in=('open', 'complete'), updated_at__lt=older_than)
+    purged = []
+    for session in stale.only('pk', 'token').iterator():
+        try:
+            os.remove(partial_path(session))
+        except FileNotFoundError:
+            pass
+        purged.append(session.pk)
+    stale.delete()
+    _drop_hashers(purged)
+    return len(purged)
@@ -10,12 +10,15 @@ urlpatterns = [
     # Dashboards
     path('', views.dashboard, name="dashboard"),
     path('manager/', views.manager_dashboard, name="manager_dashboard"),
+    path('manager/stats/', views.manager_dashboard_stats, name="manager_dashboard_stats"),
     path('auditor/', views.auditor_dashboard, name="auditor_dashboard"),
     path('department/', views.department_dashboard, name="department_dashboard"),
+    path('events/', views.events, name="events"),
 
     # Projects
     path('projects/', views.projects_list, name="projects_list"),
     path('projects/create/', views.project_create, name="project_create"),
+    path('projects/import/', views.project_import, name="project_import"),
     path('projects/<int:pk>/', views.project_detail, name="project_detail"),
 
     # Plans
@@ -38,5 +41,22 @@ urlpatterns = [
     path('reports/<int:pk>/department-review/', views.department_report_review, name="department_report_review"),
     path('reports/<int:pk>/auditor-final-review/', views.auditor_final_review, name="auditor_final_review"),
     path('reports/<int:pk>/final-manager-review/', views.final_manager_review, name="final_manager_review"),
+    path('reports/<int:pk>/pdf/', views.report_pdf, name="report_pdf"),
     path('reports/', views.reports_list, name="reports_list"),
+    path('reports/send-approved/', views.reports_send_approved, name="reports_send_approved"),
+    path('final-reports/<int:pk>/status/', views.final_report_status, name="final_report_status"),
+    path('final-reports/<int:pk>/pdf/', views.final_report_pdf, name="final_report_pdf"),
+
+    # Search
+    path('search/', views.search, name="search"),
+
+    # Data export
+    path('exports/<str:kind>/', views.export, name="export"),
+
+    # Attachments
+    path('attachments/<str:kind>/<int:pk>/', views.attachment_download, name="attachment_download"),
+
+    # Chunked uploads
+    path('uploads/', views.upload_start, name="upload_start"),
+    path('uploads/<uuid:token>/', views.upload_chunk, name="upload_chunk"),
 ]
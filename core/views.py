@@ -1,31 +1,131 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import logout
-from django.http import HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User, Group
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.urls import reverse
 from django.contrib import messages
+from django.core.exceptions import BadRequest, PermissionDenied, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
 from .models import (
     AuditProject, Department, AuditAssignment,
-    AuditPlan, AuditIssue, AuditReport, FinalReport
+    AuditPlan, AuditIssue, AuditReport, FinalReport, Job, SearchDocument, UploadSession
 )
+from .dashboard import cached_manager_stats, department_dashboard_context, manager_dashboard_context
+from .downloads import serve_file
+from .events import stream as event_stream, user_topics
+from .exports import EXPORTS, FORMATS as EXPORT_FORMATS, parse_filters as parse_export_filters, stream as export_stream
+from .jobs import enqueue
+from .pagination import keyset_paginate
+from .pdf import DIGEST_RE as PDF_DIGEST_RE, cache_path as pdf_cache_path, content_digest
+from .projects import create_project, import_projects, parse_import
+from .roles import (
+    AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS, get_user_roles, managed_department_ids
+)
+from .search import search as search_documents
+from .transitions import TransitionConflict, atomic_with_attachments, posted_version, store_attachment, transition
+from .uploads import UploadError, chunk_size as upload_chunk_size, posted_upload, start_upload, write_chunk
+from .workflow import PROJECT_WORKFLOW, InvalidTransition, bulk_apply, apply as apply_transition
+import mimetypes
 import os
 
 
+DASHBOARD_PAGE_SIZE = 10
+LIST_PAGE_SIZE = 25
+SEARCH_PAGE_SIZE = 20
+
+
 # ---- Helper Functions ----
 def is_audit_manager(user):
-    return user.groups.filter(name="Audit Managers").exists()
+    return AUDIT_MANAGERS in get_user_roles(user)
 
 def is_auditor(user):
-    return user.groups.filter(name="Auditors").exists()
+    return AUDITORS in get_user_roles(user)
 
 def is_department_manager(user):
-    return user.groups.filter(name="Department Managers").exists()
+    return DEPARTMENT_MANAGERS in get_user_roles(user)
 
 def is_htmx(request):
     return request.headers.get('HX-Request') == 'true'
 
+def project_detail_queryset():
+    """
+    Everything project_detail.html renders, in five queries: the project
+    joined to its counters, then one prefetch per related list.
+    """
+    return (
+        AuditProject.objects
+        .select_related('department', 'created_by', 'stats')
+        .prefetch_related(
+            Prefetch('plans', to_attr='plan_list',
+                     queryset=AuditPlan.objects.select_related('created_by').order_by('created_at', 'id')),
+            Prefetch('issues', to_attr='issue_list',
+                     queryset=AuditIssue.objects.select_related('created_by').order_by('created_at', 'id')),
+            Prefetch('reports', to_attr='report_list',
+                     queryset=AuditReport.objects.select_related('created_by').order_by('created_at', 'id')),
+            Prefetch('assignments', to_attr='assignment_list',
+                     queryset=AuditAssignment.objects.select_related('auditor').order_by('assigned_at', 'id')),
+        )
+    )
+
+def can_view_project(user, project):
+    """
+    Whether ``user`` may see ``project`` and its files: audit managers see
+    every project, auditors the ones they are assigned to and department
+    managers their department's.
+    """
+    roles = get_user_roles(user)
+    if AUDIT_MANAGERS in roles:
+        return True
+    if DEPARTMENT_MANAGERS in roles and project.department_id in managed_department_ids(user):
+        return True
+    return AUDITORS in roles and project.assignments.filter(auditor=user).exists()
+
+def review_conflict(request, detail, pk):
+    """
+    Answer a review that lost a race with a concurrent change: HTTP 409 for
+    htmx, otherwise a message and the item's (current) detail page.
+    """
+    message = 'Someone else updated this item while you were reviewing it. Your changes were not saved.'
+    if is_htmx(request):
+        return HttpResponse(message, status=409)
+    messages.error(request, message)
+    return redirect(detail, pk)
+
+def render_dashboard(request, template, context, fragments):
+    """
+    Render a dashboard, or only the fragment an htmx refetch targets (see
+    core/events.py). ``fragments`` are the element ids of the dashboard's
+    live fragments, each a partial named after its id; the context is lazy,
+    so only that fragment's queries run.
+    """
+    target = request.headers.get('HX-Target', '') if is_htmx(request) else ''
+    if target in fragments:
+        return render(request, f"core/partials/{target.replace('-', '_')}.html", context)
+    return render(request, template, context)
+
+def transition_refused(request, error, fallback, *args):
+    """Answer an action the current status does not allow (HTTP 400)."""
+    message = f'This action is not available: {error}'
+    if is_htmx(request):
+        return HttpResponse(message, status=400)
+    messages.error(request, message)
+    return redirect(fallback, *args)
+
+def assigned_projects(user):
+    """Projects the auditor is assigned to, newest first, in a single query."""
+    return (
+        AuditProject.objects
+        .filter(assignments__auditor=user)
+        .select_related('department', 'created_by', 'stats')
+        .order_by('-created_at', '-id')
+    )
+
 
 # ---- Dashboard Views ----
 @login_required
@@ -43,50 +143,73 @@ def dashboard(request):
 @login_required
 @user_passes_test(is_audit_manager)
 def manager_dashboard(request):
-    projects = AuditProject.objects.all().order_by('-created_at')
-    pending_plans = AuditPlan.objects.filter(status='submitted')
-    pending_issues = AuditIssue.objects.filter(status='submitted')
-    pending_reports = AuditReport.objects.filter(status='submitted')
-    
-    context = {
-        'projects': projects,
-        'pending_plans': pending_plans,
-        'pending_issues': pending_issues,
-        'pending_reports': pending_reports,
-    }
-    return render(request, 'core/manager_dashboard.html', context)
+    context = manager_dashboard_context(request)
+    return render_dashboard(
+        request, 'core/manager_dashboard.html', context, ('recent-projects', 'pending-items', 'recent-activity'),
+    )
+
+
+@login_required
+@user_passes_test(is_audit_manager)
+def manager_dashboard_stats(request):
+    stats = cached_manager_stats(request)
+    if is_htmx(request):
+        return render(request, 'core/partials/manager_stats.html', {'stats': stats})
+    return JsonResponse(stats)
 
 
 @login_required
 @user_passes_test(is_auditor)
 def auditor_dashboard(request):
-    assignments = AuditAssignment.objects.filter(auditor=request.user)
-    projects = [assignment.project for assignment in assignments]
+    projects = assigned_projects(request.user)
+    # Lazy, so a cached dashboard fragment skips the count and page queries.
+    page_obj = SimpleLazyObject(
+        lambda: Paginator(projects, DASHBOARD_PAGE_SIZE).get_page(request.GET.get('page'))
+    )
+    my_plans = (
+        AuditPlan.objects
+        .filter(created_by=request.user, project__assignments__auditor=request.user)
+        .select_related('project')
+        .order_by('-created_at')
+    )
+    my_issues = (
+        AuditIssue.objects
+        .filter(created_by=request.user, project__assignments__auditor=request.user)
+        .select_related('project')
+        .order_by('-created_at')
+    )
     
     context = {
-        'projects': projects,
-        'assignments': assignments,
+        'projects': page_obj,
+        'page_obj': page_obj,
+        'my_plans': my_plans[:DASHBOARD_PAGE_SIZE],
+        'my_issues': my_issues[:DASHBOARD_PAGE_SIZE],
     }
-    return render(request, 'core/auditor_dashboard.html', context)
+    return render_dashboard(request, 'core/auditor_dashboard.html', context, ('auditor-projects', 'auditor-activity'))
 
 
 @login_required
 @user_passes_test(is_department_manager)
 def department_dashboard(request):
-    department = Department.objects.filter(manager=request.user).first()
-    if department:
-        pending_reports = AuditReport.objects.filter(
-            project__department=department,
-            status='sent_to_department'
-        )
-    else:
-        pending_reports = []
-    
-    context = {
-        'department': department,
-        'pending_reports': pending_reports,
-    }
-    return render(request, 'core/department_dashboard.html', context)
+    context = department_dashboard_context(request.user)
+    return render_dashboard(request, 'core/department_dashboard.html', context, ('department-overview',))
+
+
+@login_required
+async def events(request):
+    """
+    Server-sent events naming the dashboard fragments that just went stale
+    for this user; see core/events.py. Only served by the ASGI application.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    topics = await sync_to_async(user_topics)(user)
+    response = StreamingHttpResponse(event_stream(topics), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # ---- Project Management ----
@@ -94,36 +217,35 @@ def department_dashboard(request):
 @user_passes_test(is_audit_manager)
 def project_create(request):
     if request.method == "POST":
-        title = request.POST.get('title')
-        description = request.POST.get('description')
-        dept_id = request.POST.get('department')
-        auditors_ids = request.POST.getlist('auditors')
-        manager_notes = request.POST.get('manager_notes', '')
-
-        dept = Department.objects.get(id=dept_id)
-        project = AuditProject.objects.create(
-            department=dept,
-            title=title,
-            description=description,
-            manager_notes=manager_notes,
-            created_by=request.user
-        )
-
-        for aid in auditors_ids:
-            auditor = User.objects.get(id=aid)
-            AuditAssignment.objects.create(
-                project=project,
-                auditor=auditor,
-                assigned_by=request.user
+        try:
+            project = create_project(
+                title=request.POST.get('title'),
+                description=request.POST.get('description'),
+                department_id=request.POST.get('department'),
+                auditor_ids=request.POST.getlist('auditors'),
+                manager_notes=request.POST.get('manager_notes', ''),
+                created_by=request.user,
             )
+        except ValidationError as e:
+            if is_htmx(request):
+                return HttpResponse(' '.join(e.messages), status=400)
+            for message in e.messages:
+                messages.error(request, message)
+            return redirect('core:project_create')
 
         if is_htmx(request):
+            project = (
+                AuditProject.objects
+                .select_related('department')
+                .prefetch_related('assignments__auditor')
+                .get(pk=project.pk)
+            )
             return render(request, 'core/partials/project_row.html', {'project': project})
         messages.success(request, 'Project created successfully!')
         return redirect('core:manager_dashboard')
 
     departments = Department.objects.all()
-    auditors = User.objects.filter(groups__name='Auditors')
+    auditors = User.objects.filter(groups__name=AUDITORS)
     return render(request, 'core/projects/create.html', {
         'departments': departments,
         'auditors': auditors
@@ -132,10 +254,10 @@ def project_create(request):
 
 @login_required
 def project_detail(request, pk):
-    project = get_object_or_404(AuditProject, pk=pk)
+    project = get_object_or_404(project_detail_queryset(), pk=pk)
     is_assigned_auditor = (
         is_auditor(request.user) and
-        AuditAssignment.objects.filter(project=project, auditor=request.user).exists()
+        any(a.auditor_id == request.user.id for a in project.assignment_list)
     )
     
     context = {
@@ -148,20 +270,41 @@ def project_detail(request, pk):
 @login_required
 def projects_list(request):
     if is_audit_manager(request.user):
-        projects = AuditProject.objects.all().order_by('-created_at')
+        projects = AuditProject.objects.all()
     elif is_auditor(request.user):
-        assignments = AuditAssignment.objects.filter(auditor=request.user)
-        projects = [assignment.project for assignment in assignments]
+        projects = assigned_projects(request.user)
     elif is_department_manager(request.user):
-        department = Department.objects.filter(manager=request.user).first()
-        if department:
-            projects = AuditProject.objects.filter(department=department).order_by('-created_at')
-        else:
-            projects = []
+        projects = AuditProject.objects.filter(department_id__in=managed_department_ids(request.user))
     else:
-        projects = []
+        projects = AuditProject.objects.none()
     
-    return render(request, 'core/projects/list.html', {'projects': projects})
+    projects = projects.select_related('department', 'created_by', 'stats')
+    return render_keyset_list(
+        request, projects, 'projects',
+        'core/projects/list.html', 'core/partials/project_rows.html',
+    )
+
+
+@login_required
+@user_passes_test(is_audit_manager)
+def project_import(request):
+    if request.method == "POST":
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Choose a CSV or JSON file to import.')
+            return redirect('core:project_import')
+
+        fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+        try:
+            rows = parse_import(upload.read(), fmt, upload.name)
+            created, assigned = import_projects(rows, created_by=request.user)
+        except ValidationError as e:
+            return render(request, 'core/projects/import.html', {'errors': e.messages}, status=400)
+
+        messages.success(request, f'Imported {created} projects with {assigned} auditor assignments.')
+        return redirect('core:projects_list')
+
+    return render(request, 'core/projects/import.html')
 
 
 # ---- Audit Plan Management ----
@@ -177,18 +320,19 @@ def plan_create(request, project_id):
     
     if request.method == "POST":
         description = request.POST.get("description")
-        attachment = request.FILES.get("attachment")
-        
-        plan = AuditPlan.objects.create(
-            project=project,
-            created_by=request.user,
-            description=description,
-            attachment=attachment,
-            status="submitted"
-        )
+        attachment = posted_upload(request)
         
-        project.status = "plan_pending"
-        project.save()
+        with atomic_with_attachments():
+            plan = AuditPlan.objects.create(
+                project=project,
+                created_by=request.user,
+                description=description,
+                status="submitted"
+            )
+            if attachment:
+                store_attachment(plan, attachment)
+            if 'submit_plan' in PROJECT_WORKFLOW.allowed(project.status):
+                apply_transition(project, 'submit_plan', user=request.user)
         
         if is_htmx(request):
             return HttpResponse("Plan submitted successfully!")
@@ -201,27 +345,33 @@ def plan_create(request, project_id):
 @login_required
 @user_passes_test(is_audit_manager)
 def plan_review(request, pk):
-    plan = get_object_or_404(AuditPlan, pk=pk)
+    plans = AuditPlan.objects.select_related('project')
+    plan = get_object_or_404(plans, pk=pk)
     
     if request.method == "POST":
         action = request.POST.get('action')
-        manager_notes = request.POST.get('manager_notes', '')
-        attachment = request.FILES.get('attachment')
-        
-        if action == 'approve':
-            plan.status = 'approved'
-            plan.project.status = 'audit_in_progress'
-            plan.project.save()
-        elif action == 'reject':
-            plan.status = 'rejected'
-            plan.project.status = 'created'
-            plan.project.save()
+        attachment = posted_upload(request)
+        status, project_action = {
+            'approve': ('approved', 'approve_plan'),
+            'reject': ('rejected', 'reject_plan'),
+        }.get(action, (plan.status, None))
         
-        plan.manager_notes = manager_notes
-        if attachment:
-            plan.attachment = attachment
-        plan.manager_reviewed_at = timezone.now()
-        plan.save()
+        try:
+            with atomic_with_attachments():
+                transition(
+                    plan, status, version=posted_version(request),
+                    manager_notes=request.POST.get('manager_notes', ''),
+                    manager_reviewed_at=timezone.now(),
+                )
+                # Another plan of the project may already have been reviewed.
+                if project_action in PROJECT_WORKFLOW.allowed(plan.project.status):
+                    apply_transition(plan.project, project_action, user=request.user)
+                if attachment:
+                    store_attachment(plan, attachment)
+        except TransitionConflict:
+            return review_conflict(request, 'core:plan_detail', pk)
+        except InvalidTransition as e:
+            return transition_refused(request, e, 'core:plan_review', pk)
         
         if is_htmx(request):
             return HttpResponse("Plan reviewed successfully!")
@@ -254,15 +404,17 @@ def issue_create(request, project_id):
     
     if request.method == "POST":
         description = request.POST.get("description")
-        attachment = request.FILES.get("attachment")
+        attachment = posted_upload(request)
         
-        issue = AuditIssue.objects.create(
-            project=project,
-            created_by=request.user,
-            description=description,
-            attachment=attachment,
-            status="submitted"
-        )
+        with atomic_with_attachments():
+            issue = AuditIssue.objects.create(
+                project=project,
+                created_by=request.user,
+                description=description,
+                status="submitted"
+            )
+            if attachment:
+                store_attachment(issue, attachment)
         
         if is_htmx(request):
             return HttpResponse("Issue submitted successfully!")
@@ -279,19 +431,20 @@ def issue_review(request, pk):
     
     if request.method == "POST":
         action = request.POST.get('action')
-        manager_notes = request.POST.get('manager_notes', '')
-        attachment = request.FILES.get('attachment')
+        attachment = posted_upload(request)
+        status = {'approve': 'approved', 'reject': 'rejected'}.get(action, issue.status)
         
-        if action == 'approve':
-            issue.status = 'approved'
-        elif action == 'reject':
-            issue.status = 'rejected'
-        
-        issue.manager_notes = manager_notes
-        if attachment:
-            issue.attachment = attachment
-        issue.manager_reviewed_at = timezone.now()
-        issue.save()
+        try:
+            with atomic_with_attachments():
+                transition(
+                    issue, status, version=posted_version(request),
+                    manager_notes=request.POST.get('manager_notes', ''),
+                    manager_reviewed_at=timezone.now(),
+                )
+                if attachment:
+                    store_attachment(issue, attachment)
+        except TransitionConflict:
+            return review_conflict(request, 'core:issue_detail', pk)
         
         if is_htmx(request):
             return HttpResponse("Issue reviewed successfully!")
@@ -325,15 +478,17 @@ def report_create(request, project_id):
     
     if request.method == "POST":
         description = request.POST.get("description")
-        attachment = request.FILES.get("attachment")
+        attachment = posted_upload(request)
         
-        report = AuditReport.objects.create(
-            project=project,
-            created_by=request.user,
-            description=description,
-            attachment=attachment,
-            status="submitted"
-        )
+        with atomic_with_attachments():
+            report = AuditReport.objects.create(
+                project=project,
+                created_by=request.user,
+                description=description,
+                status="submitted"
+            )
+            if attachment:
+                store_attachment(report, attachment)
         
         if is_htmx(request):
             return HttpResponse("Report submitted successfully!")
@@ -346,26 +501,26 @@ def report_create(request, project_id):
 @login_required
 @user_passes_test(is_audit_manager)
 def report_review(request, pk):
-    report = get_object_or_404(AuditReport, pk=pk)
+    reports = AuditReport.objects.select_related('project')
+    report = get_object_or_404(reports, pk=pk)
     
     if request.method == "POST":
         action = request.POST.get('action')
-        manager_notes = request.POST.get('manager_notes', '')
-        attachment = request.FILES.get('attachment')
-        
-        if action == 'approve':
-            report.status = 'approved_by_manager'
-            report.project.status = 'report_pending_manager'
-            report.project.save()
-        elif action == 'reject':
-            report.status = 'rejected'
-            report.project.status = 'audit_in_progress'
-            report.project.save()
+        attachment = posted_upload(request)
+        changes = {'manager_notes': request.POST.get('manager_notes', '')}
         
-        report.manager_notes = manager_notes
-        if attachment:
-            report.attachment = attachment
-        report.save()
+        try:
+            with atomic_with_attachments():
+                if action in ('approve', 'reject'):
+                    apply_transition(report, action, user=request.user, version=posted_version(request), **changes)
+                else:
+                    transition(report, report.status, version=posted_version(request), **changes)
+                if attachment:
+                    store_attachment(report, attachment)
+        except TransitionConflict:
+            return review_conflict(request, 'core:report_detail', pk)
+        except InvalidTransition as e:
+            return transition_refused(request, e, 'core:report_review', pk)
         
         if is_htmx(request):
             return HttpResponse("Report reviewed successfully!")
@@ -378,35 +533,75 @@ def report_review(request, pk):
 @login_required
 @user_passes_test(is_audit_manager)
 def report_send_to_department(request, pk):
-    report = get_object_or_404(AuditReport, pk=pk)
-    report.status = 'sent_to_department'
-    report.project.status = 'report_pending_department'
-    report.save()
-    report.project.save()
+    report = get_object_or_404(AuditReport.objects.select_related('project'), pk=pk)
+    try:
+        apply_transition(report, 'send_to_department', user=request.user, version=posted_version(request))
+    except TransitionConflict:
+        message = 'This report was changed by someone else; it has not been sent.'
+        if is_htmx(request):
+            return HttpResponse(message, status=409)
+        messages.error(request, message)
+        return redirect('core:manager_dashboard')
+    except InvalidTransition as e:
+        return transition_refused(request, e, 'core:manager_dashboard')
     
     messages.success(request, 'Report sent to department successfully!')
     return redirect('core:manager_dashboard')
 
 
+@login_required
+@user_passes_test(is_audit_manager)
+def reports_send_approved(request):
+    """Send every manager-approved report of one department in a single transition."""
+    if request.method != "POST":
+        return redirect('core:reports_list')
+    department = get_object_or_404(Department, pk=request.POST.get('department'))
+    try:
+        sent = bulk_apply(
+            AuditReport.objects.filter(project__department=department),
+            'send_to_department', user=request.user,
+        )
+    except TransitionConflict as e:
+        if is_htmx(request):
+            return HttpResponse(str(e), status=409)
+        messages.error(request, f'Nothing was sent: {e}')
+        return redirect('core:reports_list')
+    except InvalidTransition as e:
+        return transition_refused(request, e, 'core:reports_list')
+    
+    message = f'Sent {len(sent)} reports to {department.name}.'
+    if is_htmx(request):
+        return HttpResponse(message)
+    messages.success(request, message)
+    return redirect('core:reports_list')
+
+
 @login_required
 @user_passes_test(is_department_manager)
 def department_report_review(request, pk):
-    report = get_object_or_404(AuditReport, pk=pk)
+    reports = AuditReport.objects.select_related('project')
+    report = get_object_or_404(reports, pk=pk)
     
     # Check if department manager is assigned to the project's department
-    if report.project.department.manager != request.user:
+    if report.project.department_id not in managed_department_ids(request.user):
         messages.error(request, 'You are not authorized to review this report.')
         return redirect('core:department_dashboard')
     
     if request.method == "POST":
-        department_notes = request.POST.get('department_notes', '')
-        attachment = request.FILES.get('attachment')
+        attachment = posted_upload(request)
         
-        report.department_notes = department_notes
-        if attachment:
-            report.attachment = attachment
-        report.status = 'dept_replied'
-        report.save()
+        try:
+            with atomic_with_attachments():
+                apply_transition(
+                    report, 'department_reply', user=request.user, version=posted_version(request),
+                    department_notes=request.POST.get('department_notes', ''),
+                )
+                if attachment:
+                    store_attachment(report, attachment)
+        except TransitionConflict:
+            return review_conflict(request, 'core:report_detail', pk)
+        except InvalidTransition as e:
+            return transition_refused(request, e, 'core:department_dashboard')
         
         if is_htmx(request):
             return HttpResponse("Department response submitted successfully!")
@@ -419,7 +614,8 @@ def department_report_review(request, pk):
 @login_required
 @user_passes_test(is_auditor)
 def auditor_final_review(request, pk):
-    report = get_object_or_404(AuditReport, pk=pk)
+    reports = AuditReport.objects.select_related('project')
+    report = get_object_or_404(reports, pk=pk)
     
     # Check if auditor is assigned to this project
     if not AuditAssignment.objects.filter(project=report.project, auditor=request.user).exists():
@@ -428,19 +624,19 @@ def auditor_final_review(request, pk):
     
     if request.method == "POST":
         action = request.POST.get('action')
-        auditor_notes = request.POST.get('auditor_notes', '')
-        
-        if action == 'approve':
-            report.status = 'auditor_approved'
-            report.project.status = 'final_review'
-            report.project.save()
-        elif action == 'reject':
-            report.status = 'sent_to_department'
-            report.project.status = 'report_pending_department'
-            report.project.save()
+        changes = {'auditor_final_notes': request.POST.get('auditor_notes', '')}
         
-        report.auditor_final_notes = auditor_notes
-        report.save()
+        try:
+            if action in ('approve', 'reject'):
+                apply_transition(
+                    report, f'auditor_{action}', user=request.user, version=posted_version(request), **changes,
+                )
+            else:
+                transition(report, report.status, version=posted_version(request), **changes)
+        except TransitionConflict:
+            return review_conflict(request, 'core:report_detail', pk)
+        except InvalidTransition as e:
+            return transition_refused(request, e, 'core:auditor_dashboard')
         
         if is_htmx(request):
             return HttpResponse("Final review submitted successfully!")
@@ -453,50 +649,43 @@ def auditor_final_review(request, pk):
 @login_required
 @user_passes_test(is_audit_manager)
 def final_manager_review(request, pk):
-    report = get_object_or_404(AuditReport, pk=pk)
+    reports = AuditReport.objects.select_related('project')
+    report = get_object_or_404(reports, pk=pk)
     
     if request.method == "POST":
         action = request.POST.get('action')
-        final_notes = request.POST.get('final_notes', '')
-        attachment = request.FILES.get('attachment')
+        attachment = posted_upload(request)
+        changes = {'final_manager_notes': request.POST.get('final_notes', '')}
         
-        if action == 'approve':
-            report.status = 'final_approved'
-            report.project.status = 'finalized'
-            report.project.save()
-            
-            # Generate final report
-            final_content = f"""
-            Final Audit Report for {report.project.title}
-            
-            Project Description: {report.project.description}
-            Department: {report.project.department.name}
-            
-            Audit Plan: {report.project.plans.first().description if report.project.plans.exists() else 'No plan'}
-            
-            Issues Found:
-            {chr(10).join([f'- {issue.description}' for issue in report.project.issues.filter(status='approved')])}
-            
-            Department Response: {report.department_notes}
-            
-            Final Manager Notes: {final_notes}
-            """
-            
-            FinalReport.objects.create(
-                project=report.project,
-                content=final_content,
-                attachment=attachment
-            )
-            
-        elif action == 'reject':
-            report.status = 'auditor_approved'
-            report.project.status = 'final_review'
-            report.project.save()
-        
-        report.final_manager_notes = final_notes
-        report.save()
+        final_report = None
+        try:
+            with atomic_with_attachments():
+                if action in ('approve', 'reject'):
+                    apply_transition(
+                        report, f'final_{action}', user=request.user, version=posted_version(request), **changes,
+                    )
+                else:
+                    transition(report, report.status, version=posted_version(request), **changes)
+                
+                if action == 'approve':
+                    # The report body is assembled by a background job; the
+                    # page polls final_report_status until it is ready.
+                    final_report, _ = FinalReport.objects.update_or_create(
+                        project=report.project,
+                        defaults={'status': 'pending', 'content': ''},
+                    )
+                    if attachment:
+                        store_attachment(final_report, attachment)
+                    enqueue('build_final_report', final_report_id=final_report.pk, report_id=report.pk)
+        except TransitionConflict:
+            return review_conflict(request, 'core:report_detail', pk)
+        except InvalidTransition as e:
+            return transition_refused(request, e, 'core:final_manager_review', pk)
         
         if is_htmx(request):
+            if final_report:
+                final_report.refresh_from_db(fields=['status'])
+                return render(request, 'core/partials/final_report_status.html', {'final_report': final_report})
             return HttpResponse("Final review completed successfully!")
         messages.success(request, 'Final review completed successfully!')
         return redirect('core:manager_dashboard')
@@ -504,59 +693,250 @@ def final_manager_review(request, pk):
     return render(request, 'core/reports/final_manager_review.html', {'report': report})
 
 
+@login_required
+def final_report_status(request, pk):
+    final_report = get_object_or_404(FinalReport.objects.select_related('project'), pk=pk)
+    if not can_view_project(request.user, final_report.project):
+        raise PermissionDenied
+    return render(request, 'core/partials/final_report_status.html', {'final_report': final_report})
+
+
 @login_required
 def report_detail(request, pk):
     report = get_object_or_404(AuditReport, pk=pk)
     return render(request, 'core/reports/detail.html', {'report': report})
 
 
+# ---- Chunked Uploads ----
+def upload_state(session):
+    return {
+        'token': str(session.token),
+        'url': reverse('core:upload_chunk', args=[session.token]),
+        'offset': session.received,
+        'size': session.size,
+        'status': session.status,
+        'sha256': session.sha256,
+    }
+
+
+@login_required
+def upload_start(request):
+    """Open a resumable upload; the browser then PUTs the chunks to ``url``."""
+    if request.method != "POST":
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    try:
+        session = start_upload(request.user, request.POST.get('filename'), request.POST.get('size'))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse({**upload_state(session), 'chunk_size': upload_chunk_size()}, status=201)
+
+
+@login_required
+def upload_chunk(request, token):
+    """GET reports the offset to resume from; PUT appends one ``Content-Range`` chunk."""
+    session = get_object_or_404(UploadSession, token=token, owner=request.user)
+    if request.method == "PUT":
+        try:
+            write_chunk(session, request.headers.get('Content-Range'), request)
+        except UploadError as e:
+            return JsonResponse({**upload_state(session), 'error': str(e)}, status=e.status)
+    elif request.method != "GET":
+        return JsonResponse({'error': 'GET or PUT required.'}, status=405)
+    return JsonResponse(upload_state(session))
+
+
+# ---- Attachments ----
+ATTACHMENT_MODELS = {
+    'plan': AuditPlan,
+    'issue': AuditIssue,
+    'report': AuditReport,
+    'final-report': FinalReport,
+}
+
+
+@login_required
+def attachment_download(request, kind, pk):
+    """Serve an attachment to the users who can see its project."""
+    model = ATTACHMENT_MODELS.get(kind)
+    if model is None:
+        raise Http404
+    obj = get_object_or_404(model.objects.select_related('project__department'), pk=pk)
+    if not can_view_project(request.user, obj.project):
+        raise PermissionDenied
+    if not obj.attachment:
+        raise Http404
+    try:
+        path = obj.attachment.path
+        content_type = mimetypes.guess_type(obj.attachment.name)[0] or 'application/octet-stream'
+        return serve_file(request, path, content_type, filename=os.path.basename(obj.attachment.name))
+    except FileNotFoundError:
+        raise Http404
+
+
+# ---- Search ----
+@login_required
+def search(request):
+    """Ranked full-text search over the projects the user can see."""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind') or None
+    if kind not in dict(SearchDocument.KIND_CHOICES):
+        kind = None
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    
+    context = {
+        'query': query,
+        'kind': kind,
+        'kinds': SearchDocument.KIND_CHOICES,
+        'results': search_documents(request.user, query, kind=kind, page=page, page_size=SEARCH_PAGE_SIZE),
+    }
+    if is_htmx(request):
+        return render(request, 'core/partials/search_results.html', context)
+    return render(request, 'core/search.html', context)
+
+
+
+# ---- Data Export ----
+@login_required
+def export(request, kind):
+    """
+    Stream every project, issue or report the user can see, as CSV or
+    XLSX, narrowed by the ``department``, ``status``, ``since`` and
+    ``until`` query parameters.
+    """
+    if kind not in EXPORTS:
+        raise Http404
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        raise BadRequest(f'Unknown export format {fmt!r}.')
+    filters = parse_export_filters(EXPORTS[kind], request.GET)
+    response = StreamingHttpResponse(
+        export_stream(kind, fmt, filters, user=request.user), content_type=EXPORT_FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
+
+
+# ---- PDF Export ----
+def serve_pdf(request, kind, obj):
+    """
+    Serve the cached PDF for ``obj``, or queue it for rendering and answer
+    202 with a fragment that polls until it is ready.
+    """
+    # A poll names the digest it waits for: while that render is still in
+    # the queue, the digest need not be recomputed from every issue again.
+    digest = request.GET.get('digest', '')
+    waiting = bool(PDF_DIGEST_RE.fullmatch(digest)) and Job.objects.filter(
+        kind='render_pdf', status__in=('queued', 'running'),
+        payload__kind=kind, payload__pk=obj.pk, payload__digest=digest,
+    ).exists()
+    if not waiting:
+        digest = content_digest(kind, obj)
+    path = pdf_cache_path(digest)
+    if not waiting and not os.path.exists(path):
+        renders = Job.objects.filter(kind='render_pdf', payload__digest=digest)
+        if not renders.filter(status__in=('queued', 'running')).exists():
+            if renders.filter(status='failed').exists():
+                return HttpResponse("PDF rendering failed.", status=500)
+            enqueue('render_pdf', kind=kind, pk=obj.pk, digest=digest)
+
+    if os.path.exists(path):
+        if is_htmx(request):
+            response = HttpResponse(status=204)
+            response['HX-Redirect'] = request.path
+            return response
+        return serve_file(request, path, 'application/pdf', filename=f'{kind}-{obj.pk}.pdf', etag=digest)
+
+    template = 'core/partials/pdf_status.html' if is_htmx(request) else 'core/pdf/pending.html'
+    return render(request, template, {'obj': obj, 'digest': digest}, status=202)
+
+
+@login_required
+def report_pdf(request, pk):
+    report = get_object_or_404(AuditReport.objects.select_related('project__department'), pk=pk)
+    if not can_view_project(request.user, report.project):
+        raise PermissionDenied
+    return serve_pdf(request, 'report', report)
+
+
+@login_required
+def final_report_pdf(request, pk):
+    final_report = get_object_or_404(FinalReport.objects.select_related('project__department'), pk=pk)
+    if not can_view_project(request.user, final_report.project):
+        raise PermissionDenied
+    if final_report.status != 'ready':
+        return render(request, 'core/partials/final_report_status.html', {'final_report': final_report}, status=409)
+    return serve_pdf(request, 'final_report', final_report)
+
+
 # ---- List Views ----
+def render_keyset_list(request, queryset, name, template, rows_template, extra_context=None):
+    """
+    Render one keyset page of ``queryset``. htmx requests for a later page
+    (sent by the infinite-scroll sentinel row) only get the rows partial.
+    """
+    cursor = request.GET.get('cursor')
+    page = keyset_paginate(queryset, cursor, LIST_PAGE_SIZE)
+    context = {name: page.object_list, 'page': page}
+    if cursor and is_htmx(request):
+        return render(request, rows_template, context)
+    return render(request, template, {**context, **(extra_context or {})})
+
+
 @login_required
 def plans_list(request):
     if is_audit_manager(request.user):
-        plans = AuditPlan.objects.all().order_by('-created_at')
+        plans = AuditPlan.objects.all()
     elif is_auditor(request.user):
-        assignments = AuditAssignment.objects.filter(auditor=request.user)
-        project_ids = [assignment.project.id for assignment in assignments]
-        plans = AuditPlan.objects.filter(project_id__in=project_ids).order_by('-created_at')
+        plans = AuditPlan.objects.filter(project__assignments__auditor=request.user)
     else:
-        plans = []
+        plans = AuditPlan.objects.none()
     
-    return render(request, 'core/plans/list.html', {'plans': plans})
+    plans = plans.select_related('project', 'created_by')
+    return render_keyset_list(
+        request, plans, 'plans',
+        'core/plans/list.html', 'core/partials/plan_rows.html',
+    )
 
 
 @login_required
 def issues_list(request):
     if is_audit_manager(request.user):
-        issues = AuditIssue.objects.all().order_by('-created_at')
+        issues = AuditIssue.objects.all()
     elif is_auditor(request.user):
-        assignments = AuditAssignment.objects.filter(auditor=request.user)
-        project_ids = [assignment.project.id for assignment in assignments]
-        issues = AuditIssue.objects.filter(project_id__in=project_ids).order_by('-created_at')
+        issues = AuditIssue.objects.filter(project__assignments__auditor=request.user)
     else:
-        issues = []
+        issues = AuditIssue.objects.none()
     
-    return render(request, 'core/issues/list.html', {'issues': issues})
+    issues = issues.select_related('project', 'created_by')
+    return render_keyset_list(
+        request, issues, 'issues',
+        'core/issues/list.html', 'core/partials/issue_rows.html',
+    )
 
 
 @login_required
 def reports_list(request):
     if is_audit_manager(request.user):
-        reports = AuditReport.objects.all().order_by('-created_at')
+        reports = AuditReport.objects.all()
     elif is_auditor(request.user):
-        assignments = AuditAssignment.objects.filter(auditor=request.user)
-        project_ids = [assignment.project.id for assignment in assignments]
-        reports = AuditReport.objects.filter(project_id__in=project_ids).order_by('-created_at')
+        reports = AuditReport.objects.filter(project__assignments__auditor=request.user)
     elif is_department_manager(request.user):
-        department = Department.objects.filter(manager=request.user).first()
-        if department:
-            reports = AuditReport.objects.filter(project__department=department).order_by('-created_at')
-        else:
-            reports = []
+        reports = AuditReport.objects.filter(project__department_id__in=managed_department_ids(request.user))
     else:
-        reports = []
+        reports = AuditReport.objects.none()
     
-    return render(request, 'core/reports/list.html', {'reports': reports})
+    reports = reports.select_related('project', 'created_by')
+    extra_context = {}
+    if is_audit_manager(request.user):
+        # Lazy: only queried when the full page (with the bulk-send form) renders.
+        extra_context['departments'] = Department.objects.order_by('name')
+    return render_keyset_list(
+        request, reports, 'reports',
+        'core/reports/list.html', 'core/partials/report_rows.html', extra_context,
+    )
 
 
 # ---- Utility Views ----
@@ -0,0 +1,273 @@
+"""
+The project and report lifecycles as one declarative transition table.
+
+Each workflow is compiled once into ``{status: {action: Transition}}``, so
+checking whether an action is allowed is a dict lookup with no queries. A
+transition names the roles that may fire it and, for reports, the project
+transition it drags along. Every transition is applied with the conditional
+UPDATE from core/transitions.py and recorded in ``WorkflowHistory``.
+
+Hooks registered with :func:`before` run inside the transaction before the
+UPDATE and may veto it by raising; :func:`after` hooks run once the new
+status is written.
+"""
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import F
+
+from .fragments import bump as bump_fragments
+from .models import AuditAssignment, AuditProject, AuditReport, WorkflowHistory
+from .roles import AUDIT_MANAGERS, AUDITORS, DEPARTMENT_MANAGERS, get_user_roles
+from .signals import status_changed
+from .transitions import TransitionConflict, transition
+
+
+class InvalidTransition(Exception):
+    """The action is not allowed from the object's current status."""
+
+
+class Transition(NamedTuple):
+    action: str
+    sources: frozenset
+    target: str
+    roles: frozenset
+    # Project action fired together with this one (reports only).
+    project_action: Optional[str] = None
+
+
+def t(action, sources, target, roles, project_action=None):
+    return Transition(action, frozenset(sources), target, frozenset(roles), project_action)
+
+
+MANAGERS = {AUDIT_MANAGERS}
+
+PROJECT_TRANSITIONS = [
+    t('submit_plan', ['created', 'plan_pending'], 'plan_pending', {AUDITORS}),
+    t('approve_plan', ['plan_pending'], 'audit_in_progress', MANAGERS),
+    t('reject_plan', ['plan_pending'], 'created', MANAGERS),
+    t('approve_report', ['audit_in_progress'], 'report_pending_manager', MANAGERS),
+    t('reject_report', ['audit_in_progress', 'report_pending_manager'], 'audit_in_progress', MANAGERS),
+    t('send_report', ['report_pending_manager'], 'report_pending_department', MANAGERS),
+    t('auditor_approve_report', ['report_pending_department'], 'final_review', {AUDITORS}),
+    t('auditor_reject_report', ['report_pending_department'], 'report_pending_department', {AUDITORS}),
+    t('finalize', ['final_review'], 'finalized', MANAGERS),
+    t('reopen_final_review', ['final_review'], 'final_review', MANAGERS),
+]
+
+REPORT_TRANSITIONS = [
+    t('approve', ['submitted'], 'approved_by_manager', MANAGERS, 'approve_report'),
+    t('reject', ['submitted'], 'rejected', MANAGERS, 'reject_report'),
+    t('send_to_department', ['approved_by_manager'], 'sent_to_department', MANAGERS, 'send_report'),
+    t('department_reply', ['sent_to_department'], 'dept_replied', {DEPARTMENT_MANAGERS}),
+    t('auditor_approve', ['dept_replied'], 'auditor_approved', {AUDITORS}, 'auditor_approve_report'),
+    t('auditor_reject', ['dept_replied'], 'sent_to_department', {AUDITORS}, 'auditor_reject_report'),
+    t('final_approve', ['auditor_approved'], 'final_approved', MANAGERS, 'finalize'),
+    t('final_reject', ['auditor_approved'], 'auditor_approved', MANAGERS, 'reopen_final_review'),
+]
+
+
+class Workflow:
+    def __init__(self, model, kind, transitions):
+        self.model = model
+        self.kind = kind
+        statuses = {value for value, _ in model.STATUS_CHOICES}
+        self.table = defaultdict(dict)
+        self.actions = {}
+        for tr in transitions:
+            unknown = (tr.sources | {tr.target}) - statuses
+            if unknown:
+                raise ValueError(f'{model.__name__}.{tr.action} uses unknown statuses {sorted(unknown)}')
+            self.actions[tr.action] = tr
+            for source in tr.sources:
+                self.table[source][tr.action] = tr
+        self.table = dict(self.table)
+
+    def get(self, status, action):
+        try:
+            return self.table[status][action]
+        except KeyError:
+            raise InvalidTransition(f'{self.model.__name__} cannot {action!r} from {status!r}.')
+
+    def allowed(self, status, user=None):
+        """Actions available from ``status`` (to ``user``, if given)."""
+        actions = self.table.get(status, {})
+        if user is None:
+            return list(actions)
+        roles = get_user_roles(user)
+        return [action for action, tr in actions.items() if tr.roles & roles]
+
+    def project_id(self, obj):
+        return obj.pk if self.model is AuditProject else obj.project_id
+
+
+PROJECT_WORKFLOW = Workflow(AuditProject, 'project', PROJECT_TRANSITIONS)
+REPORT_WORKFLOW = Workflow(AuditReport, 'report', REPORT_TRANSITIONS)
+WORKFLOWS = {AuditProject: PROJECT_WORKFLOW, AuditReport: REPORT_WORKFLOW}
+
+_hooks = {'before': defaultdict(list), 'after': defaultdict(list)}
+
+
+def _register(when, model, action):
+    def decorator(func):
+        _hooks[when][(model, action)].append(func)
+        return func
+    return decorator
+
+
+def before(model, action=None):
+    """Register ``func(obj, transition, user)`` to run before ``action`` (or any action)."""
+    return _register('before', model, action)
+
+
+def after(model, action=None):
+    """Register ``func(obj, transition, user)`` to run after ``action`` (or any action)."""
+    return _register('after', model, action)
+
+
+def _run_hooks(when, obj, tr, user):
+    model = type(obj)
+    for func in _hooks[when][(model, None)] + _hooks[when][(model, tr.action)]:
+        func(obj, tr, user)
+
+
+def check_roles(tr, user):
+    if user is not None and not tr.roles & get_user_roles(user):
+        raise PermissionDenied(f'Not allowed to {tr.action}.')
+
+
+def history_row(workflow, obj, tr, from_status, user):
+    return WorkflowHistory(
+        kind=workflow.kind, object_id=obj.pk, project_id=workflow.project_id(obj),
+        action=tr.action, from_status=from_status, to_status=tr.target, actor=user,
+    )
+
+
+def apply(obj, action, *, user=None, version=None, **fields):
+    """
+    Fire ``action`` on ``obj`` (a project or report), plus the project
+    transition it implies, in one transaction.
+
+    Raises ``InvalidTransition`` if the action is not allowed from the
+    current status, ``TransitionConflict`` if the row changed underneath us
+    and ``PermissionDenied`` if ``user`` lacks the role.
+    """
+    workflow = WORKFLOWS[type(obj)]
+    tr = workflow.get(obj.status, action)
+    check_roles(tr, user)
+    history = []
+    with transaction.atomic():
+        _apply(workflow, obj, tr, user, version, fields, history)
+        WorkflowHistory.objects.bulk_create(history)
+        bump_fragments('history')
+    return tr
+
+
+def _apply(workflow, obj, tr, user, version, fields, history):
+    _run_hooks('before', obj, tr, user)
+    from_status = obj.status
+    transition(obj, tr.target, version=version, **fields)
+    history.append(history_row(workflow, obj, tr, from_status, user))
+    project = obj.project if tr.project_action else None
+    # A sibling report may already have moved the project past this action.
+    if project is not None and tr.project_action in PROJECT_WORKFLOW.allowed(project.status):
+        # Implied by the report transition, so the user's role is not re-checked.
+        project_tr = PROJECT_WORKFLOW.get(project.status, tr.project_action)
+        _apply(PROJECT_WORKFLOW, project, project_tr, user, None, {}, history)
+    _run_hooks('after', obj, tr, user)
+
+
+# Columns bulk_apply loads: enough for the UPDATE, history and signal receivers.
+BULK_FIELDS = {
+    AuditProject: ('pk', 'status', 'version', 'department_id'),
+    AuditReport: ('pk', 'status', 'version', 'project_id'),
+}
+
+
+def bulk_apply(queryset, action, *, user=None, **fields):
+    """
+    Fire ``action`` on every row of ``queryset`` whose status allows it, as
+    one all-or-nothing transaction: one UPDATE per source status, one per
+    implied project transition, and a single batched history insert.
+    Projects whose status no longer allows the implied transition keep it.
+    Returns the transitioned objects.
+    """
+    workflow = WORKFLOWS[queryset.model]
+    if action not in workflow.actions:
+        raise InvalidTransition(f'Unknown action {action!r}.')
+    tr = workflow.actions[action]
+    check_roles(tr, user)
+    history = []
+    with transaction.atomic():
+        objs = _bulk_apply(workflow, queryset, tr, user, fields, history)
+        if objs:
+            WorkflowHistory.objects.bulk_create(history)
+            bump_fragments('history')
+    return objs
+
+
+def _bulk_apply(workflow, queryset, tr, user, fields, history):
+    objs = list(
+        queryset.filter(status__in=tr.sources)
+        .select_for_update(of=('self',))
+        .only(*BULK_FIELDS[workflow.model])
+        .order_by('pk')
+    )
+    if not objs:
+        return []
+    for obj in objs:
+        _run_hooks('before', obj, tr, user)
+
+    by_status = defaultdict(list)
+    for obj in objs:
+        by_status[obj.status].append(obj)
+    for from_status, group in by_status.items():
+        updated = workflow.model.objects.filter(
+            pk__in=[obj.pk for obj in group], status=from_status,
+        ).update(status=tr.target, version=F('version') + 1, **fields)
+        if updated != len(group):
+            raise TransitionConflict(f'{len(group) - updated} rows changed during the bulk {tr.action!r}.')
+        history += [history_row(workflow, obj, tr, from_status, user) for obj in group]
+
+    projects = {}
+    if tr.project_action:
+        project_tr = PROJECT_WORKFLOW.actions[tr.project_action]
+        project_ids = {obj.project_id for obj in objs}
+        projects = {
+            project.pk: project for project in _bulk_apply(
+                PROJECT_WORKFLOW, AuditProject.objects.filter(pk__in=project_ids), project_tr, user, {}, history,
+            )
+        }
+        # As in _apply, a sibling report may already have moved a project
+        # past this action; such projects are left where they are.
+        passed = project_ids - set(projects)
+        if passed:
+            projects.update(
+                (project.pk, project) for project in
+                AuditProject.objects.filter(pk__in=passed).only(*BULK_FIELDS[AuditProject])
+            )
+    if workflow.model is AuditProject:
+        # Preload the assignees the fragment invalidation needs, in one query.
+        auditor_ids = defaultdict(list)
+        assignments = AuditAssignment.objects.filter(project_id__in=[obj.pk for obj in objs])
+        for project_id, auditor_id in assignments.values_list('project_id', 'auditor_id'):
+            auditor_ids[project_id].append(auditor_id)
+        for obj in objs:
+            obj._auditor_ids = auditor_ids[obj.pk]
+
+    for obj in objs:
+        old_status = obj.status
+        obj.status = tr.target
+        obj.version += 1
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        if projects:
+            obj.project = projects[obj.project_id]
+        status_changed.send(
+            sender=workflow.model, instance=obj, old_status=old_status, new_status=tr.target,
+            fields=tuple(fields),
+        )
+        _run_hooks('after', obj, tr, user)
+    return objs